@@ -34,7 +34,7 @@ import homeassistant.helpers.device_registry as dr
 import homeassistant.helpers.config_validation as cv
 
 from .core.const import *
-from .core.utils import DeviceException, slugify_object_id, wildcard_models
+from .core.utils import DeviceException, clear_translations, slugify_object_id, wildcard_models
 from .core import HassEntry, BasicEntity, XEntity # noqa
 from .core.device import Device, AsyncMiIO
 from .core.miot_spec import (
@@ -235,7 +235,9 @@ async def _setup_attempt_cleanup(hass, entry_id, hass_entry):
         alias = runtime.get(CONF_XIAOMI_CLOUD)
     if alias is not None and hass_entry.clouds.get(CloudSid.XIAOMIIO) is alias:
         hass.data[DOMAIN].pop(entry_id, None)
+    clouds = list(hass_entry.clouds.values())
     hass_entry.clouds.clear()
+    await MiotCloud.async_close_all(clouds)
     if HassEntry.ALL.get(entry_id) is hass_entry:
         HassEntry.ALL.pop(entry_id, None)
 
@@ -458,6 +460,7 @@ async def async_reload_integration_config(hass, config):
     dic = config.get('translations') or {}
     if dic and isinstance(dic, dict):
         TRANSLATION_LANGUAGES.update(dic)
+    clear_translations()
 
     dcs = config.get('device_customizes')
     if dcs and isinstance(dcs, dict):
@@ -508,6 +511,7 @@ async def async_setup_component_services(hass):
                             try:
                                 miio = AsyncMiIO(dip, tok)
                                 miio_info = await miio.info()
+                                miio.close()
                             except Exception as exc:
                                 miio_info = {'error': str(exc)}
                             row['miio_info'] = miio_info
@@ -482,7 +482,7 @@ class MiotCameraEntity(MiotToggleEntity, BaseCameraEntity):
                 vav = self.custom_config_integer('video_attribute')
                 vap = self._srv_stream.get_property('video_attribute')
                 if vav is None and vap and vap.value_list:
-                    vav = (vap.value_list.pop(0) or {}).get('value')
+                    vav = (vap.value_list[0] or {}).get('value')
                 if self.xiaomi_cloud:
                     if self._act_stop_stream:
                         await self.async_call_action(self._act_stop_stream)
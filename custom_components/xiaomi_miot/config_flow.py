@@ -1,7 +1,9 @@
 """Config flow to configure Xiaomi Miot."""
+import asyncio
 import logging
 import re
 import copy
+import aiohttp
 import requests
 import voluptuous as vol
 
@@ -123,6 +125,8 @@ async def check_miio_device(hass, user_input, errors):
                         break
             except DeviceException:
                 pass
+    if device:
+        device.close()
     return user_input
 
 
@@ -132,6 +136,8 @@ class BaseFlowHandler:
     config_data = None
     cloud: Optional[MiotCloud] = None
     devices: Optional[list] = None
+    # clouds made by this flow, closed when the flow is removed
+    flow_clouds: Optional[list] = None
 
     @property
     def placeholders(self):
@@ -143,9 +149,23 @@ class BaseFlowHandler:
             **self.context.pop('placeholders', {}),
         }
 
+    def add_flow_cloud(self, cloud: MiotCloud) -> MiotCloud:
+        if self.flow_clouds is None:
+            self.flow_clouds = []
+        self.flow_clouds.append(cloud)
+        return cloud
+
+    def close_flow_clouds(self):
+        clouds, self.flow_clouds = self.flow_clouds or [], None
+        self.cloud = None
+        if clouds:
+            self.hass.async_create_task(MiotCloud.async_close_all(clouds))
+
     async def get_cloud(self, user_input):
         if not self.cloud:
-            self.cloud = await MiotCloud.from_token(self.hass, user_input, login=False)
+            self.cloud = self.add_flow_cloud(
+                await MiotCloud.from_token(self.hass, user_input, login=False),
+            )
             self.cloud.login_times = 0
         self.cloud.merger_config(user_input)
         login_data = {}
@@ -187,7 +207,11 @@ class BaseFlowHandler:
                     err = f'Captcha:\n![captcha](data:image/jpeg;base64,{url})'
                     self.placeholders['tip'] = f'⚠️ {err}'
                     self.context['captchaIck'] = mic.attrs.get('captchaIck')
-            elif isinstance(exc, requests.exceptions.ConnectionError):
+            elif isinstance(exc, (
+                requests.exceptions.ConnectionError,
+                aiohttp.ClientConnectionError,
+                asyncio.TimeoutError,
+            )):
                 errors['base'] = 'cannot_reach'
             elif 'ZoneInfoNotFoundError' in err:
                 errors['base'] = 'tzinfo_error'
@@ -436,14 +460,14 @@ class XiaomiMiotFlowHandler(config_entries.ConfigFlow, BaseFlowHandler, domain=D
         country: str | None,
         sid: CloudSid,
     ) -> MiotCloud:
-        return MiotCloud(
+        return self.add_flow_cloud(MiotCloud(
             self.hass,
             username=username,
             password=password,
             country=country,
             sid=sid.value,
             hass_entry=None,
-        )
+        ))
 
     def _show_reauth_form(self, step_id, schema, errors=None, placeholders=None):
         return self.async_show_form(
@@ -780,6 +804,7 @@ class XiaomiMiotFlowHandler(config_entries.ConfigFlow, BaseFlowHandler, domain=D
             candidate.attrs.pop('captchaIck', None)
             candidate.password = None
             self._candidate = None
+        self.close_flow_clouds()
         super().async_remove()
 
     async def async_step_customizing(self, user_input=None):
@@ -993,6 +1018,11 @@ class OptionsFlowHandler(config_entries.OptionsFlow, BaseFlowHandler):
         if HA_VERSION < '2024.12':
             self.config_entry = config_entry
 
+    @callback
+    def async_remove(self) -> None:
+        self.close_flow_clouds()
+        super().async_remove()
+
     @property
     def saved_config(self):
         return {
@@ -0,0 +1,105 @@
+import json
+import logging
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# devices drop answers larger than this
+REPLY_LIMIT = 1056
+# json envelope around the results: {"id":123,"result":[...],"exe_time":0}
+REPLY_OVERHEAD = 48
+
+
+class ChunkSizes:
+    """Learns how many properties a model can return in one get_properties.
+
+    The size grows by one after some full chunks answered completely, and is
+    halved when a device that answers the handshake times out, returns less
+    results than requested or an error on a full chunk. The size that failed is remembered as
+    a limit that is probed again only after a long run of successes.
+    """
+
+    min_size = 1
+    max_size = 20
+    grow_after = 3
+    probe_after = 100
+    save_delay = 60
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.store = Store(hass, 1, f'{DOMAIN}/chunk_sizes.json')
+        self.data: dict[str, dict] = {}
+
+    @classmethod
+    async def async_get(cls, hass: HomeAssistant) -> 'ChunkSizes':
+        sizes = hass.data[DOMAIN].get('chunk_sizes')
+        if not sizes:
+            sizes = hass.data[DOMAIN]['chunk_sizes'] = cls(hass)
+            await sizes.async_load()
+        return sizes
+
+    async def async_load(self):
+        try:
+            stored = await self.store.async_load() or {}
+        except (ValueError, HomeAssistantError):
+            await self.store.async_remove()
+            stored = {}
+        for key, val in stored.items():
+            if isinstance(val, dict) and val.get('size'):
+                self.data.setdefault(key, val)
+
+    def get(self, key: str) -> int | None:
+        if not key or key not in self.data:
+            return None
+        return self.data[key]['size']
+
+    def observe(self, key: str, size: int, requested: int, resp: dict | None):
+        """Record the answer on a get_properties with `requested` properties,
+        sent while the chunk size was `size`.
+        """
+        if not key or resp is None:
+            # offline, nothing to learn
+            return
+        info = self.data.setdefault(key, {'size': size, 'limit': 0, 'streak': 0})
+        results = resp.get('result') if isinstance(resp, dict) else None
+        if not isinstance(results, list) or len(results) < requested:
+            self.shrink(key, info, size, requested, 'timeout' if not resp else f'{len(results or [])}/{requested} results')
+            return
+        if requested < info['size']:
+            return
+        info['streak'] += 1
+        if info['limit'] and info['streak'] >= self.probe_after:
+            info['limit'] = 0
+        if info['streak'] < self.grow_after:
+            return
+        # estimate the answer on one more property
+        reply = len(json.dumps(results, separators=(',', ':'))) + REPLY_OVERHEAD
+        grow = info['size'] + 1
+        if grow > self.max_size or (info['limit'] and grow >= info['limit']):
+            return
+        if reply / requested * grow > REPLY_LIMIT:
+            return
+        info['size'] = grow
+        info['streak'] = 0
+        self.save()
+
+    def shrink(self, key: str, info: dict, size: int, requested: int, reason: str):
+        if size > info['size']:
+            # already shrunk by another chunk
+            return
+        if requested < info['size']:
+            # a smaller remainder failed, not because of the size
+            return
+        info['limit'] = size
+        info['size'] = max(self.min_size, size // 2)
+        info['streak'] = 0
+        _LOGGER.info('%s: Chunk size %s failed (%s), use %s', key, size, reason, info['size'])
+        self.save()
+
+    def save(self):
+        self.store.async_delay_save(lambda: self.data, self.save_delay)
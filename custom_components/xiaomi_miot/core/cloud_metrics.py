@@ -0,0 +1,117 @@
+import time
+from collections import deque
+from urllib import parse
+
+# paths beyond this many are counted together
+MAX_PATHS = 64
+OTHER_PATH = '*'
+
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000)
+
+
+def summary(paths) -> dict:
+    """Totals of some paths, of one or more accounts."""
+    paths = list(paths)
+    lts = [v for m in paths for v in m.latencies]
+    return {
+        'requests': sum(m.requests for m in paths),
+        'errors': sum(m.errors for m in paths),
+        'timeouts': sum(m.timeouts for m in paths),
+        'retries': sum(m.retries for m in paths),
+        'token_expired': sum(m.expired for m in paths),
+        'bytes': sum(m.bytes for m in paths),
+        'p50': ms(percentile(lts, 0.5)),
+        'p95': ms(percentile(lts, 0.95)),
+        'p99': ms(percentile(lts, 0.99)),
+    }
+
+
+class PathMetrics:
+    """Counters of an api path, with the latencies of the last requests."""
+
+    samples = 200
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytes = 0
+        self.expired = 0
+        self.retries = 0
+        self.latencies: deque[float] = deque(maxlen=self.samples)
+        self.last_time = 0
+
+    def as_dict(self):
+        lts = list(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'timeout_rate': round(self.timeouts / self.requests, 3) if self.requests else 0,
+            'bytes': self.bytes,
+            'token_expired': self.expired,
+            'retries': self.retries,
+            'p50': ms(percentile(lts, 0.5)),
+            'p95': ms(percentile(lts, 0.95)),
+            'p99': ms(percentile(lts, 0.99)),
+        }
+
+
+class ApiMetrics:
+    """Telemetry of the cloud requests of an account, by api path."""
+
+    def __init__(self):
+        self.paths: dict[str, PathMetrics] = {}
+
+    @staticmethod
+    def path_of(api: str):
+        url = parse.urlsplit(str(api))
+        path = url.path.lstrip('/')
+        if url.netloc:
+            return f'{url.netloc}/{path}'
+        return path
+
+    def get(self, api: str) -> PathMetrics:
+        path = self.path_of(api)
+        if path not in self.paths and len(self.paths) >= MAX_PATHS:
+            path = OTHER_PATH
+        if path not in self.paths:
+            self.paths[path] = PathMetrics()
+        return self.paths[path]
+
+    def request(self, api: str, latency: float, rsp=None, timeout=False, error=False):
+        mtr = self.get(api)
+        mtr.requests += 1
+        mtr.last_time = time.time()
+        if timeout:
+            mtr.timeouts += 1
+        elif error or rsp is None:
+            mtr.errors += 1
+        else:
+            mtr.latencies.append(latency)
+        if isinstance(rsp, (str, bytes)):
+            mtr.bytes += len(rsp)
+
+    def token_expired(self, api: str):
+        self.get(api).expired += 1
+
+    def retry(self, api: str):
+        self.get(api).retries += 1
+
+    def summary(self):
+        return summary(self.paths.values())
+
+    def as_dict(self):
+        return {
+            path: mtr.as_dict()
+            for path, mtr in sorted(self.paths.items())
+        }
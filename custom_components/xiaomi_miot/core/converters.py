@@ -80,6 +80,16 @@ class InfoConv(BaseConv):
             'customizes': customizes,
             **infos,
         })
+        if device.local:
+            miio = device.local.miio
+            payload['lan_rto'] = round(miio.rto, 3) if miio.rto else None
+            payload['lan_loss'] = round(miio.loss_rate, 3)
+            payload['lan_breaker'] = device.local_breaker.state
+        if device.cloud and (mtr := device.cloud.metrics.paths.get('miotspec/prop/get')):
+            # polls of the account through the cloud
+            info = mtr.as_dict()
+            payload['cloud_p95'] = info['p95']
+            payload['cloud_timeout_rate'] = info['timeout_rate']
         if device.available:
             payload.pop('miot_error', None)
         if device.miot_results:
@@ -1,5 +1,4 @@
 import logging
-import copy
 import re
 from typing import TYPE_CHECKING, Optional, Callable
 from datetime import timedelta
@@ -31,11 +30,18 @@ from .coordinator import DataCoordinator
 from .miot_spec import MiotSpec, MiotProperty, MiotResults, MiotResult
 from .miio2miot import Miio2MiotHelper
 from .mini_miio import AsyncMiIO
+from .chunk_sizes import ChunkSizes
+from .lan_discovery import LanDiscovery
+from .spec_cache import SpecCache
+from .scheduler import RequestScheduler
 from .xiaomi_cloud import MiotCloud, MiCloudException
 from .utils import (
     CustomConfigHelper,
     get_customize_via_model,
     get_value,
+    Batcher,
+    CircuitBreaker,
+    SingleFlight,
     DeviceException,
     is_offline_exception,
     update_attrs_with_suffix,
@@ -179,6 +185,8 @@ class Device(CustomConfigHelper):
     _exclude_miot_properties = None
     _unreadable_properties = None
     _unsub_purge = None
+    _set_batcher = None
+    _spec_key = None
 
     def __init__(self, info: DeviceInfo, entry: HassEntry):
         self.data = {}
@@ -192,11 +200,18 @@ class Device(CustomConfigHelper):
         self.converters: list[BaseConv] = []
         self.coordinators: list[DataCoordinator] = []
         self.main_coordinators: list[DataCoordinator] = []
+        self.local_breaker = CircuitBreaker()
+        self.flights = SingleFlight()
         self.log = logging.getLogger(f'{__name__}.{self.model}')
 
     async def async_init(self):
         if not self.cloud_only:
             self.local = MiotDevice.from_device(self)
+        if self.local:
+            self.local.chunk_sizes = await ChunkSizes.async_get(self.hass)
+            if window := self.custom_config_integer('chunk_window'):
+                self.local.chunk_window = window
+            await LanDiscovery.get(self.hass).async_add(self.did, self.local)
         spec = await self.get_spec()
         if spec and self.local and not self.cloud_only:
             self.miio2miot = Miio2MiotHelper.from_model(self.hass, self.model, spec)
@@ -215,6 +230,12 @@ class Device(CustomConfigHelper):
         self._exclude_miot_services = self.custom_config_list('exclude_miot_services', [])
         self._exclude_miot_properties = self.custom_config_list('exclude_miot_properties', [])
         self._unreadable_properties = self.custom_config_bool('unreadable_properties')
+        if window := self.custom_config_integer('set_properties_window'):
+            self._set_batcher = Batcher(
+                self._async_set_properties,
+                window / 1000,
+                key=lambda p: (p.get('siid'), p.get('piid')),
+            )
 
         if not self.coordinators:
             await self.init_coordinators()
@@ -227,12 +248,30 @@ class Device(CustomConfigHelper):
             await coo.async_shutdown()
 
         self.spec = None
-        self.hass.data[DOMAIN].setdefault('miot_specs', {}).pop(self.model, None)
+        if self._spec_key:
+            if spec := SpecCache.get(self.hass).release(self._spec_key, self):
+                specs = self.hass.data[DOMAIN].setdefault('miot_specs', {})
+                if specs.get(self.model) is spec:
+                    specs.pop(self.model, None)
+            self._spec_key = None
+
+        if self.local and not self._proxy_device:
+            LanDiscovery.get(self.hass).remove(self.did, self.local)
+            self.local.close()
 
         if self._unsub_purge:
             self._unsub_purge()
             self._unsub_purge = None
 
+    def update_info(self, data: dict, keys: set):
+        """Take over the changed fields of the device in the cloud list."""
+        self.info.data.update({k: data.get(k) for k in keys})
+        host = data.get('localip')
+        if 'localip' in keys and host and self.local and not self._proxy_device:
+            self.local.miio.move(host)
+        if 'token' in keys and self.local:
+            self.log.warning('Token changed in xiaomi cloud, reload the integration to use it')
+
     @cached_property
     def did(self):
         return self.info.did
@@ -338,18 +377,17 @@ class Device(CustomConfigHelper):
         if self.spec:
             return self.spec
 
-        dat = self.hass.data[DOMAIN].setdefault('miot_specs', {})
-        obj = dat.get(self.model)
-        if not obj:
-            trans_options = self.custom_config_bool('trans_options', self.entry.get_config('trans_options'))
-            urn = await self.get_urn()
-            obj = await MiotSpec.async_from_type(self.hass, urn, trans_options=trans_options)
-            dat[self.model] = obj
+        trans_options = self.custom_config_bool('trans_options', self.entry.get_config('trans_options'))
+        urn = await self.get_urn()
+        self._spec_key, obj = await SpecCache.get(self.hass).async_acquire(
+            self, urn,
+            trans_options=trans_options,
+            extend=self.extend_miot_specs,
+            mapping=self.custom_config_json('miot_mapping'),
+        )
         if obj:
-            self.spec = copy.copy(obj)
-            if not self.cloud_only:
-                if ext := self.extend_miot_specs:
-                    self.spec.extend_specs(services=ext)
+            self.hass.data[DOMAIN].setdefault('miot_specs', {})[self.model] = obj
+            self.spec = obj
             self.init_converters()
         return self.spec
 
@@ -618,6 +656,9 @@ class Device(CustomConfigHelper):
             await coo.async_request_refresh()
 
     async def update_main_status(self):
+        await self.flights.run('main_status', self._update_main_status)
+
+    async def _update_main_status(self):
         for coo in self.main_coordinators:
             await coo.async_request_refresh()
 
@@ -813,7 +854,9 @@ class Device(CustomConfigHelper):
             return None
 
         if dic := self.custom_config_json('miot_mapping'):
-            self.spec.set_custom_mapping(dic)
+            if self.spec.custom_mapping != dic:
+                # shared by the devices with the same mapping
+                self.spec.set_custom_mapping(dic)
             self._miot_mapping = dic
             return dic
 
@@ -825,7 +868,16 @@ class Device(CustomConfigHelper):
         self._miot_mapping = mapping
         return mapping
 
-    async def update_miot_status(
+    async def update_miot_status(self, mapping=None, **kwargs) -> MiotResults:
+        """Identical updates at the same time share one request."""
+        key = (
+            'miot_status',
+            frozenset(mapping) if mapping is not None else None,
+            frozenset(kwargs.items()),
+        )
+        return await self.flights.run(key, self._update_miot_status, mapping, **kwargs)
+
+    async def _update_miot_status(
         self,
         mapping=None,
         use_local=None,
@@ -859,6 +911,14 @@ class Device(CustomConfigHelper):
             'mapping': mapping,
         })
 
+        if use_local and self.local and not await self.async_check_local():
+            use_local = False
+            if auto_cloud:
+                use_cloud = self.cloud
+            else:
+                self.miot_results.errors = DeviceException(f'Unable to discover the device {self.local.host}')
+                self.available = False
+
         if use_local:
             try:
                 if self.miio2miot:
@@ -869,6 +929,7 @@ class Device(CustomConfigHelper):
                 else:
                     if not max_properties:
                         max_properties = self.custom_config_integer('chunk_properties')
+                    learn = not max_properties
                     if not max_properties:
                         max_properties = self.local.get_max_properties(mapping)
                     maps = []
@@ -887,11 +948,13 @@ class Device(CustomConfigHelper):
                             max_properties=max_properties,
                             did=self.did,
                             mapping=mapp,
+                            learn=learn,
                         )
                         results.extend(res)
                 self.available = True
                 self._local_fails = 0
                 self._local_state = True
+                self.local_breaker.success()
                 self.miot_results.updater = 'local'
                 self.miot_results.set_results(results, mapping)
             except (DeviceException, OSError) as exc:
@@ -900,6 +963,7 @@ class Device(CustomConfigHelper):
                 log = self.log.error
                 if is_offline_exception(exc):
                     log = self.log.warning
+                    self.local_breaker.failure()
                 if auto_cloud:
                     use_cloud = self.cloud
                     log = self.log.warning
@@ -958,6 +1022,51 @@ class Device(CustomConfigHelper):
         await self.offline_notify()
         return self.miot_results
 
+    def diagnostics(self):
+        dat = {
+            'model': self.model,
+            'urn': self.info.urn,
+            'available': self.available,
+            'updater': self.data.get('updater'),
+            'local_fails': self._local_fails,
+            'cloud_fails': self._cloud_fails,
+            'coalesced_updates': self.flights.coalesced,
+        }
+        if self._set_batcher:
+            dat['set_batches'] = self._set_batcher.batches
+            dat['set_merged'] = self._set_batcher.merged
+        if self.local:
+            miio = self.local.miio
+            dat['lan'] = {
+                'breaker': self.local_breaker.as_dict(),
+                'rto': miio.rto,
+                'srtt': miio.srtt,
+                'loss_rate': miio.loss_rate,
+                'session_age': miio.session_age,
+                'chunk_key': self.local.chunk_key,
+                'chunk_size': self.local.chunk_sizes.get(self.local.chunk_key) if self.local.chunk_sizes else None,
+                'stats': {**miio.stats},
+                'scheduler': {**self.local.scheduler.stats},
+            }
+        return dat
+
+    async def async_check_local(self):
+        """Returns `false` while the LAN circuit breaker is open, probes the
+        device with one HELLO when it is half open.
+        """
+        state = self.local_breaker.state
+        if state == CircuitBreaker.CLOSED:
+            return True
+        if state == CircuitBreaker.OPEN:
+            self.log.debug('Skip LAN polling for %ss', round(self.local_breaker.retry_in))
+            return False
+        if await self.local.miio.ping():
+            # the next poll closes or opens the breaker
+            return True
+        self.local_breaker.failure()
+        self.log.info('Device is unreachable in the LAN, retry in %ss', round(self.local_breaker.retry_in))
+        return False
+
     async def offline_notify(self):
         result = self.miot_results
         is_offline = not result.is_valid and result.errors and is_offline_exception(result.errors)
@@ -1051,6 +1160,14 @@ class Device(CustomConfigHelper):
         return result.to_attributes()
 
     async def async_set_properties(self, params):
+        """Properties set within `set_properties_window` milliseconds are
+        merged into one request, when it is customized.
+        """
+        if self._set_batcher:
+            return await self._set_batcher.submit(params)
+        return await self._async_set_properties(params)
+
+    async def _async_set_properties(self, params):
         results = []
         cloud_params = []
         cloud_write = self.cloud and self.custom_config_bool('miot_cloud_write')
@@ -1370,16 +1487,42 @@ class Device(CustomConfigHelper):
 class MiotDevice():
     hass: HomeAssistant = None
     miio: AsyncMiIO = None
+    chunk_sizes: ChunkSizes = None
+    chunk_key: str = None
+    # chunks of properties in flight at the same time, back to 1 after
+    # a timeout of a pipelined chunk, `chunk_window: 1` in the customizes
+    # of models that can't handle concurrent requests
+    default_chunk_window = 3
 
     def __init__(self, hass: HomeAssistant, miio: AsyncMiIO, logger=None):
         self.hass = hass
         self.miio = miio
         self.log = logger or logging.getLogger(__name__)
+        # shared by the sub devices of a gateway
+        self.scheduler = RequestScheduler(self._async_get_properties)
+        self.chunk_window = self.default_chunk_window
+
+    @property
+    def chunk_window(self) -> int:
+        return self._chunk_window
+
+    @chunk_window.setter
+    def chunk_window(self, window: int):
+        self._chunk_window = window
+        # the chunks in flight take the slots of the endpoint
+        self.scheduler.limit = max(1, window)
 
     @property
     def host(self):
         return self.miio.addr[0]
 
+    @staticmethod
+    def is_write(method: str):
+        return method in ['set_properties', 'action'] or method.startswith('set_')
+
+    def close(self):
+        self.miio.close()
+
     @staticmethod
     def from_device(device: Device):
         host = device.info.host
@@ -1391,30 +1534,49 @@ class MiotDevice():
         elif device.info.pid in [6, 15, 16, 17]:
             return None
         miio = AsyncMiIO(host, token)
-        return MiotDevice(device.hass, miio, device.log)
+        miot = MiotDevice(device.hass, miio, device.log)
+        miot.chunk_key = device.model
+        if fwv := device.info.firmware_version:
+            miot.chunk_key = f'{device.model}@{fwv}'
+        return miot
 
     async def async_info(self):
-        resp = await self.miio.send('miIO.info', tries=2)
+        resp = await self.scheduler.run(self.miio.send, 'miIO.info', tries=2)
         self.handle_response(resp, False)
         info = resp.get('result', {}) if resp else resp
         if not info:
             self.log.warning('Got miio info failed: %s', resp)
         return MiioInfo(info)
 
-    async def async_send(self, *args, **kwargs):
-        resp = await self.miio.send(*args, **kwargs)
+    async def async_send(self, method: str, *args, **kwargs):
+        resp = await self.scheduler.run(self.miio.send, method, *args, write=self.is_write(method), **kwargs)
         self.handle_response(resp)
         try:
             return resp['result']
         except KeyError:
             return resp
 
-    async def async_send_chunk(self, method: str, params: list, chunk: int = 0):
+    async def async_send_chunk(self, method: str, params: list, chunk: int = 0, learn=False):
+        return await self.scheduler.run(self._async_send_chunk, method, params, chunk, learn=learn, pipelined=True)
+
+    async def _async_send_chunk(self, method: str, params: list, chunk: int = 0, learn=False):
         if not chunk:
             chunk = 15
+        if not self.chunk_sizes:
+            learn = False
         results = []
-        for i in range(0, len(params), chunk):
-            resp = await self.miio.send(method, params[i : i + chunk])
+        window = self.chunk_window
+        answers = await self.miio.send_chunks(method, params, chunk, window, slots=self.scheduler.slots)
+        for i, resp in enumerate(answers):
+            if window > 1 and resp == {}:
+                # may be the window, not the size of the chunk
+                learn = False
+                if self.chunk_window > 1:
+                    self.log.info('%s: Chunk timed out in a window of %s, send one by one', self.host, window)
+                    self.chunk_window = 1
+            if learn:
+                part = min(chunk, len(params) - i * chunk)
+                self.chunk_sizes.observe(self.chunk_key, chunk, part, resp)
             if not results:
                 self.handle_response(resp)
             if not isinstance(resp, dict) or 'result' not in resp:
@@ -1436,20 +1598,28 @@ class MiotDevice():
     async def async_get_prop(self, properties, *, max_properties=None, property_getter='get_prop'):
         return await self.async_get_properties(properties, max_properties=max_properties, property_getter=property_getter)
 
-    async def async_get_properties(self, properties, *, max_properties=None, property_getter='get_properties'):
-        return await self.async_send_chunk(property_getter, properties, max_properties)
+    async def async_get_properties(self, properties, *, max_properties=None, property_getter='get_properties', learn=False):
+        return await self.async_send_chunk(property_getter, properties, max_properties, learn=learn)
 
-    async def async_get_properties_for_mapping(self, *, max_properties=None, did=None, mapping=None):
+    async def async_get_properties_for_mapping(self, *, max_properties=None, did=None, mapping=None, learn=False):
+        """Properties of sub devices waiting at the same time are requested
+        together, with their own did.
+        """
         if mapping is None:
             return None
         properties = [
             {'did': f'prop.{v["siid"]}.{v["piid"]}' if did is None else str(did), **v}
             for k, v in mapping.items()
         ]
-        return await self.async_get_properties(properties, max_properties=max_properties)
+        return await self.scheduler.get_properties(did, properties, max_properties=max_properties, learn=learn)
+
+    async def _async_get_properties(self, properties, *, max_properties=None, learn=False):
+        return await self._async_send_chunk('get_properties', properties, max_properties, learn=learn)
 
     def get_max_properties(self, mapping):
         idx = len(mapping)
+        if self.chunk_sizes and (size := self.chunk_sizes.get(self.chunk_key)):
+            return min(size, idx)
         if idx < 10:
             return idx
         idx -= 10
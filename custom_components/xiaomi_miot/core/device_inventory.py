@@ -0,0 +1,55 @@
+from .const import DOMAIN
+
+# sent with the diff when the device list of an account changed
+SIGNAL_DEVICES_CHANGED = f'{DOMAIN}_cloud_devices_changed_{{}}'
+
+# fields that change on every fetch, they alone don't make a device changed
+VOLATILE_FIELDS = ('isOnline', 'rssi')
+
+
+class DevicesDiff:
+    """Differences between two device lists of an account, by did."""
+
+    def __init__(self, added: dict = None, removed: dict = None, changed: dict = None):
+        self.added: dict[str, dict] = added or {}
+        self.removed: dict[str, dict] = removed or {}
+        # did: (device, names of the changed fields)
+        self.changed: dict[str, tuple[dict, set]] = changed or {}
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f'DevicesDiff(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})'
+
+    @classmethod
+    def compare(cls, old: list, new: list) -> 'DevicesDiff':
+        olds = by_did(old)
+        news = by_did(new)
+        diff = cls()
+        for did, dev in news.items():
+            prev = olds.get(did)
+            if prev is None:
+                diff.added[did] = dev
+            elif keys := changed_fields(prev, dev):
+                diff.changed[did] = (dev, keys)
+        for did, dev in olds.items():
+            if did not in news:
+                diff.removed[did] = dev
+        return diff
+
+
+def by_did(devices: list) -> dict[str, dict]:
+    return {
+        d['did']: d
+        for d in devices or []
+        if isinstance(d, dict) and d.get('did')
+    }
+
+
+def changed_fields(old: dict, new: dict) -> set:
+    return {
+        k
+        for k in old.keys() | new.keys()
+        if k not in VOLATILE_FIELDS and old.get(k) != new.get(k)
+    }
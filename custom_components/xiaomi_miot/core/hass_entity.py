@@ -11,6 +11,7 @@ from .const import DOMAIN
 from .utils import get_customize_via_entity, wildcard_models, CustomConfigHelper
 from .miot_spec import MiotService, MiotProperty, MiotAction
 from .converters import BaseConv, InfoConv, MiotServiceConv, MiotPropConv, MiotActionConv
+from .rate_limiter import PRIORITY_WRITE
 from .xiaomi_cloud import CloudSid, MiotCloud
 
 if TYPE_CHECKING:
@@ -93,6 +94,8 @@ class BasicEntity(Entity, CustomConfigHelper):
             raise HomeAssistantError('Xiaomi cloud is unavailable')
         pms = kwargs.pop('params', None)
         dat = data or pms
+        # called by users, in the lane of writes
+        kwargs.setdefault('priority', PRIORITY_WRITE)
         result = await cloud.async_request_api(api, data=dat, method=method, crypt=crypt, **kwargs)
         _LOGGER.debug('Xiaomi Api %s: %s', api, result)
         return result
@@ -4,10 +4,12 @@ from typing import TYPE_CHECKING, Optional
 
 from homeassistant.const import CONF_USERNAME
 from homeassistant.config_entries import ConfigEntry, ConfigEntryState
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import SUPPORTED_DOMAINS
+from .device_inventory import SIGNAL_DEVICES_CHANGED, DevicesDiff
 from .xiaomi_cloud import REAUTH_SIDS, CloudSid, MiotCloud
 
 if TYPE_CHECKING:
@@ -30,6 +32,7 @@ class HassEntry:
         self.did_to_unique = {}
         self.clouds: dict[CloudSid, Optional[MiotCloud]] = {}
         self._cloud_lock = asyncio.Lock()
+        self._unsub_devices = None
 
     @staticmethod
     def init(hass: HomeAssistant, entry: ConfigEntry):
@@ -49,9 +52,14 @@ class HassEntry:
             )
         )
         if ret:
+            if self._unsub_devices:
+                self._unsub_devices()
+                self._unsub_devices = None
             for device in self.devices.values():
                 await device.async_unload()
+            clouds = list(self.clouds.values())
             self.clouds.clear()
+            await MiotCloud.async_close_all(clouds)
             HassEntry.ALL.pop(self.entry.entry_id, None)
         return ret
 
@@ -183,8 +191,34 @@ class HassEntry:
         for did, info in self.cloud_devices.items():
             mac = info.get('mac') or did
             self.mac_to_did[mac] = did
+        if not self._unsub_devices and cloud.user_id:
+            self._unsub_devices = async_dispatcher_connect(
+                self.hass, SIGNAL_DEVICES_CHANGED.format(cloud.user_id), self.on_cloud_devices_changed,
+            )
         return self.cloud_devices
 
+    @callback
+    def on_cloud_devices_changed(self, diff: DevicesDiff):
+        """Apply the changes of the device list of the account."""
+        if not isinstance(self.cloud_devices, dict) or not self.cloud:
+            return
+        config = self.get_config()
+        for did in diff.removed:
+            self.cloud_devices.pop(did, None)
+        updates = {
+            **{did: (d, None) for did, d in diff.added.items()},
+            **diff.changed,
+        }
+        for did, (info, keys) in updates.items():
+            if not self.cloud.device_key(info, 'did', config):
+                self.cloud_devices.pop(did, None)
+                continue
+            self.cloud_devices[did] = info
+            self.mac_to_did[info.get('mac') or did] = did
+            if keys and (device := self.devices.get(self.did_to_unique.get(did))):
+                device.update_info(info, keys)
+        _LOGGER.info('%s: Cloud devices changed: %s', self.id, diff)
+
     async def get_cloud_device(self, did=None, mac=None):
         devices = await self.get_cloud_devices()
         if mac and not did:
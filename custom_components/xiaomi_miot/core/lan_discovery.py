@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from homeassistant.components import network
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DOMAIN
+from .mini_miio import MiIOMultiplexer
+
+if TYPE_CHECKING:
+    from .device import MiotDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LanDiscovery:
+    """Broadcasts miIO HELLO periodically and keeps LAN devices up to date:
+    the address of devices that got a new IP, and the handshake, so that
+    polls don't need to ping the device first.
+    """
+
+    interval = timedelta(minutes=10)
+    timeout = 1
+    port = 54321
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.devices: dict[int, 'MiotDevice'] = {}
+        # device id: (address, answer on HELLO, time)
+        self.found: dict[int, tuple] = {}
+        self.task: asyncio.Task | None = None
+        self._unsub = None
+
+    @classmethod
+    def get(cls, hass: HomeAssistant) -> 'LanDiscovery':
+        discovery = hass.data[DOMAIN].get('lan_discovery')
+        if not discovery:
+            discovery = hass.data[DOMAIN]['lan_discovery'] = cls(hass)
+        return discovery
+
+    async def async_add(self, did: str, device: 'MiotDevice'):
+        """Track a LAN device, waits for the first sweep."""
+        if not str(did).isdecimal():
+            # sub devices and bluetooth devices
+            return
+        self.devices[int(did)] = device
+        if not self._unsub:
+            self._unsub = async_track_time_interval(self.hass, self.async_sweep, self.interval)
+        if not self.task:
+            self.task = self.hass.async_create_background_task(self.async_sweep(), 'xiaomi_miot_lan_discovery')
+        try:
+            await asyncio.shield(self.task)
+        except Exception as exc:
+            _LOGGER.debug('LAN discovery failed: %s', exc)
+        self.apply(int(did))
+
+    def remove(self, did: str, device: 'MiotDevice'):
+        if not str(did).isdecimal():
+            return
+        if self.devices.get(int(did)) is device:
+            self.devices.pop(int(did))
+        if not self.devices and self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    async def async_broadcast_addresses(self) -> list[str]:
+        try:
+            addrs = await network.async_get_ipv4_broadcast_addresses(self.hass)
+            return [str(addr) for addr in addrs]
+        except Exception as exc:
+            _LOGGER.debug('Get broadcast addresses failed: %s', exc)
+            return ['255.255.255.255']
+
+    async def async_sweep(self, *_):
+        hosts = await self.async_broadcast_addresses()
+        mux = await MiIOMultiplexer.async_get()
+        found = await mux.discover(hosts, timeout=self.timeout, port=self.port)
+        self.found.update(found)
+        _LOGGER.debug('LAN discovery found %s devices on %s', len(found), hosts)
+        for device_id in found:
+            self.apply(device_id)
+
+    def apply(self, device_id: int):
+        device = self.devices.get(device_id)
+        found = self.found.get(device_id)
+        if not device or not found:
+            return
+        addr, raw, tim = found
+        miio = device.miio
+        if time.time() - tim > miio.session_ttl:
+            return
+        if addr[1] == miio.addr[1]:
+            miio.move(addr[0])
+        if miio.session_age is None:
+            miio.set_session(raw, received=tim)
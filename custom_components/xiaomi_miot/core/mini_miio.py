@@ -1,18 +1,20 @@
 # https://github.com/AlexxIT/XiaomiGateway3/blob/02aaddc3c16f63df116a95578f44d5b0da1c4f2c/custom_components/xiaomi_gateway3/core/mini_miio.py
 import asyncio
+import contextlib
 import hashlib
 import json
 import logging
 import random
 import socket
+import struct
 import time
 from asyncio import DatagramProtocol, Future
 from asyncio.protocols import BaseProtocol
 from asyncio.transports import DatagramTransport
 from typing import Union
+from weakref import WeakKeyDictionary
 
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 _LOGGER = logging.getLogger(__package__ + ".miio")
@@ -20,6 +22,9 @@ _LOGGER = logging.getLogger(__package__ + ".miio")
 HELLO = bytes.fromhex(
     "21310020ffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
 )
+# magic, length, unknown, device id, timestamp, followed by 16 bytes checksum
+HEADER = struct.Struct(">HHIII")
+PADDING = [bytes([i]) * i for i in range(17)]
 
 
 class BasemiIO:
@@ -28,11 +33,29 @@ class BasemiIO:
     device_id = None
     delta_ts = None
     debug = False
-
-    def __init__(self, host: str, token: str, timeout: float = 3):
-        self.addr = (host, 54321)
+    # handshake is reused for this many seconds, and refreshed in background
+    # after 80% of it
+    session_ttl = 600
+    session_time = None
+    # smoothed round trip time and its variance, like TCP (RFC 6298)
+    srtt = None
+    rttvar = None
+    # not below one second, like TCP (RFC 6298)
+    min_rto = 1.0
+
+    def __init__(self, host: str, token: str, timeout: float = 3, port: int = 54321):
+        self.addr = (host, port)
         self.token = bytes.fromhex(token)
+        # the maximum time to wait for an answer
         self.timeout = timeout
+        self.rto = timeout
+        self.stats = {
+            "handshake_hits": 0,
+            "handshake_misses": 0,
+            "handshake_resets": 0,
+            "requests": 0,
+            "timeouts": 0,
+        }
 
         key = hashlib.md5(self.token).digest()
         iv = hashlib.md5(key + self.token).digest()
@@ -40,53 +63,152 @@ class BasemiIO:
             algorithms.AES(key), modes.CBC(iv), backend=default_backend()
         )
 
-    def _encrypt(self, plaintext: bytes):
-        padder = padding.PKCS7(128).padder()
-        padded_plaintext = padder.update(plaintext) + padder.finalize()
+    @property
+    def loss_rate(self) -> float:
+        if not self.stats["requests"]:
+            return 0.0
+        return self.stats["timeouts"] / self.stats["requests"]
+
+    @staticmethod
+    def is_read(method: str) -> bool:
+        """Reads can be repeated safely, writes and actions can't."""
+        return method.startswith("get_") or method == "miIO.info"
+
+    def attempt_timeout(self, method: str = None) -> float | None:
+        """Time to wait for an answer on one attempt. Writes and actions
+        wait for the full timeout, the learned one is from fast reads.
+        """
+        if not self.timeout:
+            return None
+        if method and not self.is_read(method):
+            return self.timeout
+        return self.rto
+
+    def add_rtt(self, rtt: float):
+        """Update the retransmission timeout with a measured round trip time.
+        Answers to earlier attempts are not measured (Karn's algorithm).
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        if self.timeout:
+            rto = self.srtt + 4 * self.rttvar
+            self.rto = min(max(rto, self.min_rto), self.timeout)
+
+    def add_timeout(self):
+        """Back off, until the next answer is measured."""
+        if self.timeout:
+            self.rto = min(self.rto * 2, self.timeout)
 
+    @property
+    def session_age(self) -> float | None:
+        if self.delta_ts is None or self.session_time is None:
+            return None
+        return time.monotonic() - self.session_time
+
+    def has_session(self) -> bool:
+        """Returns `true` if the cached handshake can be used, and counts it."""
+        age = self.session_age
+        if age is None or age >= self.session_ttl:
+            self.stats["handshake_misses"] += 1
+            return False
+        self.stats["handshake_hits"] += 1
+        return True
+
+    def set_session(self, raw: bytes, received: float = None):
+        """Save device id and time delta from the answer on HELLO, received
+        now or at the `received` timestamp.
+        """
+        now = time.time()
+        if received is None:
+            received = now
+        _, self.device_id, ts = self._parse_header(raw)
+        self.delta_ts = received - ts
+        self.session_time = time.monotonic() - (now - received)
+
+    def reset_session(self, reason: str):
+        """Forget the handshake, when device id or token doesn't match or the
+        device doesn't answer on HELLO. Lost answers on commands keep it.
+        """
+        if self.delta_ts is None:
+            return
+        _LOGGER.debug(f"{self.addr[0]} | Reset handshake: {reason}")
+        self.stats["handshake_resets"] += 1
+        self.delta_ts = None
+        self.session_time = None
+
+    @staticmethod
+    def _padded(data: bytes, zeros: int = 0) -> bytearray:
+        """Copy data into a new buffer with PKCS7 padding, optionally with
+        some zero bytes before the padding.
+        """
+        size = len(data) + zeros
+        pad = 16 - size % 16
+        buf = bytearray(size + pad)
+        buf[: len(data)] = data
+        buf[size:] = PADDING[pad]
+        return buf
+
+    def _encrypt(self, plaintext: bytes):
         encryptor = self.cipher.encryptor()
-        return encryptor.update(padded_plaintext) + encryptor.finalize()
+        return encryptor.update(self._padded(plaintext)) + encryptor.finalize()
 
     def _decrypt(self, ciphertext: bytes):
+        # decrypt into a buffer and cut the padding off in place
+        buf = bytearray(len(ciphertext) + 15)
         decryptor = self.cipher.decryptor()
-        padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-
-        unpadder = padding.PKCS7(128).unpadder()
-        return unpadder.update(padded_plaintext) + unpadder.finalize()
+        size = decryptor.update_into(ciphertext, buf)
+        decryptor.finalize()
+        pad = buf[size - 1] if size else 0
+        if not 0 < pad <= 16 or buf[size - pad : size] != PADDING[pad]:
+            raise ValueError("Invalid padding bytes.")
+        del buf[size - pad :]
+        return buf
+
+    @staticmethod
+    def _parse_header(raw: bytes) -> tuple[int, int, int]:
+        """Returns length, device id and timestamp of the packet."""
+        _, length, _, device_id, ts = HEADER.unpack_from(raw)
+        return length, device_id, ts
 
     def _pack_raw(self, msg_id: int, method: str, params: Union[dict, list] = None):
+        payload = json.dumps(
+            {"id": msg_id, "method": method, "params": params or []},
+            separators=(",", ":"),
+        ).encode()
         # latest zero unnecessary
-        payload = (
-            json.dumps(
-                {"id": msg_id, "method": method, "params": params or []},
-                separators=(",", ":"),
-            ).encode()
-            + b"\x00"
-        )
+        plain = self._padded(payload, zeros=1)
+        size = 32 + len(plain)
 
-        data = self._encrypt(payload)
-
-        raw = b"\x21\x31"
-        raw += (32 + len(data)).to_bytes(2, "big")  # total length
-        raw += b"\x00\x00\x00\x00"  # unknow
-        raw += self.device_id.to_bytes(4, "big")
-        raw += int(time.time() - self.delta_ts).to_bytes(4, "big")
+        # encrypt right after the header, encryptor needs one block of space
+        raw = bytearray(size + 15)
+        view = memoryview(raw)
+        encryptor = self.cipher.encryptor()
+        encryptor.update_into(plain, view[32:])
+        encryptor.finalize()
 
-        raw += hashlib.md5(raw + self.token + data).digest()
-        raw += data
+        ts = int(time.time() - self.delta_ts)
+        HEADER.pack_into(raw, 0, 0x2131, size, 0, self.device_id, ts)
+        checksum = hashlib.md5(view[:16])
+        checksum.update(self.token)
+        checksum.update(view[32:size])
+        view[16:32] = checksum.digest()
+        view.release()
+        del raw[size:]
 
-        assert len(raw) < 1024, "Exceeded message size"
+        assert size < 1024, "Exceeded message size"
 
         return raw
 
     def _unpack_raw(self, raw: bytes):
         assert raw[:2] == b"\x21\x31"
-        # length = int.from_bytes(raw[2:4], 'big')
+        # length, device_id, ts = self._parse_header(raw)
         # unknown = raw[4:8]
-        # device_id = int.from_bytes(raw[8:12], 'big')
-        # ts = int.from_bytes(raw[12:16], 'big')
         # checksum = raw[16:32]
-        return self._decrypt(raw[32:])
+        return self._decrypt(memoryview(raw)[32:])
 
 
 class SyncMiIO(BasemiIO):
@@ -100,8 +222,7 @@ class SyncMiIO(BasemiIO):
             sock.sendto(HELLO, self.addr)
             raw = sock.recv(1024)
             if raw[:2] == b"\x21\x31":
-                self.device_id = int.from_bytes(raw[8:12], "big")
-                self.delta_ts = time.time() - int.from_bytes(raw[12:16], "big")
+                self.set_session(raw)
                 return True
         except Exception:
             pass
@@ -121,7 +242,7 @@ class SyncMiIO(BasemiIO):
                 sock.settimeout(self.timeout)
 
                 # need device_id for send command, can get it from ping cmd
-                if self.delta_ts is None and not self.ping(sock):
+                if not self.has_session() and not self.ping(sock):
                     pings += 1
                     continue
 
@@ -149,14 +270,19 @@ class SyncMiIO(BasemiIO):
                 _LOGGER.debug(f"{self.addr[0]} | wrong ID")
 
             except socket.timeout:
+                # lost packet, handshake is still valid
                 _LOGGER.debug(f"{self.addr[0]} | timeout {times}")
+            except OSError as e:
+                _LOGGER.debug(f"{self.addr[0]} | {e}")
             except Exception as e:
                 _LOGGER.debug(f"{self.addr[0]}", exc_info=e)
-
-            # init ping again
-            self.delta_ts = None
+                # can't decode answer, token or device id mismatch
+                self.reset_session(f"{e}")
 
         else:
+            if pings:
+                # device rebooted or was replaced, init ping on next command
+                self.reset_session("no answer on handshake")
             _LOGGER.debug(
                 f"{self.addr[0]} | Device offline"
                 if pings >= 2
@@ -204,69 +330,317 @@ class SyncMiIO(BasemiIO):
 
 
 # noinspection PyUnusedLocal
-class AsyncSocket(DatagramProtocol):
-    timeout = 0
+class RetryBudget:
+    """Retries are allowed for a share of the requests, so offline devices
+    don't multiply the traffic and the time spent waiting for answers.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: int = 20):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = float(reserve)
+
+    def deposit(self):
+        self.balance = min(self.balance + self.ratio, self.reserve)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class MiIOMultiplexer(DatagramProtocol):
+    """One datagram endpoint shared by all asyncio miIO clients of a loop.
+
+    Incoming packets are dispatched by source address to the registered
+    clients, which match them by device id and message id.
+    """
+
+    instances: "WeakKeyDictionary[asyncio.AbstractEventLoop, MiIOMultiplexer]" = (
+        WeakKeyDictionary()
+    )
     transport: DatagramTransport = None
-    response: Future = None
 
     def __init__(self):
-        self.response = asyncio.get_event_loop().create_future()
+        self.opened = asyncio.get_running_loop().create_future()
+        self.clients: dict[tuple, list["AsyncMiIO"]] = {}
+        self.stats = {
+            "sent": 0,
+            "sent_bytes": 0,
+            "received": 0,
+            "received_bytes": 0,
+            "dropped": 0,
+            "requests": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "errors": 0,
+        }
+        # shared by all clients of the endpoint
+        self.budget = RetryBudget()
+        # answers on HELLO by device id, collected by running discoveries
+        self.sweeps: list[dict[int, tuple]] = []
+
+    @classmethod
+    async def async_get(cls) -> "MiIOMultiplexer":
+        """Get the endpoint of the running loop, open it on first use."""
+        loop = asyncio.get_running_loop()
+        mux = cls.instances.get(loop)
+        if mux is None or mux.closed:
+            mux = cls.instances[loop] = cls()
+            try:
+                await loop.create_datagram_endpoint(
+                    lambda: mux, local_addr=("0.0.0.0", 0)
+                )
+            except Exception as exc:
+                cls.instances.pop(loop, None)
+                if not mux.opened.done():
+                    mux.opened.set_exception(exc)
+                raise
+        await asyncio.shield(mux.opened)
+        return mux
+
+    @property
+    def closed(self) -> bool:
+        return self.opened.done() and not self.transport
 
     def connection_made(self, transport: DatagramTransport):
-        # _LOGGER.debug(f"connection_made {transport}")
         self.transport = transport
+        try:
+            sock = transport.get_extra_info("socket")
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            # for discovery
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        except (AttributeError, OSError):
+            pass
+        if not self.opened.done():
+            self.opened.set_result(True)
 
     def datagram_received(self, data: bytes, addr):
-        # _LOGGER.debug(f"datagram_received {data}")
-        self.response.set_result(data)
-
-    def settimeout(self, value: int):
-        self.timeout = value
+        self.stats["received"] += 1
+        self.stats["received_bytes"] += len(data)
+        handled = False
+        if len(data) == 32 and self.sweeps and data[:2] == b"\x21\x31":
+            device_id = int.from_bytes(data[8:12], "big")
+            for found in self.sweeps:
+                found[device_id] = (addr[:2], data, time.time())
+            handled = True
+        for client in self.clients.get(addr[:2], ()):
+            if client.datagram_received(data):
+                handled = True
+                if len(data) > 32:
+                    # only answers on HELLO are shared between clients
+                    break
+        if not handled:
+            self.stats["dropped"] += 1
+
+    def error_received(self, exc: Exception):
+        self.stats["errors"] += 1
+        _LOGGER.debug(f"Shared socket error: {exc}")
+
+    def connection_lost(self, exc: Exception | None):
+        self.transport = None
+        clients = [c for lst in self.clients.values() for c in lst]
+        self.clients = {}
+        for client in clients:
+            client.connection_error(exc)
+
+    def register(self, client: "AsyncMiIO", addr: tuple):
+        lst = self.clients.setdefault(addr, [])
+        if client not in lst:
+            lst.append(client)
+
+    def unregister(self, client: "AsyncMiIO", addr: tuple):
+        lst = self.clients.get(addr) or []
+        if client in lst:
+            lst.remove(client)
+        if not lst:
+            self.clients.pop(addr, None)
+
+    async def discover(
+        self, hosts: list[str], timeout: float = 1, port: int = 54321
+    ) -> dict[int, tuple]:
+        """Send HELLO to broadcast addresses and collect the answers in one
+        pass. Returns the address, answer and time of the answer of each
+        device by device id.
+        """
+        found = {}
+        self.sweeps.append(found)
+        try:
+            for host in hosts:
+                try:
+                    self.sendto(HELLO, (host, port))
+                except OSError as exc:
+                    _LOGGER.debug(f"{host} | Discovery failed: {exc}")
+            await asyncio.sleep(timeout)
+        finally:
+            self.sweeps.remove(found)
+        return found
+
+    def sendto(self, data: bytes, addr: tuple):
+        if not self.transport:
+            raise ConnectionError("Shared socket closed")
+        self.transport.sendto(data, addr)
+        self.stats["sent"] += 1
+        self.stats["sent_bytes"] += len(data)
 
-    def sendto(self, data: bytes):
-        self.transport.sendto(data)
 
-    def close(self):
-        if not self.transport:
-            return
+# noinspection PyMethodMayBeStatic,PyTypeChecker
+class AsyncMiIO(BasemiIO, BaseProtocol):
+    mux: MiIOMultiplexer = None
+    remote: tuple = None
+    refresh_task: asyncio.Task = None
+
+    def __init__(self, host: str, token: str, timeout: float = 3, port: int = 54321):
+        super().__init__(host, token, timeout, port)
+        # requests waiting for an answer, by message id
+        self.pending: dict[int, Future] = {}
+        # requests waiting for a handshake answer
+        self.hellos: list[Future] = []
+
+    async def connect(self) -> MiIOMultiplexer:
+        """Register on the shared endpoint, unless it is already done."""
+        if self.mux and self.mux.transport:
+            return self.mux
+        mux = await MiIOMultiplexer.async_get()
+        if not self.remote:
+            self.remote = await self.resolve(self.addr)
+        mux.register(self, self.remote)
+        self.mux = mux
+        return mux
+
+    @staticmethod
+    async def resolve(addr: tuple) -> tuple:
         try:
-            self.transport.close()
-        except Exception as e:
-            _LOGGER.error("Error when closing async socket", exc_info=e)
-
-    async def connect(self, addr: tuple[str, int]):
-        coro = asyncio.get_event_loop().create_datagram_endpoint(
-            lambda: self, remote_addr=addr
+            socket.inet_aton(addr[0])
+            return addr
+        except OSError:
+            pass
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            *addr, family=socket.AF_INET, type=socket.SOCK_DGRAM
         )
-        if self.timeout:
-            await asyncio.wait_for(coro, self.timeout)
-        else:
-            await coro
+        return infos[0][4][:2]
 
-    async def recv(self, *args):
-        self.response = asyncio.get_event_loop().create_future()
-        if self.timeout:
-            return await asyncio.wait_for(self.response, self.timeout)
-        return await self.response
+    def close(self):
+        """Leave the shared endpoint. The next request will register again."""
+        mux, self.mux = self.mux, None
+        if mux and self.remote:
+            mux.unregister(self, self.remote)
+        self.remote = None
+        self.fail_pending(ConnectionError(f"{self.addr[0]} | Client closed"))
+
+    def move(self, host: str):
+        """Use the new address of the device, found by discovery."""
+        if host == self.addr[0]:
+            return
+        _LOGGER.info(f"{self.addr[0]} | Device moved to {host}")
+        if self.mux and self.remote:
+            self.mux.unregister(self, self.remote)
+        self.addr = (host, self.addr[1])
+        self.remote = None
+        self.mux = None
+
+    def fail_pending(self, exc: Exception):
+        for fut in [*self.pending.values(), *self.hellos]:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def connection_error(self, exc: Exception | None):
+        _LOGGER.debug(f"{self.addr[0]} | Socket error: {exc}")
+        # register again on next request
+        self.mux = None
+        self.fail_pending(exc or ConnectionError(f"{self.addr[0]} | Socket lost"))
 
+    def sendto(self, data: bytes):
+        self.mux.sendto(data, self.remote)
 
-# noinspection PyMethodMayBeStatic,PyTypeChecker
-class AsyncMiIO(BasemiIO, BaseProtocol):
-    async def ping(self, sock: AsyncSocket) -> bool:
+    def datagram_received(self, raw: bytes) -> bool:
+        """Handle a packet from the device address, returns `true` if the
+        packet was expected by this client.
+        """
+        if raw[:2] != b"\x21\x31":
+            return False
+        if len(raw) == 32:
+            # answer on HELLO
+            waiting = [f for f in self.hellos if not f.done()]
+            for fut in waiting:
+                fut.set_result(raw)
+            return bool(waiting)
+        if not self.pending:
+            return False
+        if self.device_id and self._parse_header(raw)[1] != self.device_id:
+            # another device got this address
+            self.reset_session("device id mismatch")
+            return False
+        try:
+            data = self._unpack_raw(raw).rstrip(b"\x00")
+            if data == b"":
+                # mgl03 fw 1.4.6_0012 without Internet respond on miIO.info
+                # command with empty answer, it can't be matched by ID
+                waiting = list(
+                    dict.fromkeys(f for f in self.pending.values() if not f.done())
+                )
+                if len(waiting) == 1:
+                    waiting[0].set_result({})
+                return bool(waiting)
+            data = json.loads(data)
+        except Exception as e:
+            _LOGGER.debug(f"{self.addr[0]} | Can't decode answer", exc_info=e)
+            # wrong token
+            self.reset_session("can't decode answer")
+            return False
+        fut = self.pending.get(data.get("id")) if isinstance(data, dict) else None
+        if fut is None or fut.done():
+            # late answer on previous request or answer to another client
+            _LOGGER.debug(f"{self.addr[0]} | Drop answer with unknown ID")
+            return False
+        fut.set_result(data)
+        return True
+
+    async def ping(self) -> bool:
         """Returns `true` if the connection to the miio device is working. The
         token is not verified at this stage.
         """
+        fut = asyncio.get_running_loop().create_future()
+        self.hellos.append(fut)
         try:
-            sock.sendto(HELLO)
-            raw = await sock.recv(1024)
-            if raw[:2] == b"\x21\x31":
-                self.device_id = int.from_bytes(raw[8:12], "big")
-                self.delta_ts = time.time() - int.from_bytes(raw[12:16], "big")
-                return True
+            # not registered after close, move or a socket error
+            await self.connect()
+            self.sendto(HELLO)
+            # not measured, the answer on HELLO is faster than on commands
+            raw = await asyncio.wait_for(fut, self.attempt_timeout())
+            self.set_session(raw)
+            return True
+        except asyncio.TimeoutError:
+            self.add_timeout()
         except Exception:
             pass
+        finally:
+            self.hellos.remove(fut)
         return False
 
+    async def handshake(self) -> bool:
+        """Ping the device, requests sent at the same time share one ping."""
+        if not self.refresh_task or self.refresh_task.done():
+            self.refresh_task = asyncio.get_running_loop().create_task(self.ping())
+        return await asyncio.shield(self.refresh_task)
+
+    def refresh_session_later(self):
+        """Renew the handshake in background before it expires."""
+        age = self.session_age
+        if age is None or age < self.session_ttl * 0.8:
+            return
+        if self.refresh_task and not self.refresh_task.done():
+            return
+        self.refresh_task = asyncio.get_running_loop().create_task(self.ping())
+
+    def next_msg_id(self) -> int:
+        while True:
+            msg_id = random.randint(100000000, 999999999)
+            if msg_id not in self.pending:
+                return msg_id
+
     async def send(self, method: str, params: Union[dict, list] = None, tries=3):
         """Send command to miIO device and get result from it. Params can be
         dict or list depend on command.
@@ -278,61 +652,119 @@ class AsyncMiIO(BasemiIO, BaseProtocol):
         - {'id':123,'error':...}
         """
         offline = False
-        for _ in range(0, tries):
-            sock = AsyncSocket()
-            sock.settimeout(self.timeout)
-            try:
-                # create socket every time for reset connection, because we can
-                # reseive answer on previous request or request from another
-                # thread
-                await sock.connect(self.addr)
-
-                # need device_id for send command, can get it from ping cmd
-                if self.delta_ts is None and not await self.ping(sock):
-                    # device doesn't answered on ping
-                    offline = True
-                    continue
-
-                # pack each time for new message id
-                msg_id = random.randint(100000000, 999999999)
-                raw_send = self._pack_raw(msg_id, method, params)
-                sock.sendto(raw_send)
-                # can receive more than 1024 bytes (1056 approximate maximum)
-                raw_recv = await sock.recv(10240)
-                data = self._unpack_raw(raw_recv).rstrip(b"\x00")
-
-                if data == b"":
-                    # mgl03 fw 1.4.6_0012 without Internet respond on miIO.info
-                    # command with empty answer
-                    continue
-
-                data = json.loads(data)
-                # check if we received response for our cmd
-                if data["id"] != msg_id:
-                    _LOGGER.debug(f"{self.addr[0]} | wrong answer ID")
-                    continue
-
-                return data
-
-            except (asyncio.TimeoutError, OSError):
-                # OSError: [Errno 101] Network unreachable
-                pass
-            except Exception as e:
-                _LOGGER.debug(f"{self.addr[0]} | {method}", exc_info=e)
-            finally:
-                sock.close()
-
-            # init ping again
-            self.delta_ts = None
+        # all attempts wait for one answer, a late answer to an earlier
+        # attempt is taken too
+        fut = None
+        msg_ids = []
+        try:
+            for attempt in range(0, tries):
+                if attempt and self.mux:
+                    if not self.mux.budget.withdraw():
+                        self.mux.stats["retries_denied"] += 1
+                        _LOGGER.debug(f"{self.addr[0]} | No retry budget for {method}")
+                        break
+                    self.mux.stats["retries"] += 1
+                try:
+                    # the endpoint is shared by all clients, answers are matched
+                    # with requests by address, device id and message id
+                    mux = await self.connect()
+                    if not attempt:
+                        mux.budget.deposit()
+
+                    # need device_id for send command, can get it from ping cmd
+                    if self.has_session():
+                        self.refresh_session_later()
+                    elif not await self.handshake():
+                        # device doesn't answered on ping
+                        offline = True
+                        continue
+
+                    if fut is None or fut.done():
+                        # first attempt, or after an empty answer
+                        fut = asyncio.get_running_loop().create_future()
+                        for msg_id in msg_ids:
+                            self.pending[msg_id] = fut
+                    # pack each time for new message id
+                    msg_id = self.next_msg_id()
+                    msg_ids.append(msg_id)
+                    raw_send = self._pack_raw(msg_id, method, params)
+                    self.pending[msg_id] = fut
+                    mux.stats["requests"] += 1
+                    self.stats["requests"] += 1
+                    try:
+                        self.sendto(raw_send)
+                        sent = time.monotonic()
+                        # can receive more than 1024 bytes (1056 approximate maximum)
+                        data = await asyncio.wait_for(
+                            asyncio.shield(fut), self.attempt_timeout(method)
+                        )
+                        if data.get("id", msg_id) == msg_id:
+                            self.add_rtt(time.monotonic() - sent)
+                    except asyncio.TimeoutError:
+                        mux.stats["timeouts"] += 1
+                        self.stats["timeouts"] += 1
+                        self.add_timeout()
+                        raise
+
+                    if not data:
+                        # empty answer
+                        continue
+
+                    return data
+
+                except (asyncio.TimeoutError, OSError):
+                    # lost packet, handshake is still valid
+                    # OSError: [Errno 101] Network unreachable
+                    pass
+                except Exception as e:
+                    _LOGGER.debug(f"{self.addr[0]} | {method}", exc_info=e)
+        finally:
+            for msg_id in msg_ids:
+                self.pending.pop(msg_id, None)
 
         if offline:
+            # device rebooted or was replaced, init ping on next command
+            self.reset_session("no answer on handshake")
             _LOGGER.debug(f"{self.addr[0]} | Device offline")
             return None
 
         _LOGGER.debug(f"{self.addr[0]} | No answer on {method} {params}")
         return {}
 
-    async def send_bulk(self, method: str, params: list, chunk: int = 0) -> list:
+    async def send_chunks(
+        self,
+        method: str,
+        params: list,
+        chunk: int,
+        window: int = 1,
+        slots: asyncio.Semaphore = None,
+    ) -> list:
+        """Sends params in chunks, with up to `window` requests in flight.
+        Each request also takes one of the `slots`, when they are shared with
+        other requests to the same endpoint. Returns the answers in order of
+        the chunks, up to the first chunk without result. Chunks after it are
+        not sent.
+        """
+        parts = [params[i : i + chunk] for i in range(0, len(params), chunk)]
+        answers = [None] * len(parts)
+        failed = len(parts)
+        semaphore = asyncio.Semaphore(max(1, window))
+
+        async def send_part(idx: int):
+            nonlocal failed
+            async with semaphore, slots or contextlib.nullcontext():
+                if idx > failed:
+                    return
+                resp = answers[idx] = await self.send(method, parts[idx])
+                if not isinstance(resp, dict) or "result" not in resp:
+                    failed = min(failed, idx)
+
+        await asyncio.gather(*[send_part(idx) for idx in range(len(parts))])
+        return answers[: failed + 1]
+
+    async def send_bulk(
+        self, method: str, params: list, chunk: int = 0, window: int = 1
+    ) -> list:
         """Sends a command with a large number of parameters. Splits into
         multiple requests when the size of one request is exceeded.
         """
@@ -340,8 +772,7 @@ class AsyncMiIO(BasemiIO, BaseProtocol):
             chunk = 15
         try:
             result = []
-            for i in range(0, len(params), chunk):
-                resp = await self.send(method, params[i : i + chunk])
+            for resp in await self.send_chunks(method, params, chunk, window):
                 result += resp["result"]
             return result
         except Exception:
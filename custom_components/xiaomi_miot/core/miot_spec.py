@@ -4,7 +4,7 @@ import platform
 import random
 import time
 import re
-from functools import cached_property
+from sys import intern
 from collections.abc import Iterable
 
 from homeassistant.core import HomeAssistant
@@ -33,7 +33,8 @@ from .const import (
     DOMAIN,
     TRANSLATION_LANGUAGES,
 )
-from .utils import get_translation_langs, convert_globs_to_pattern
+from .model_catalog import ModelCatalog
+from .utils import get_translation_langs, layered_translations, is_glob, match_globs
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -77,16 +78,84 @@ SPEC_ERRORS = {
 }
 
 
+# equal lists of all loaded specs share one tuple
+SHARED_TUPLES = {}
+
+
+def freeze(val):
+    """Hashable form of a json value, 1, 1.0 and True are kept apart."""
+    if isinstance(val, dict):
+        return dict, tuple(sorted((k, freeze(v)) for k, v in val.items()))
+    if isinstance(val, (list, tuple)):
+        return list, tuple(freeze(v) for v in val)
+    return type(val), val
+
+
+def shared_tuple(lst) -> tuple:
+    val = tuple(lst or ())
+    if not val:
+        return val
+    try:
+        # flat values, like access modes and ranges
+        return SHARED_TUPLES.setdefault((val, tuple(map(type, val))), val)
+    except TypeError:
+        pass
+    try:
+        return SHARED_TUPLES.setdefault(freeze(val), val)
+    except TypeError:
+        # unhashable values
+        return val
+
+
+def lookup_index(instances) -> dict:
+    """Instances by each of their lookup names, in their original order."""
+    idx = {}
+    for ins in instances:
+        for name in ins.match_names:
+            idx.setdefault(name, []).append(ins)
+    return idx
+
+
 # https://iot.mi.com/new/doc/tools-and-resources/design/spec/overall
 # https://iot.mi.com/new/doc/tools-and-resources/design/spec/xiaoai
 # https://iot.mi.com/new/doc/tools-and-resources/design/spec/shortcut
 class MiotSpecInstance:
+    __slots__ = ('iid', 'type', 'name', 'description', '_match_names', '_extra')
+    # keys of the spec parsed into fields, the others are kept in `_extra`
+    parsed_keys = frozenset(('iid', 'type', 'description'))
+
     def __init__(self, dat: dict):
-        self.raw = dat
         self.iid = int(dat.get('iid') or 0)
         self.type = str(dat.get('type') or '')
-        self.name = self.name_by_type(self.type)
+        self.name = intern(self.name_by_type(self.type))
         self.description = dat.get('description') or ''
+        self._match_names = None
+        self._extra = {k: v for k, v in dat.items() if k not in self.parsed_keys} or None
+
+    @property
+    def raw(self):
+        """The spec of the instance, rebuilt from the parsed fields and
+        the keys that were not parsed.
+        """
+        return {
+            **(self._extra or {}),
+            'iid': self.iid,
+            'type': self.type,
+            'description': self.description,
+        }
+
+    def lookup_names(self):
+        return []
+
+    @property
+    def match_names(self) -> frozenset:
+        """Names the instance can be looked up by, see `in_list`."""
+        if self._match_names is None:
+            self._match_names = frozenset(self.lookup_names())
+        return self._match_names
+
+    def in_list(self, lst):
+        return match_globs(self.match_names, lst)
 
     @staticmethod
     def format_name(nam):
@@ -108,16 +177,9 @@ class MiotSpecInstance:
     def translation_keys(self):
         return ['_globals']
 
-    @cached_property
+    @property
     def translations(self):
-        dic = TRANSLATION_LANGUAGES
-        kls = self.translation_keys
-        for k in kls:
-            d = dic.get(k)
-            if not isinstance(d, dict):
-                continue
-            dic = {**dic, **d}
-        return dic
+        return layered_translations(self.translation_keys, nested=True)
 
     def get_translation(self, des, viid=None, spec=True):
         dls = [
@@ -159,6 +221,9 @@ class MiotSpecInstance:
 
 # https://iot.mi.com/new/doc/design/spec/xiaoai
 class MiotSpec(MiotSpecInstance):
+    # one per spec tree, keeps a __dict__
+    parsed_keys = MiotSpecInstance.parsed_keys | {'services'}
+
     def __init__(self, hass: HomeAssistant, dat: dict, translations=None, trans_options=None):
         self.hass = hass
         self.trans_options = trans_options
@@ -170,9 +235,11 @@ class MiotSpec(MiotSpecInstance):
         self.specs = {}
         self.custom_mapping = None
         self.custom_mapping_names = {}
+        self._services_index = None
         self.extend_specs(services=dat.get('services') or [])
 
     def extend_specs(self, services: list):
+        self._services_index = None
         for s in (services or []):
             srv = MiotService(s, self)
             if srv.iid in self.services:
@@ -219,6 +286,8 @@ class MiotSpec(MiotSpecInstance):
                 if not n:
                     continue
                 p.full_name = n
+                p._match_names = None
+            s._properties_index = None
 
     def get_services(self, *args, **kwargs):
         excludes = kwargs.get('excludes') or []
@@ -229,9 +298,19 @@ class MiotSpec(MiotSpecInstance):
             if not s.in_list(excludes) and (not args or s.in_list(args))
         ]
 
+    @property
+    def services_index(self) -> dict:
+        if self._services_index is None:
+            self._services_index = lookup_index(self.services.values())
+        return self._services_index
+
     def get_service(self, *args):
         for a in args:
-            for s in self.services.values():
+            if is_glob(a):
+                lst = self.services.values()
+            else:
+                lst = self.services_index.get(str(a), [])
+            for s in lst:
                 if not s.in_list([a]):
                     continue
                 return s
@@ -289,60 +368,7 @@ class MiotSpec(MiotSpecInstance):
 
     @staticmethod
     async def async_get_model_type(hass, model, use_remote=False):
-        if not model:
-            return None
-        fnm = f'{DOMAIN}/instances.json'
-        store = Store(hass, 1, fnm)
-        try:
-            cached = await store.async_load() or {}
-        except (ValueError, HomeAssistantError):
-            await store.async_remove()
-            cached = {}
-        now = int(time.time())
-        dat = {}
-        if not use_remote:
-            dat = cached
-            ptm = dat.pop('_updated_time', 0)
-            if dat and now - ptm > 86400 * 7:
-                dat = {}
-        if not dat:
-            try:
-                url = '/miot-spec-v2/instances?status=all'
-                dat = await MiotSpec.async_download_miot_spec(hass, url, tries=3, timeout=90)
-                if dat:
-                    sdt = {
-                        '_updated_time': now,
-                    }
-                    for v in (dat.get('instances') or []):
-                        m = v.get('model')
-                        o = sdt.get(m) or {}
-                        if o:
-                            if o.get('status') == 'released' and v.get('status') != o.get('status'):
-                                continue
-                            if v.get('version') < o.get('version'):
-                                continue
-                        v.pop('model', None)
-                        sdt[m] = v
-                    await store.async_save(sdt)
-                    dat = sdt
-                    _LOGGER.info(
-                        'Renew miot spec instances: %s, count: %s, model: %s',
-                        fnm, len(sdt) - 1, model,
-                    )
-            except (TypeError, ValueError, BaseException) as exc:
-                if not cached:
-                    raise exc
-                dat = cached
-                _LOGGER.warning('Get miot specs filed: %s, use cached.', exc)
-        typ = None
-        if 'instances' in dat:
-            for v in (dat.get('instances') or []):
-                if model == v.get('model'):
-                    typ = v.get('type')
-                    break
-        elif model in dat:
-            typ = dat[model].get('type')
-        return typ
+        return await ModelCatalog.get(hass).async_get_type(model, use_remote)
 
     @staticmethod
     async def async_from_type(hass, typ, trans_options=False):
@@ -486,34 +512,35 @@ class MiotSpec(MiotSpecInstance):
 
 # https://miot-spec.org/miot-spec-v2/spec/services
 class MiotService(MiotSpecInstance):
+    __slots__ = (
+        'spec', 'unique_name', 'desc_name', 'friendly_desc',
+        'properties', 'actions', '_properties_index',
+    )
+    parsed_keys = MiotSpecInstance.parsed_keys | {'properties', 'actions'}
+
     def __init__(self, dat: dict, spec: MiotSpec):
         self.spec = spec
         super().__init__(dat)
-        self.unique_name = f'{self.name}-{self.iid}'
-        self.desc_name = self.format_desc_name(self.description, self.name)
+        self.unique_name = intern(f'{self.name}-{self.iid}')
+        self.desc_name = intern(self.format_desc_name(self.description, self.name))
         self.friendly_desc = self.get_translation(self.description or self.name)
         spec.services_count.setdefault(self.name, 0)
         spec.services_count[self.name] += 1
         self.properties = {}
         self.actions = {}
+        self._properties_index = None
         self.extend_specs(properties=dat.get('properties') or [], actions=dat.get('actions') or [])
 
-    def in_list(self, lst):
-        pattern = convert_globs_to_pattern(lst)
-        if not pattern:
-            return False
-        names = [
+    def lookup_names(self):
+        return [
             self.name,
             self.friendly_desc,
             self.unique_name,
             self.desc_name,
         ]
-        for name in names:
-            if pattern.match(name):
-                return True
-        return False
 
     def extend_specs(self, properties: list, actions: list):
+        self._properties_index = None
         for p in properties:
             iid = int(p.get('iid') or 0)
             if old := self.properties.get(iid):
@@ -573,9 +600,19 @@ class MiotService(MiotSpecInstance):
                and (not args or p.in_list(args, only_format=only_format, exclude_format=exclude_format))
         ]
 
+    @property
+    def properties_index(self) -> dict:
+        if self._properties_index is None:
+            self._properties_index = lookup_index(self.properties.values())
+        return self._properties_index
+
     def get_property(self, *args, only_format=None, exclude_format=None):
         for a in args:
-            for p in self.properties.values():
+            if is_glob(a):
+                lst = self.properties.values()
+            else:
+                lst = self.properties_index.get(str(a), [])
+            for p in lst:
                 if not p.in_list([a], only_format=only_format, exclude_format=exclude_format):
                     continue
                 return p
@@ -649,19 +686,25 @@ class MiotService(MiotSpecInstance):
 
 # https://miot-spec.org/miot-spec-v2/spec/properties
 class MiotProperty(MiotSpecInstance):
+    __slots__ = (
+        'service', 'siid', 'unique_name', 'unique_prop', 'desc_name', 'friendly_name',
+        'format', 'access', 'unit', 'value_list', 'value_range', 'full_name', 'friendly_desc',
+    )
+    parsed_keys = MiotSpecInstance.parsed_keys | {'format', 'access', 'unit', 'value-list', 'value-range'}
+
     def __init__(self, dat: dict, service: MiotService):
         self.service = service
         self.siid = service.iid
         super().__init__(dat)
-        self.unique_name = f'{service.unique_name}.{self.name}-{self.iid}'
-        self.unique_prop = self.service.unique_prop(piid=self.iid)
-        self.desc_name = self.format_desc_name(self.description, self.name)
-        self.friendly_name = f'{service.name}.{self.name}'
-        self.format = dat.get('format') or ''
-        self.access = dat.get('access') or []
-        self.unit = dat.get('unit') or ''
-        self.value_list = dat.get('value-list') or []
-        self.value_range = dat.get('value-range') or []
+        self.unique_name = intern(f'{service.unique_name}.{self.name}-{self.iid}')
+        self.unique_prop = intern(self.service.unique_prop(piid=self.iid))
+        self.desc_name = intern(self.format_desc_name(self.description, self.name))
+        self.friendly_name = intern(f'{service.name}.{self.name}')
+        self.format = intern(dat.get('format') or '')
+        self.access = shared_tuple(dat.get('access'))
+        self.unit = intern(dat.get('unit') or '')
+        self.value_list = shared_tuple(dat.get('value-list'))
+        self.value_range = shared_tuple(dat.get('value-range'))
         self.full_name = ''
         if self.name and service.name:
             if self.name == service.name:
@@ -683,12 +726,24 @@ class MiotProperty(MiotSpecInstance):
             elif len(self.full_name) >= 32:
                 # miot did length must less than 32
                 self.full_name = f'{self.desc_name}-{self.siid}-{self.iid}'
+            self.full_name = intern(self.full_name)
             service.spec.services_properties[self.full_name] = {
                 'siid': self.siid,
                 'piid': self.iid,
             }
         self.friendly_desc = self.short_desc
 
+    @property
+    def raw(self):
+        return {
+            **super().raw,
+            'format': self.format,
+            'access': list(self.access),
+            'unit': self.unit,
+            'value-list': list(self.value_list),
+            'value-range': list(self.value_range),
+        }
+
     def in_list(self, lst, only_format=None, exclude_format=None):
         value_type = self.format
         if self.value_list:
@@ -704,10 +759,10 @@ class MiotProperty(MiotSpecInstance):
             if exclude_format & {value_type, self.format}:
                 return False
 
-        pattern = convert_globs_to_pattern(lst)
-        if not pattern:
-            return False
-        names = [
+        return super().in_list(lst)
+
+    def lookup_names(self):
+        return [
             self.name,
             self.friendly_name,  # service.prop
             self.full_name,
@@ -716,10 +771,6 @@ class MiotProperty(MiotSpecInstance):
             f'{self.service.name}.{self.desc_name}',
             self.desc_name,
         ]
-        for name in names:
-            if pattern.match(name):
-                return True
-        return False
 
     @property
     def short_desc(self):
@@ -1084,33 +1135,40 @@ class MiotProperty(MiotSpecInstance):
 
 # https://miot-spec.org/miot-spec-v2/spec/actions
 class MiotAction(MiotSpecInstance):
+    __slots__ = (
+        'service', 'siid', 'unique_name', 'unique_prop', 'full_name', 'friendly_name',
+        'friendly_desc', 'ins', 'out',
+    )
+    parsed_keys = MiotSpecInstance.parsed_keys | {'in', 'out'}
+
     def __init__(self, dat: dict, service: MiotService):
         self.service = service
         self.siid = service.iid
         super().__init__(dat)
-        self.unique_name = f'{service.unique_name}.{self.name}-{self.iid}'
-        self.unique_prop = self.service.unique_prop(aiid=self.iid)
-        self.full_name = f'{service.name}.{self.name}'
-        self.friendly_name = f'{service.name}.{self.name}'
+        self.unique_name = intern(f'{service.unique_name}.{self.name}-{self.iid}')
+        self.unique_prop = intern(self.service.unique_prop(aiid=self.iid))
+        self.full_name = intern(f'{service.name}.{self.name}')
+        self.friendly_name = self.full_name
         self.friendly_desc = self.get_translation(self.description or self.name)
-        self.ins = dat.get('in') or []
-        self.out = dat.get('out') or []
+        self.ins = shared_tuple(dat.get('in'))
+        self.out = shared_tuple(dat.get('out'))
 
-    def in_list(self, lst):
-        pattern = convert_globs_to_pattern(lst)
-        if not pattern:
-            return False
-        names = [
+    @property
+    def raw(self):
+        return {
+            **super().raw,
+            'in': list(self.ins),
+            'out': list(self.out),
+        }
+
+    def lookup_names(self):
+        return [
             self.name,
             self.friendly_name,
             self.full_name,
             self.unique_name,
             self.unique_prop,
         ]
-        for name in names:
-            if pattern.match(name):
-                return True
-        return False
 
     def in_properties(self):
         properties = []
@@ -0,0 +1,128 @@
+import logging
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .utils import SingleFlight
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def compact_instances(instances: list) -> dict:
+    """Spec type of each model, released and newer versions win."""
+    best = {}
+    for v in (instances or []):
+        m = v.get('model')
+        o = best.get(m)
+        if o:
+            if o.get('status') == 'released' and v.get('status') != o.get('status'):
+                continue
+            if v.get('version') < o.get('version'):
+                continue
+        best[m] = v
+    return {
+        m: v.get('type')
+        for m, v in sorted(best.items(), key=lambda x: str(x[0]))
+    }
+
+
+class ModelCatalog:
+    """Spec types of all models, kept in memory after the first lookup.
+
+    The list of instances is downloaded at most once a week and stored as a
+    compact model to type map, instead of the full instances.
+    """
+
+    ttl = 86400 * 7
+    # a stale catalog is used for this long after a failed download
+    retry_after = 3600
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.store = Store(hass, 1, f'{DOMAIN}/model_types.json')
+        self.types: dict[str, str] = {}
+        self.updated_time = 0
+        self.tried_time = 0
+        self.loaded = False
+        self.flights = SingleFlight()
+
+    @classmethod
+    def get(cls, hass: HomeAssistant) -> 'ModelCatalog':
+        catalog = hass.data[DOMAIN].get('model_catalog')
+        if not catalog:
+            catalog = hass.data[DOMAIN]['model_catalog'] = cls(hass)
+        return catalog
+
+    async def async_get_type(self, model, use_remote=False):
+        if not model:
+            return None
+        if not self.loaded:
+            await self.flights.run('load', self.async_load)
+        now = time.time()
+        stale = now - self.updated_time > self.ttl and now - self.tried_time > self.retry_after
+        if use_remote or not self.types or stale:
+            await self.flights.run('refresh', self.async_refresh, model)
+        return self.types.get(model)
+
+    async def async_load(self):
+        try:
+            stored = await self.store.async_load() or {}
+        except (ValueError, HomeAssistantError):
+            await self.store.async_remove()
+            stored = {}
+        if not stored:
+            stored = await self.async_migrate()
+        self.types = stored.get('types') or {}
+        self.updated_time = stored.get('updated_time') or 0
+        self.loaded = True
+
+    async def async_migrate(self):
+        """Compact the instances stored by the previous versions."""
+        legacy = Store(self.hass, 1, f'{DOMAIN}/instances.json')
+        try:
+            dat = await legacy.async_load() or {}
+        except (ValueError, HomeAssistantError):
+            dat = {}
+        if not dat:
+            return {}
+        ptm = dat.pop('_updated_time', 0)
+        stored = {
+            'updated_time': ptm,
+            'types': {
+                m: v.get('type')
+                for m, v in sorted(dat.items())
+                if isinstance(v, dict)
+            },
+        }
+        await self.store.async_save(stored)
+        await legacy.async_remove()
+        return stored
+
+    async def async_refresh(self, model=None):
+        from .miot_spec import MiotSpec
+
+        self.tried_time = time.time()
+        try:
+            url = '/miot-spec-v2/instances?status=all'
+            dat = await MiotSpec.async_download_miot_spec(self.hass, url, tries=3, timeout=90)
+            types = compact_instances(dat.get('instances') if dat else None)
+        except (TypeError, ValueError, BaseException) as exc:
+            if not self.types:
+                raise exc
+            _LOGGER.warning('Get miot specs filed: %s, use cached.', exc)
+            return
+        if not types:
+            return
+        self.types = types
+        self.updated_time = int(time.time())
+        await self.store.async_save({
+            'updated_time': self.updated_time,
+            'types': types,
+        })
+        _LOGGER.info(
+            'Renew miot spec instances: %s, count: %s, model: %s',
+            self.store.path, len(types), model,
+        )
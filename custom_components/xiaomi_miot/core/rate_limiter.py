@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+# lanes, lower goes first
+PRIORITY_WRITE = 0
+PRIORITY_POLL = 1
+PRIORITY_BACKGROUND = 2
+
+
+class RateLimiter:
+    """Token bucket for the cloud requests of an account.
+
+    Waiting requests are released by priority: writes and actions of users,
+    then polls, then statistics and history. The rate is halved when requests
+    fail or get slow, and grows back step by step on fast answers.
+    """
+
+    min_rate = 0.5
+    # answers slower than this count as a sign of overload
+    slow = 5
+    # at most one decrease per this many seconds, failures come in bursts
+    cooldown = 2
+
+    def __init__(self, rate: float = 10, burst: int = 20):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.decreased = 0
+        self.lanes: list[deque] = [deque() for _ in range(PRIORITY_BACKGROUND + 1)]
+        self._timer = None
+        self.stats = {
+            'acquired': 0,
+            'waited': 0,
+            'backoffs': 0,
+        }
+
+    @property
+    def waiting(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    async def acquire(self, priority: int = PRIORITY_POLL):
+        self.stats['acquired'] += 1
+        self.refill()
+        if self.tokens >= 1 and not self.waiting:
+            self.tokens -= 1
+            return
+        self.stats['waited'] += 1
+        fut = asyncio.get_running_loop().create_future()
+        lane = min(max(int(priority), 0), len(self.lanes) - 1)
+        self.lanes[lane].append(fut)
+        self.wake()
+        await fut
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wake(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self.refill()
+        for lane in self.lanes:
+            while lane and self.tokens >= 1:
+                fut = lane.popleft()
+                if fut.done():
+                    # cancelled
+                    continue
+                self.tokens -= 1
+                fut.set_result(None)
+        if self.waiting and not self._timer:
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self.wake)
+
+    def record(self, ok: bool, latency: float = 0):
+        """Adapt the rate to the outcome of a request."""
+        if ok and latency < self.slow:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            return
+        now = time.monotonic()
+        if now - self.decreased < self.cooldown:
+            return
+        self.refill()
+        self.decreased = now
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 1)
+        self.stats['backoffs'] += 1
+        _LOGGER.debug('Cloud requests %s, rate limited to %.2f/s', 'slow' if ok else 'failed', self.rate)
+
+    def as_dict(self):
+        return {
+            'rate': round(self.rate, 2),
+            'tokens': round(self.tokens, 2),
+            'waiting': self.waiting,
+            **self.stats,
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ReadJob:
+    def __init__(self, owner, params: list, max_properties: int = None, learn=False):
+        self.owner = owner
+        self.params = params
+        self.max_properties = max_properties
+        self.learn = learn
+        self.future = asyncio.get_running_loop().create_future()
+
+    @staticmethod
+    def key(item: dict):
+        return str(item.get('did')), item.get('siid'), item.get('piid')
+
+
+class RequestSlots:
+    """Counts the requests in flight to one endpoint, at most `limit`. Writes
+    waiting for a slot get it before the waiting reads. Used as an async
+    context manager by reads.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        # waiting futures of writes and of reads
+        self.waiting = {True: deque(), False: deque()}
+
+    async def acquire(self, write=False):
+        if self.used < self.limit and not self.waiting[True] and (write or not self.waiting[False]):
+            self.used += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting[write].append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was given while cancelled
+                self.release()
+            elif fut in self.waiting[write]:
+                self.waiting[write].remove(fut)
+            raise
+
+    def release(self):
+        self.used -= 1
+        self.wake()
+
+    def wake(self):
+        while self.used < self.limit:
+            queue = self.waiting[True] or self.waiting[False]
+            if not queue:
+                break
+            fut = queue.popleft()
+            if fut.done():
+                continue
+            self.used += 1
+            fut.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *_):
+        self.release()
+
+
+class RequestScheduler:
+    """Runs the requests to one LAN endpoint, which is shared by a gateway and
+    its sub devices. At most `limit` requests are in flight, the chunks of a
+    pipelined job take one of the `slots` each. Writes and actions start at
+    once and get the next free slot, reads are taken in turns of the devices,
+    and get_properties of different devices waiting at the same time are
+    merged into one request.
+    """
+
+    def __init__(self, read_properties: Callable, limit: int = 2, merge_limit: int = 45):
+        self.read_properties = read_properties
+        # requests in flight, shared with the chunks sent by a job
+        self.slots = RequestSlots(limit)
+        self.merge_limit = merge_limit
+        self.active = 0
+        self.writes: deque[tuple] = deque()
+        # reads by owner, in turns
+        self.reads: dict[object, deque] = {}
+        self.stats = {
+            'writes': 0,
+            'reads': 0,
+            'merged': 0,
+            'queued_max': 0,
+        }
+
+    @property
+    def limit(self) -> int:
+        return self.slots.limit
+
+    @limit.setter
+    def limit(self, limit: int):
+        self.slots.limit = limit
+        self.slots.wake()
+        self.schedule()
+
+    @property
+    def queued(self):
+        return len(self.writes) + sum(len(q) for q in self.reads.values())
+
+    async def run(self, func: Callable, *args, write=False, owner=None, pipelined=False, **kwargs):
+        """Pipelined jobs take the `slots` for their requests themselves."""
+        fut = asyncio.get_running_loop().create_future()
+        job = (fut, func, args, kwargs, write, pipelined)
+        if write:
+            self.writes.append(job)
+        else:
+            self.reads.setdefault(owner, deque()).append(job)
+        self.schedule()
+        return await fut
+
+    async def get_properties(self, owner, params: list, max_properties=None, learn=False):
+        job = ReadJob(owner, params, max_properties, learn)
+        self.reads.setdefault(owner, deque()).append(job)
+        self.schedule()
+        return await job.future
+
+    def schedule(self):
+        self.stats['queued_max'] = max(self.stats['queued_max'], self.queued)
+        while self.writes:
+            # not behind the jobs of pipelined reads, but first for the slots
+            self.stats['writes'] += 1
+            self.start(self.execute(self.writes.popleft()))
+        while self.active < self.limit:
+            if job := self.next_read():
+                self.stats['reads'] += 1
+                if isinstance(job, ReadJob):
+                    self.start(self.execute_reads(self.merge_reads(job)))
+                else:
+                    self.start(self.execute(job))
+            else:
+                break
+
+    def next_read(self):
+        for owner in list(self.reads):
+            queue = self.reads.pop(owner)
+            if not queue:
+                continue
+            job = queue.popleft()
+            if queue:
+                # the turn of this owner is over
+                self.reads[owner] = queue
+            return job
+        return None
+
+    def merge_reads(self, first: ReadJob) -> list[ReadJob]:
+        jobs = [first]
+        count = len(first.params)
+        for owner in list(self.reads):
+            queue = self.reads[owner]
+            if owner == first.owner or not queue or not isinstance(queue[0], ReadJob):
+                continue
+            if count + len(queue[0].params) > self.merge_limit:
+                break
+            job = queue.popleft()
+            if not queue:
+                self.reads.pop(owner)
+            jobs.append(job)
+            count += len(job.params)
+        self.stats['merged'] += len(jobs) - 1
+        return jobs
+
+    def start(self, coro):
+        self.active += 1
+        task = asyncio.get_running_loop().create_task(coro)
+        task.add_done_callback(self.done)
+
+    def done(self, _):
+        self.active -= 1
+        self.schedule()
+
+    async def execute(self, job: tuple):
+        fut, func, args, kwargs, write, pipelined = job
+        if fut.done():
+            return
+        try:
+            if pipelined:
+                result = await func(*args, **kwargs)
+            else:
+                await self.slots.acquire(write)
+                try:
+                    result = await func(*args, **kwargs)
+                finally:
+                    self.slots.release()
+        except Exception as exc:
+            if not fut.done():
+                fut.set_exception(exc)
+        else:
+            if not fut.done():
+                fut.set_result(result)
+
+    async def execute_reads(self, jobs: list[ReadJob]):
+        jobs = [job for job in jobs if not job.future.done()]
+        if not jobs:
+            return
+        params = [p for job in jobs for p in job.params]
+        sizes = [job.max_properties for job in jobs if job.max_properties]
+        try:
+            results = await self.read_properties(
+                params,
+                max_properties=min(sizes) if sizes else None,
+                learn=all(job.learn for job in jobs),
+            )
+        except Exception as exc:
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            return
+        if len(jobs) == 1:
+            if not jobs[0].future.done():
+                jobs[0].future.set_result(results)
+            return
+        by_key = {}
+        for result in results or []:
+            if isinstance(result, dict):
+                by_key[ReadJob.key(result)] = result
+        for job in jobs:
+            if job.future.done():
+                continue
+            job.future.set_result([
+                by_key[key]
+                for p in job.params
+                if (key := ReadJob.key(p)) in by_key
+            ])
@@ -0,0 +1,76 @@
+import json
+import logging
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .miot_spec import MiotSpec
+from .utils import SingleFlight
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def spec_key(urn, trans_options=False, extend=None, mapping=None):
+    """Devices with the same key can share one spec tree."""
+    return (
+        urn,
+        bool(trans_options),
+        json.dumps(extend, sort_keys=True) if extend else '',
+        json.dumps(mapping, sort_keys=True) if mapping else '',
+    )
+
+
+class SpecCache:
+    """Spec trees shared by the devices of the same type.
+
+    A tree is built once per key and is treated as read only, the
+    customizations of a device (extended services, custom mapping) are
+    part of the key. Trees are dropped when the last device unloads.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.specs: dict[tuple, MiotSpec] = {}
+        self.holders: dict[tuple, set] = {}
+        self.flights = SingleFlight()
+
+    @classmethod
+    def get(cls, hass: HomeAssistant) -> 'SpecCache':
+        cache = hass.data[DOMAIN].get('spec_cache')
+        if not cache:
+            cache = hass.data[DOMAIN]['spec_cache'] = cls(hass)
+        return cache
+
+    async def async_acquire(self, holder, urn, trans_options=False, extend=None, mapping=None):
+        key = spec_key(urn, trans_options, extend, mapping)
+        spec = self.specs.get(key)
+        if spec is None:
+            spec = await self.flights.run(key, self.async_build, key, urn, trans_options, extend)
+        if spec is None:
+            return key, None
+        self.specs.setdefault(key, spec)
+        self.holders.setdefault(key, set()).add(holder)
+        return key, spec
+
+    async def async_build(self, key, urn, trans_options=False, extend=None):
+        spec = await MiotSpec.async_from_type(self.hass, urn, trans_options=trans_options)
+        if spec is None:
+            return None
+        if extend:
+            spec.extend_specs(services=extend)
+        self.specs[key] = spec
+        _LOGGER.debug('Built miot spec for %s, shared specs: %s', urn, len(self.specs))
+        return spec
+
+    def release(self, key, holder):
+        """Returns the spec if it's no longer used by any device."""
+        holders = self.holders.get(key)
+        if holders is None:
+            return None
+        holders.discard(holder)
+        if holders:
+            return None
+        self.holders.pop(key, None)
+        return self.specs.pop(key, None)
+
+    def refs(self, key):
+        return len(self.holders.get(key) or ())
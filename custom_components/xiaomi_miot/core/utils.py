@@ -1,15 +1,19 @@
 import os
 import re
 import json
+import time
 import locale
 import aiohttp
 import asyncio
 import tzlocal
 import logging
 import fnmatch
+from types import MappingProxyType
 import voluptuous as vol
 from typing import Type, Tuple, Optional, Callable, Set
-from functools import wraps
+from functools import wraps, lru_cache
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives.ciphers import Cipher
 from homeassistant.core import HomeAssistant, split_entity_id  # noqa
 from homeassistant.util import slugify, language as language_util
 from homeassistant.util.dt import DEFAULT_TIME_ZONE, get_time_zone
@@ -20,6 +24,15 @@ import homeassistant.helpers.config_validation as cv
 from .const import DOMAIN, DEVICE_CUSTOMIZES, DATA_CUSTOMIZE
 from .translation_languages import TRANSLATION_LANGUAGES
 
+try:
+    from cryptography.hazmat.decrepit.ciphers.algorithms import ARC4
+except ImportError:
+    try:
+        # cryptography < 43
+        from cryptography.hazmat.primitives.ciphers.algorithms import ARC4
+    except ImportError:
+        ARC4 = None
+
 
 def get_value(obj, key, def_value=None, sep='.'):
     keys = f'{key}'.split(sep)
@@ -177,12 +190,18 @@ def wildcard_models(model):
     ]
 
 
-def convert_globs_to_pattern(globs: list[str] | None):
-    """Convert a list of globs to a re pattern list."""
-    if not globs:
-        return None
+GLOB_MAGIC = re.compile(r'[*?[]')
+
+
+def is_glob(name) -> bool:
+    return bool(GLOB_MAGIC.search(str(name)))
+
+
+@lru_cache(maxsize=1024)
+def globs_pattern(globs: frozenset[str]):
+    """Compile a set of globs once, callers pass the same few lists over and over."""
     translated_patterns = [
-        pattern for glob in set(globs) if (pattern := fnmatch.translate(str(glob)))
+        pattern for glob in globs if (pattern := fnmatch.translate(glob))
     ]
     if not translated_patterns:
         return None
@@ -191,6 +210,32 @@ def convert_globs_to_pattern(globs: list[str] | None):
     return re.compile(combined)
 
 
+@lru_cache(maxsize=1024)
+def split_globs(globs: tuple[str, ...]):
+    """Exact names of the globs, and the compiled pattern of the others."""
+    exact = frozenset(g for g in globs if not is_glob(g))
+    return exact, globs_pattern(frozenset(globs) - exact)
+
+
+def convert_globs_to_pattern(globs: list[str] | None):
+    """Convert a list of globs to a re pattern list."""
+    if not globs:
+        return None
+    return globs_pattern(frozenset(map(str, globs)))
+
+
+def match_globs(names, globs) -> bool:
+    """Whether any of the names matches any of the globs, exact names skip the regex."""
+    if not globs:
+        return False
+    exact, pattern = split_globs(tuple(map(str, globs)))
+    if not exact.isdisjoint(names):
+        return True
+    if pattern:
+        return any(pattern.match(name) for name in names)
+    return False
+
+
 def get_translation(key, keys=None):
     dic = get_translations(*(keys or []))
     val = dic.get(key, key)
@@ -200,18 +245,49 @@ def get_translation(key, keys=None):
 
 
 def get_translations(*keys):
-    dic = {
-        **TRANSLATION_LANGUAGES,
-        **(TRANSLATION_LANGUAGES.get('_globals', {})),
-    }
-    for k in keys:
-        tls = TRANSLATION_LANGUAGES.get(k)
-        if not isinstance(tls, dict):
-            continue
-        dic.update(tls)
+    return layered_translations(('_globals', *keys))
+
+
+# merged translation tables by the keys of their layers,
+# dropped when the translations are reloaded
+TRANSLATION_TABLES: dict[tuple, MappingProxyType] = {}
+
+
+def layered_translations(keys, nested=False) -> MappingProxyType:
+    """Translations with the tables of the keys merged over them, in order.
+
+    With `nested`, the table of a key is looked up in the tables merged
+    so far, as spec instances do.
+    """
+    keys = (nested, *keys)
+    if (dic := TRANSLATION_TABLES.get(keys)) is not None:
+        return dic
+    layers = []
+    for k in keys[1:]:
+        tbl = TRANSLATION_LANGUAGES.get(k)
+        if nested:
+            for _, layer in reversed(layers):
+                if k in layer:
+                    tbl = layer[k]
+                    break
+        if isinstance(tbl, dict):
+            layers.append((k, tbl))
+    # keys without a table share the table of the others
+    key = (nested, *(k for k, _ in layers))
+    dic = TRANSLATION_TABLES.get(key)
+    if dic is None:
+        merged = dict(TRANSLATION_LANGUAGES)
+        for _, tbl in layers:
+            merged.update(tbl)
+        dic = TRANSLATION_TABLES[key] = MappingProxyType(merged)
+    TRANSLATION_TABLES[keys] = dic
     return dic
 
 
+def clear_translations():
+    TRANSLATION_TABLES.clear()
+
+
 def get_translation_langs(hass: HomeAssistant, langs=None):
     lang = hass.config.language
     if not langs:
@@ -237,6 +313,173 @@ def is_offline_exception(exc):
     return ret
 
 
+class SingleFlight:
+    """Calls with the same key share the result of the call in flight,
+    instead of doing the same work again.
+    """
+
+    def __init__(self):
+        self.calls: dict[object, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key, func: Callable, *args, **kwargs):
+        task = self.calls.get(key)
+        if task:
+            self.coalesced += 1
+        else:
+            task = self.calls[key] = asyncio.ensure_future(func(*args, **kwargs))
+            task.add_done_callback(lambda t: self.done(key, t))
+        # a cancelled caller doesn't cancel the others
+        return await asyncio.shield(task)
+
+    def done(self, key, task: asyncio.Future):
+        if self.calls.get(key) is task:
+            self.calls.pop(key)
+        if not task.cancelled():
+            # retrieved, even if all callers were cancelled
+            task.exception()
+
+
+class BatchFailure:
+    """Returned by the function of a `Batcher` among its results for the
+    items it failed to process, their callers get the error.
+    """
+
+    def __init__(self, items: list, error: Exception):
+        self.items = items
+        self.error = error
+
+
+class Batcher:
+    """Collects the items submitted within `window` seconds and processes
+    them with one call. Items with the same key are merged, the last one
+    wins, and every caller gets the results of its own keys, or the error
+    if any of them failed.
+    """
+
+    def __init__(self, func: Callable, window: float, key: Callable, result_key: Callable = None):
+        self.func = func
+        self.window = window
+        self.key = key
+        self.result_key = result_key or key
+        self.items: dict = {}
+        self.waiters: list[tuple[asyncio.Future, list]] = []
+        self.handle: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.merged = 0
+
+    async def submit(self, items: list) -> list:
+        loop = asyncio.get_running_loop()
+        keys = []
+        for item in items:
+            key = self.key(item)
+            if key in self.items:
+                self.merged += 1
+            self.items[key] = item
+            keys.append(key)
+        fut = loop.create_future()
+        self.waiters.append((fut, keys))
+        if not self.handle:
+            self.handle = loop.call_later(self.window, self.flush)
+        return await fut
+
+    def flush(self):
+        items, waiters = self.items, self.waiters
+        self.items, self.waiters, self.handle = {}, [], None
+        self.batches += 1
+        task = asyncio.get_running_loop().create_task(self.process(list(items.values()), waiters))
+        # the loop keeps only a weak reference to the task
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def process(self, items: list, waiters: list):
+        try:
+            self.resolve(await self.func(items), waiters)
+        except asyncio.CancelledError:
+            for fut, _ in waiters:
+                fut.cancel()
+            raise
+        except Exception as exc:
+            for fut, _ in waiters:
+                if not fut.done():
+                    fut.set_exception(exc)
+
+    def resolve(self, results: list, waiters: list):
+        by_key = {}
+        errors = {}
+        for result in results or []:
+            if isinstance(result, BatchFailure):
+                for item in result.items:
+                    errors[self.key(item)] = result.error
+            elif isinstance(result, dict):
+                by_key[self.result_key(result)] = result
+        for fut, keys in waiters:
+            if fut.done():
+                continue
+            error = next((errors[k] for k in keys if k in errors), None)
+            if error:
+                fut.set_exception(error)
+            else:
+                fut.set_result([by_key[k] for k in keys if k in by_key])
+
+
+class CircuitBreaker:
+    """Stops calling an unreachable device for a while after some failures.
+    When the pause is over, the breaker is half open and one cheap probe
+    decides: a success closes it, a failure opens it again for twice as long.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=3, backoff=60, max_backoff=3600):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.opened_at = None
+        self.open_for = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.open_for:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    @property
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(0, self.open_for - (time.monotonic() - self.opened_at))
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.open_for = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.opened_at is not None:
+            # probe failed
+            self.open_for = min(self.open_for * 2, self.max_backoff)
+        elif self.failures >= self.threshold:
+            self.open_for = self.backoff
+        else:
+            return
+        self.opened_at = time.monotonic()
+
+    def as_dict(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'retry_in': round(self.retry_in),
+        }
+
+
 def update_attrs_with_suffix(attrs, new_dict):
     updated_attrs = {}
     for key, value in new_dict.items():
@@ -282,6 +525,7 @@ def aiohttp_retry(
     retry_on_status: Optional[Set[int]] = None,
     exceptions: Tuple[Type[BaseException], ...] = (aiohttp.ClientError, asyncio.TimeoutError),
     logger=None,
+    on_retry: Optional[Callable] = None,
 ):
     if retry_on_status is None:
         retry_on_status = {500, 502, 503, 504}
@@ -307,6 +551,9 @@ def aiohttp_retry(
                         is_retryable_status = True
                     if not is_retryable_status:
                         break
+                    if on_retry:
+                        # called with the exception and the arguments of the call
+                        on_retry(exc, *args, **kwargs)
                     delay = backoff_factor * (2 ** attempt)
                     await asyncio.sleep(delay)
             if last_exception:
@@ -335,14 +582,25 @@ async def async_analytics_track_event(hass: HomeAssistant, event, action, label,
 
 
 class RC4:
+    """RC4 stream cipher, through OpenSSL when it still provides ARC4 and the
+    key has a supported size, otherwise in pure python.
+    """
     _idx = 0
     _jdx = 0
     _ksa: list
+    _cipher = None
 
     def __init__(self, pwd):
         self.init_key(pwd)
 
     def init_key(self, pwd):
+        self._cipher = None
+        if ARC4 is not None:
+            try:
+                self._cipher = Cipher(ARC4(bytes(pwd)), mode=None).encryptor()
+                return self
+            except (ValueError, UnsupportedAlgorithm):
+                pass
         cnt = len(pwd)
         ksa = list(range(256))
         j = 0
@@ -357,19 +615,23 @@ class RC4:
     def crypt(self, data):
         if isinstance(data, str):
             data = data.encode()
+        if self._cipher:
+            return bytearray(self._cipher.update(bytes(data)))
         ksa = self._ksa
         i = self._idx
         j = self._jdx
-        out = []
-        for byt in data:
+        out = bytearray(data)
+        for n, byt in enumerate(out):
             i = (i + 1) & 255
-            j = (j + ksa[i]) & 255
-            ksa[i], ksa[j] = ksa[j], ksa[i]
-            out.append(byt ^ ksa[(ksa[i] + ksa[j]) & 255])
+            a = ksa[i]
+            j = (j + a) & 255
+            b = ksa[j]
+            ksa[i] = b
+            ksa[j] = a
+            out[n] = byt ^ ksa[(a + b) & 255]
         self._idx = i
         self._jdx = j
-        self._ksa = ksa
-        return bytearray(out)
+        return out
 
     def init1024(self):
         self.crypt(bytes(1024))
@@ -13,20 +13,25 @@ import micloud
 import requests
 from copy import copy
 from datetime import datetime
-from functools import partial
 from typing import Optional
 from urllib import parse
 
 from homeassistant.const import (
     CONF_PASSWORD,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_CLOSE,
 )
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.helpers.storage import Store
 from homeassistant.helpers.aiohttp_client import async_create_clientsession
 from homeassistant.components import persistent_notification
+from homeassistant.util.ssl import get_default_context
 
 from .const import DOMAIN, CONF_XIAOMI_CLOUD
-from .utils import RC4, aiohttp_retry, local_zone, logger_filter
+from .cloud_metrics import ApiMetrics
+from .device_inventory import SIGNAL_DEVICES_CHANGED, DevicesDiff
+from .rate_limiter import PRIORITY_BACKGROUND, PRIORITY_POLL, PRIORITY_WRITE, RateLimiter
+from .utils import RC4, Batcher, BatchFailure, aiohttp_retry, local_zone, logger_filter
 from micloud import miutils
 from micloud.micloudexception import MiCloudException
 
@@ -61,6 +66,19 @@ _LOGGER = logging.getLogger(__name__)
 _LOGGER.addFilter(logger_filter)
 
 ACCOUNT_BASE = 'https://account.xiaomi.com'
+# apis by lane of the rate limiter, all others are polls
+API_WRITES = ('prop/set', 'miotspec/action', '/key/click')
+API_BACKGROUND = (
+    'user/statistics',
+    'user/get_user_device_data',
+    'device/batchdevicedatas',
+    'message/v2/',
+    'scene/history',
+    'home/device_list',
+    'home/home_device_list',
+    'homeroom/gethome_merged',
+    'blt_get_beaconkey',
+)
 UA = "Android-7.1.1-1.0.0-ONEPLUS A3010-136-%s APP/xiaomi.smarthome APPV/62830"
 
 
@@ -73,6 +91,24 @@ class MiotCloud(micloud.MiCloud):
     failed_logins = 0
     session = None
     async_session: Optional[aiohttp.ClientSession] = None
+    # pooled connections of the account, shared by all api requests
+    http_limit = 20
+    http_limit_per_host = 10
+    http_keepalive = 60
+    _http_session: Optional[aiohttp.ClientSession] = None
+    _unsub_close = None
+    # properties of all devices polled within this many seconds are
+    # requested together, in batches of at most `props_batch_size`
+    props_batch_window = 0.02
+    props_batch_size = 100
+    _props_batcher: Optional[Batcher] = None
+    # the stored device list, loaded once
+    _devices_data: Optional[dict] = None
+    devices_ttl = 86400
+    # a renew without changes only moves the update time, saved later
+    devices_save_delay = 300
+    # pages of home device lists requested at the same time
+    homes_concurrency = 4
 
     def __init__(self, hass, username, password, country=None, sid=None, hass_entry=None):
         try:
@@ -97,6 +133,8 @@ class MiotCloud(micloud.MiCloud):
         self.cookies = {}
         self.attrs = {}
         self.hass_entry = hass_entry
+        self.limiter = RateLimiter()
+        self.metrics = ApiMetrics()
 
     @property
     def unique_id(self):
@@ -113,7 +151,7 @@ class MiotCloud(micloud.MiCloud):
             p = v.get('piid')
             pms.append({'did': str(did), 'siid': s, 'piid': p})
             rmp[f'prop.{s}.{p}'] = k
-        rls = await self.async_get_props(pms)
+        rls = await self.async_get_props_batched(pms)
         if not rls:
             return None
         dls = []
@@ -123,14 +161,47 @@ class MiotCloud(micloud.MiCloud):
             k = rmp.get(f'prop.{s}.{p}')
             if not k:
                 continue
-            v['prop'] = k
-            dls.append(v)
+            dls.append({**v, 'prop': k})
         return dls
 
     async def async_get_props(self, params=None):
         return await self.async_request_miot_spec('prop/get', params)
 
-    @aiohttp_retry(3, logger=_LOGGER)
+    async def async_get_props_batched(self, params: list):
+        """Reads of all devices of the account within the batch window share
+        requests, each caller gets the results of its own properties.
+        """
+        if not self.props_batch_window:
+            return await self.async_get_props(params)
+        if not self._props_batcher:
+            self._props_batcher = Batcher(
+                self._async_get_props_in_batches,
+                self.props_batch_window,
+                key=lambda p: (str(p.get('did')), p.get('siid'), p.get('piid')),
+            )
+        return await self._props_batcher.submit(params)
+
+    async def _async_get_props_in_batches(self, params: list):
+        size = self.props_batch_size
+        batches = [params[i:i + size] for i in range(0, len(params), size)]
+        rls = await asyncio.gather(
+            *[self.async_get_props(pms) for pms in batches],
+            return_exceptions=True,
+        )
+        results = []
+        errors = []
+        for pms, ret in zip(batches, rls):
+            if isinstance(ret, Exception):
+                errors.append(ret)
+                results.append(BatchFailure(pms, ret))
+            elif isinstance(ret, list):
+                results.extend(ret)
+        if errors and len(errors) == len(batches):
+            raise errors[0]
+        if errors:
+            _LOGGER.warning('Get miot properties failed in %s of %s batches: %s', len(errors), len(batches), errors[0])
+        return results
+
     async def async_set_props(self, params=None):
         return await self.async_request_miot_spec('prop/set', params, timeout=5, raise_timeout=True)
 
@@ -138,6 +209,18 @@ class MiotCloud(micloud.MiCloud):
         return await self.async_request_miot_spec('action', params)
 
     async def async_request_miot_spec(self, api, params=None, **kwargs):
+        if self.is_write_api('miotspec/' + api):
+            return await self._async_write_miot_spec(api, params, **kwargs)
+        return await self._async_request_miot_spec(api, params, **kwargs)
+
+    @aiohttp_retry(
+        3, logger=_LOGGER,
+        on_retry=lambda exc, cloud, api, *args, **kwargs: cloud.metrics.retry('miotspec/' + api),
+    )
+    async def _async_write_miot_spec(self, api, params=None, **kwargs):
+        return await self._async_request_miot_spec(api, params, **kwargs)
+
+    async def _async_request_miot_spec(self, api, params=None, **kwargs):
         resp = await self.async_request_api('miotspec/' + api, {
             'params': params or [],
         }, **kwargs) or {}
@@ -148,7 +231,7 @@ class MiotCloud(micloud.MiCloud):
             if now - tim > 600:
                 self.attrs['last_relogin_time'] = now
                 if await self.async_check_auth(notify=True):
-                    return await self.async_request_miot_spec(api, params, **kwargs)
+                    return await self._async_request_miot_spec(api, params, **kwargs)
             raise MiCloudException(json.dumps(resp, ensure_ascii=False))
         if not result and resp.get('code'):
             raise MiCloudException(json.dumps(resp, ensure_ascii=False))
@@ -197,6 +280,8 @@ class MiotCloud(micloud.MiCloud):
                 return None
             except requests.exceptions.Timeout:
                 return None
+            except aiohttp.ClientConnectionError:
+                return None
             _LOGGER.debug('Xiaomi auth probe failed; attempting relogin')
 
         cb = None
@@ -336,19 +421,18 @@ class MiotCloud(micloud.MiCloud):
             params['data'] = self.json_encode(data)
         raise_timeout = kwargs.pop('raise_timeout', None)
         raw = kwargs.pop('raw', self.sid != 'xiaomiio')
+        priority = kwargs.pop('priority', None)
+        if priority is None:
+            priority = self.api_priority(api)
         rsp = None
         request_failure_logged = False
         try:
             if raw:
-                rsp = await self.hass.async_add_executor_job(
-                    partial(self.request_raw, api, data, method, **kwargs)
-                )
+                rsp = await self.async_limited(api, priority, self.async_request_raw, api, data, method, **kwargs)
             elif crypt:
-                rsp = await self.async_request_rc4_api(api, params, method, **kwargs)
+                rsp = await self.async_limited(api, priority, self.async_request_rc4_api, api, params, method, **kwargs)
             else:
-                rsp = await self.hass.async_add_executor_job(
-                    partial(self.request, self.get_api_url(api), params, **kwargs)
-                )
+                rsp = await self.async_limited(api, priority, self.async_request, self.get_api_url(api), params, **kwargs)
             rdt = json.loads(rsp)
             if debug:
                 _LOGGER.debug(
@@ -374,6 +458,8 @@ class MiotCloud(micloud.MiCloud):
         except (TypeError, ValueError):
             rdt = None
         code = rdt.get('code') if rdt else None
+        if isinstance(rdt, dict) and self.is_token_expired(rdt):
+            self.metrics.token_expired(api)
         if code == 3:
             self._logout()
             _LOGGER.warning('Unauthorized while request to %s, response: %s, logged out.', api, rsp)
@@ -382,6 +468,38 @@ class MiotCloud(micloud.MiCloud):
             fun('Request xiaomi api: %s %s failed, response: %s', api, data, rsp)
         return rdt
 
+    async def async_limited(self, api, priority, func, *args, **kwargs):
+        """Run a request when the rate limiter of the account lets it."""
+        await self.limiter.acquire(priority)
+        started = time.monotonic()
+        try:
+            rsp = await func(*args, **kwargs)
+        except asyncio.TimeoutError:
+            self.limiter.record(False)
+            self.metrics.request(api, time.monotonic() - started, timeout=True)
+            raise
+        except Exception:
+            self.limiter.record(False)
+            self.metrics.request(api, time.monotonic() - started, error=True)
+            raise
+        latency = time.monotonic() - started
+        self.limiter.record(rsp is not None, latency)
+        self.metrics.request(api, latency, rsp)
+        return rsp
+
+    @staticmethod
+    def is_write_api(api: str):
+        return any(k in str(api) for k in API_WRITES)
+
+    @classmethod
+    def api_priority(cls, api: str):
+        api = str(api)
+        if cls.is_write_api(api):
+            return PRIORITY_WRITE
+        if any(k in api for k in API_BACKGROUND):
+            return PRIORITY_BACKGROUND
+        return PRIORITY_POLL
+
     async def async_get_device(self, mac=None, host=None):
         dvs = await self.async_get_devices() or []
         for d in dvs:
@@ -406,39 +524,70 @@ class MiotCloud(micloud.MiCloud):
         _LOGGER.warning('Got xiaomi devices for %s failed: %s', self.username, rdt)
         return None
 
-    async def get_all_devices(self, homes=None):
-        devices = {
-            d['did']: d
-            for d in await self.get_device_list() or []
-        }
+    async def async_fetch_devices(self):
+        """Fetch the homes and the device list at the same time, and the
+        devices of the homes as soon as the homes are known.
+        """
+        listing = asyncio.ensure_future(self.get_device_list())
+        try:
+            hls = await self.get_home_devices()
+        except BaseException:
+            listing.cancel()
+            raise
+        dvs = await self.get_all_devices(hls.get('homelist', []), listing=listing)
+        return hls, dvs
+
+    async def get_all_devices(self, homes=None, listing=None):
+        if listing is None:
+            listing = self.get_device_list()
         if not isinstance(homes, list):
-            return await self.get_device_list() or []
-        for home in homes:
-            hid = int(home.get('id', 0))
-            uid = int(home.get('uid', 0))
-            start_did = ''
-            has_more = True
-            while has_more:
-                rdt = await self.async_request_api('v2/home/home_device_list', {
-                    'home_owner': uid,
-                    'home_id': hid,
-                    'limit': 300,
-                    'start_did': start_did,
-                    'get_split_device': False,
-                    'support_smart_home': True,
-                    'get_cariot_device': True,
-                    'get_third_device': True,
-                }, debug=False, timeout=20) or {}
-                result = rdt.get('result') or {}
-                if not result:
-                    _LOGGER.warning('Got xiaomi devices for %s failed: %s', self.username, rdt)
-                for d in result.get('device_info') or []:
-                    did = d.get('did')
-                    devices.setdefault(did, {}).update(d)
-                start_did = result.get('max_did') or ''
-                has_more = result.get('has_more') and start_did
+            homes = []
+        semaphore = asyncio.Semaphore(self.homes_concurrency)
+        # pages of a home are sequential, homes are listed concurrently
+        results = await asyncio.gather(listing, *[
+            self.get_home_device_pages(home, semaphore=semaphore)
+            for home in homes
+        ])
+        devices = {}
+        # merged in the order of the homes, the same for every fetch
+        for lst in results:
+            for d in lst or []:
+                did = d.get('did')
+                devices.setdefault(did, {}).update(d)
         return list(devices.values())
 
+    async def get_home_device_pages(self, home: dict, semaphore: asyncio.Semaphore = None):
+        devices = []
+        hid = int(home.get('id', 0))
+        uid = int(home.get('uid', 0))
+        start_did = ''
+        has_more = True
+        while has_more:
+            if semaphore:
+                async with semaphore:
+                    rdt = await self.get_home_device_page(uid, hid, start_did)
+            else:
+                rdt = await self.get_home_device_page(uid, hid, start_did)
+            result = rdt.get('result') or {}
+            if not result:
+                _LOGGER.warning('Got xiaomi devices for %s failed: %s', self.username, rdt)
+            devices.extend(result.get('device_info') or [])
+            start_did = result.get('max_did') or ''
+            has_more = result.get('has_more') and start_did
+        return devices
+
+    async def get_home_device_page(self, uid, hid, start_did=''):
+        return await self.async_request_api('v2/home/home_device_list', {
+            'home_owner': uid,
+            'home_id': hid,
+            'limit': 300,
+            'start_did': start_did,
+            'get_split_device': False,
+            'support_smart_home': True,
+            'get_cariot_device': True,
+            'get_third_device': True,
+        }, debug=False, timeout=20) or {}
+
     async def get_home_devices(self):
         rdt = await self.async_request_api('v2/homeroom/gethome_merged', {
             'fg': True,
@@ -470,21 +619,21 @@ class MiotCloud(micloud.MiCloud):
         fnm = f'xiaomi_miot/devices-{self.user_id}-{self.default_server}.json'
         store = Store(self.hass, 1, fnm)
         now = time.time()
-        cds = []
         dvs = []
-        try:
-            dat = await store.async_load() or {}
-        except ValueError:
-            await store.async_remove()
-            dat = {}
-        if isinstance(dat, dict):
-            cds = dat.get('devices') or []
-            if not renew and dat.get('update_time', 0) > (now - 86400):
-                dvs = cds
+        if self._devices_data is None:
+            try:
+                dat = await store.async_load() or {}
+            except ValueError:
+                await store.async_remove()
+                dat = {}
+            self._devices_data = dat if isinstance(dat, dict) else {}
+        dat = self._devices_data
+        cds = dat.get('devices') or []
+        if not renew and dat.get('update_time', 0) > (now - self.devices_ttl):
+            dvs = cds
         if not dvs:
             try:
-                hls = await self.get_home_devices()
-                dvs = await self.get_all_devices(hls.get('homelist', []))
+                hls, dvs = await self.async_fetch_devices()
                 if dvs:
                     if hls:
                         hds = hls.get('devices') or {}
@@ -492,14 +641,26 @@ class MiotCloud(micloud.MiCloud):
                             {**d, **(hds.get(d.get('did')) or {})}
                             for d in dvs
                         ]
-                    dat = {
+                    for d in dvs:
+                        # as device_key sets it on the cached devices
+                        if not d.get('mac'):
+                            d['mac'] = d.get('did')
+                    homes = hls.get('homelist', [])
+                    diff = DevicesDiff.compare(cds, dvs)
+                    changed = diff or homes != dat.get('homes')
+                    dat = self._devices_data = {
                         'update_time': now,
                         'devices': dvs,
-                        'homes': hls.get('homelist', []),
+                        'homes': homes,
                     }
-                    await store.async_save(dat)
-                    _LOGGER.info('Got %s devices from xiaomi cloud', len(dvs))
-            except requests.exceptions.ConnectionError as exc:
+                    if changed or not renew:
+                        await store.async_save(dat)
+                    else:
+                        store.async_delay_save(lambda: self._devices_data, self.devices_save_delay)
+                    if diff and cds:
+                        async_dispatcher_send(self.hass, SIGNAL_DEVICES_CHANGED.format(self.user_id), diff)
+                    _LOGGER.info('Got %s devices from xiaomi cloud, %s', len(dvs), diff)
+            except (requests.exceptions.ConnectionError, aiohttp.ClientConnectionError) as exc:
                 if not cds:
                     raise exc
                 dvs = cds
@@ -515,33 +676,36 @@ class MiotCloud(micloud.MiCloud):
         dat = {}
         if filters is None:
             filters = {}
-        fls = ['ssid', 'bssid', 'home_id', 'model', 'did']
         dvs = await self.async_get_devices(renew=renew) or []
         for d in dvs:
-            if not isinstance(d, dict):
-                continue
-            if self.is_hide(d):
-                continue
-            if not d.get('mac'):
-                d['mac'] = d.get('did')
-            k = d.get(key)
-            for f in fls:
-                ft = filters.get(f'filter_{f}')
-                if not ft:
-                    continue
-                ex = ft != 'include'
-                fl = filters.get(f'{f}_list') or {}
-                fv = d.get(f)
-                if ex:
-                    ok = fv not in fl
-                else:
-                    ok = fv in fl
-                if not ok:
-                    k = None
-            if k:
+            if k := self.device_key(d, key, filters):
                 dat[k] = d
         return dat
 
+    def device_key(self, d, key, filters: dict):
+        """The value of `key` of a device that passes the filters of an entry."""
+        if not isinstance(d, dict):
+            return None
+        if self.is_hide(d):
+            return None
+        if not d.get('mac'):
+            d['mac'] = d.get('did')
+        k = d.get(key)
+        for f in ['ssid', 'bssid', 'home_id', 'model', 'did']:
+            ft = filters.get(f'filter_{f}')
+            if not ft:
+                continue
+            ex = ft != 'include'
+            fl = filters.get(f'{f}_list') or {}
+            fv = d.get(f)
+            if ex:
+                ok = fv not in fl
+            else:
+                ok = fv in fl
+            if not ok:
+                k = None
+        return k
+
     async def async_get_homerooms(self, renew=False):
         dat = await self.async_get_devices(renew=renew, return_all=True) or {}
         return dat.get('homes') or []
@@ -908,6 +1072,9 @@ class MiotCloud(micloud.MiCloud):
         mic.user_id = str(config.get('user_id') or '')
         if a := hass.data[DOMAIN].get('sessions', {}).get(mic.unique_id):
             mic = copy(a)
+            # each copy has its own pool, closed with it
+            mic._http_session = None
+            mic._unsub_close = None
             if hass_entry is not None:
                 mic.hass_entry = hass_entry
             mic.merger_config(config)
@@ -982,10 +1149,13 @@ class MiotCloud(micloud.MiCloud):
             return cfg
         return old
 
-    def api_session(self, **kwargs):
+    def check_logged_in(self):
         if not self.service_token or not self.user_id:
             raise MiCloudException('Cannot execute request. service token or userId missing. Make sure to login.')
 
+    def api_session(self, **kwargs):
+        self.check_logged_in()
+
         if kwargs.get('async'):
             session = self.async_session
             if not session or session.closed:
@@ -1001,6 +1171,76 @@ class MiotCloud(micloud.MiCloud):
             session.cookies.update(self.api_cookies())
         return session
 
+    def http_session(self):
+        """The pooled session of the account, kept alive between requests.
+        Credentials are sent with each request, so it outlives relogins.
+        """
+        session = self._http_session
+        if session and not session.closed:
+            return session
+        connector = aiohttp.TCPConnector(
+            limit=self.http_limit,
+            limit_per_host=self.http_limit_per_host,
+            keepalive_timeout=self.http_keepalive,
+            ttl_dns_cache=300,
+            ssl=get_default_context(),
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        if not self._unsub_close:
+            self._unsub_close = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, self.async_close,
+            )
+        self._http_session = session
+        return session
+
+    async def async_close(self, *event):
+        """Close the pooled session, on unload or when the cloud is discarded.
+        The next request opens it again.
+        """
+        unsub, self._unsub_close = self._unsub_close, None
+        if unsub and not event:
+            # the listener is removed by the bus once fired
+            unsub()
+        session, self._http_session = self._http_session, None
+        if session and not session.closed:
+            await session.close()
+
+    @staticmethod
+    async def async_close_all(clouds):
+        for cloud in {id(c): c for c in clouds}.values():
+            if isinstance(cloud, MiotCloud):
+                await cloud.async_close()
+
+    async def async_http_request(self, method, url, **kwargs):
+        """Request the api with the credentials of the account,
+        returns the status and the text of the response.
+        """
+        self.check_logged_in()
+        timeout = kwargs.pop('timeout', None) or self.http_timeout
+        if not isinstance(timeout, aiohttp.ClientTimeout):
+            timeout = aiohttp.ClientTimeout(total=timeout)
+        headers = {**self.api_headers(), **(kwargs.pop('headers', None) or {})}
+        cookies = {**self.api_cookies(), **(kwargs.pop('cookies', None) or {})}
+        for k in ('params', 'data'):
+            if isinstance(kwargs.get(k), dict):
+                kwargs[k] = self.form_values(kwargs[k])
+        async with self.http_session().request(
+            method, url, headers=headers, cookies=cookies, timeout=timeout, **kwargs,
+        ) as response:
+            return response.status, await response.text()
+
+    @staticmethod
+    def form_values(data: dict):
+        # encode like requests does, aiohttp only accepts str and numbers in the query
+        return {
+            k: str(v) if isinstance(v, bool) else v
+            for k, v in data.items()
+            if v is not None
+        }
+
     def api_headers(self):
         return {
             'X-XIAOMI-PROTOCAL-FLAG-CLI': 'PROTOCAL-HTTP2',
@@ -1039,22 +1279,38 @@ class MiotCloud(micloud.MiCloud):
         except MiCloudException as exc:
             _LOGGER.error('Error while decrypting response of request to %s: %s', url, exc)
 
+    async def async_request(self, url, params, **kwargs):
+        self.check_logged_in()
+        try:
+            nonce = miutils.gen_nonce()
+            signed_nonce = miutils.signed_nonce(self.ssecurity, nonce)
+            signature = miutils.gen_signature(url.replace('/app/', '/'), signed_nonce, nonce, params)
+            post_data = {
+                'signature': signature,
+                '_nonce': nonce,
+                'data': params['data'],
+            }
+            _, rsp = await self.async_http_request('POST', url, data=post_data, timeout=kwargs.get('timeout'))
+            return rsp
+        except MiCloudException as exc:
+            _LOGGER.error('Error while decrypting response of request to %s: %s', url, exc)
+
     async def async_request_rc4_api(self, api, params: dict, method='POST', **kwargs):
         url = self.get_api_url(api)
-        session = self.api_session(**{'async': True})
-        timeout = aiohttp.ClientTimeout(total=kwargs.get('timeout', self.http_timeout))
+        self.check_logged_in()
         headers = {
             'MIOT-ENCRYPT-ALGORITHM': 'ENCRYPT-RC4',
             'Accept-Encoding': 'identity',
         }
         params = self.rc4_params(method, url, params)
-        if method == 'GET':
-            response = await session.get(url, params=params, timeout=timeout, headers=headers)
-        else:
-            response = await session.post(url, data=params, timeout=timeout, headers=headers)
-        rsp = await response.text()
+        status, rsp = await self.async_http_request(
+            method, url,
+            **{'params' if method == 'GET' else 'data': params},
+            timeout=kwargs.get('timeout'),
+            headers=headers,
+        )
         if not rsp or 'error' in rsp or 'invalid' in rsp:
-            _LOGGER.warning('Error while executing request to %s: %s', url, rsp or response.status)
+            _LOGGER.warning('Error while executing request to %s: %s', url, rsp or status)
         elif 'message' not in rsp:
             try:
                 signed_nonce = self.signed_nonce(params['_nonce'])
@@ -1082,6 +1338,18 @@ class MiotCloud(micloud.MiCloud):
             _LOGGER.warning('Error while executing request to %s: %s', url, exc)
         return None
 
+    async def async_request_raw(self, url, data=None, method='GET', **kwargs):
+        url = self.get_api_url(url)
+        kwargs.setdefault('params' if method == 'GET' else 'data', data)
+        status, rsp = await self.async_http_request(method, url, **kwargs)
+        if status == 401:
+            self._logout()
+            _LOGGER.warning('Unauthorized while executing request to %s, logged out.', url)
+        if not rsp or 'error' in rsp or 'invalid' in rsp:
+            log = _LOGGER.info if 'remote/ubus' in url else _LOGGER.warning
+            log('Error while executing request to %s: %s', url, rsp or status)
+        return rsp
+
     def get_api_by_host(self, host, api=''):
         srv = self.default_server.lower()
         if srv and srv != 'cn':
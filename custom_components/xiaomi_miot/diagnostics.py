@@ -0,0 +1,46 @@
+"""Diagnostics support for Xiaomi Miot."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_TOKEN, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntry
+
+from .core.hass_entry import HassEntry
+
+TO_REDACT = {
+    CONF_PASSWORD, CONF_TOKEN, CONF_USERNAME, 'title',
+    'service_token', 'ssecurity', 'pass_token', 'user_id',
+}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics for a config entry."""
+    devices = {}
+    clouds = {}
+    if this := HassEntry.ALL.get(entry.entry_id):
+        devices = {
+            device.name_model: device.diagnostics()
+            for device in this.devices.values()
+        }
+        clouds = {
+            str(sid): {
+                'rate_limiter': cloud.limiter.as_dict(),
+                'api_metrics': cloud.metrics.as_dict(),
+            }
+            for sid, cloud in this.clouds.items()
+            if cloud
+        }
+    return {
+        'entry': async_redact_data(entry.as_dict(), TO_REDACT),
+        'clouds': clouds,
+        'devices': devices,
+    }
+
+
+async def async_get_device_diagnostics(hass: HomeAssistant, entry: ConfigEntry, device: DeviceEntry) -> dict:
+    """Return diagnostics for a device."""
+    if this := HassEntry.ALL.get(entry.entry_id):
+        for dvc in this.devices.values():
+            if dvc.identifiers & device.identifiers:
+                return dvc.diagnostics()
+    return {}
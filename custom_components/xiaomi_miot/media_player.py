@@ -50,6 +50,7 @@ from . import (
     bind_services_to_entries,
 )
 from .core.const import HA_VERSION
+from .core.rate_limiter import PRIORITY_WRITE
 from .core.xiaomi_cloud import CloudSid
 from .core.miot_spec import (
     MiotSpec,
@@ -568,7 +569,7 @@ class MiotMediaPlayerEntity(MiotEntity, BaseMediaPlayerEntity):
             'method': 'player_play_url',
             'message': json.dumps({'url': media_id, 'type': media_type, 'media': 'app_ios'}),
         }
-        rdt = await self.xiaoai_cloud.async_request_api(api, data=dat, method='POST') or {}
+        rdt = await self.xiaoai_cloud.async_request_api(api, data=dat, method='POST', priority=PRIORITY_WRITE) or {}
         logger = rdt.get('code') and self.logger.warning or self.logger.info
         logger('%s: Play media: %s', self.name_model, [dat, rdt])
 
@@ -608,7 +609,7 @@ class MiotMediaPlayerEntity(MiotEntity, BaseMediaPlayerEntity):
             'method': 'player_play_music',
             'message': json.dumps({"startaudioid": audio_id, "music": json.dumps(music)}),
         }
-        rdt = await self.xiaoai_cloud.async_request_api(api, data=dat, method='POST') or {}
+        rdt = await self.xiaoai_cloud.async_request_api(api, data=dat, method='POST', priority=PRIORITY_WRITE) or {}
         logger = rdt.get('code') and self.logger.warning or self.logger.info
         logger('%s: Play Music: %s', self.name_model, [dat, rdt])
 
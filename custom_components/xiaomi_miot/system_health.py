@@ -1,7 +1,11 @@
 """Provide info to system health."""
+import asyncio
+
 from homeassistant.components import system_health
 from homeassistant.core import HomeAssistant, callback
 
+from .core.cloud_metrics import summary as metrics_summary
+from .core.mini_miio import MiIOMultiplexer
 from .core.utils import async_get_manifest
 from .core.xiaomi_cloud import MiotCloud
 
@@ -18,8 +22,10 @@ async def system_health_info(hass):
     uas = {}
     uds = {}
     all_devices = {}
+    metrics = []
     for mic in MiotCloud.all_clouds(hass):
         uas[mic.user_id] = mic
+        metrics.extend(mic.metrics.paths.values())
         uds[mic.unique_id] = await mic.async_get_devices_by_key('did') or {}
         all_devices.update(uds[mic.unique_id])
 
@@ -37,4 +43,21 @@ async def system_health_info(hass):
         'total_devices': len(all_devices),
     }
 
+    if metrics:
+        sts = metrics_summary(metrics)
+        data.update({
+            'cloud_requests': f'{sts["requests"]} requests, {sts["timeouts"]} timeouts, {sts["errors"]} errors',
+            'cloud_latency': f'p50 {sts["p50"]} ms, p95 {sts["p95"]} ms, p99 {sts["p99"]} ms',
+            'cloud_retries': f'{sts["retries"]} retried, {sts["token_expired"]} token expired',
+        })
+
+    if mux := MiIOMultiplexer.instances.get(asyncio.get_running_loop()):
+        sts = mux.stats
+        data.update({
+            'lan_clients': len(mux.clients),
+            'lan_packets': f'{sts["sent"]} sent, {sts["received"]} received, {sts["dropped"]} dropped',
+            'lan_timeouts': f'{sts["timeouts"]}/{sts["requests"]}',
+            'lan_retries': f'{sts["retries"]} retried, {sts["retries_denied"]} denied',
+        })
+
     return data
@@ -0,0 +1,76 @@
+"""Poll simulated miIO devices through the LAN stack.
+
+Run with `python -m tests.benchmarks.bench_lan_poll [10 100 1000]`.
+
+Every device is polled like the coordinator of a device does it, with
+`MiotDevice.async_get_properties_for_mapping` for all readable properties
+of the spec fixture, as fast as the devices answer.
+"""
+import asyncio
+import resource
+import statistics
+import sys
+import time
+
+from custom_components.xiaomi_miot.core.device import MiotDevice
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO, MiIOMultiplexer
+
+from ..fake_miio import load_spec, start_fake_devices
+
+DURATION = 10
+
+
+def readable_mapping(spec: dict) -> dict:
+    return {
+        f'{srv["iid"]}.{prop["iid"]}': {"siid": srv["iid"], "piid": prop["iid"]}
+        for srv in spec["services"]
+        for prop in srv.get("properties", [])
+        if "read" in prop.get("access", [])
+    }
+
+
+async def poll(miot: MiotDevice, mapping: dict, until: float, latencies: list):
+    while time.monotonic() < until:
+        started = time.monotonic()
+        await miot.async_get_properties_for_mapping(did="1", mapping=mapping)
+        latencies.append(time.monotonic() - started)
+
+
+async def bench(count: int, duration: float = DURATION, **kwargs):
+    spec = load_spec()
+    mapping = readable_mapping(spec)
+    devices = await start_fake_devices(spec, count, **kwargs)
+    try:
+        miots = [
+            MiotDevice(None, AsyncMiIO("127.0.0.1", d.token, port=d.port))
+            for d in devices
+        ]
+        latencies = []
+        until = time.monotonic() + duration
+        await asyncio.gather(*[poll(m, mapping, until, latencies) for m in miots])
+    finally:
+        for device in devices:
+            device.close()
+        mux = MiIOMultiplexer.instances.get(asyncio.get_running_loop())
+        if mux and mux.transport:
+            mux.transport.close()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    print(
+        f"{count:>5} devices: {len(latencies) / duration:8.1f} polls/s, "
+        f"median {statistics.median(latencies) * 1000:6.2f} ms, "
+        f"p99 {p99 * 1000:6.2f} ms"
+    )
+
+
+def main(counts: list[int]):
+    # one socket per simulated device
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 4096)), hard))
+    for count in counts:
+        asyncio.run(bench(count))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,85 @@
+"""Compare the miIO packet codec with the previous implementation.
+
+Run with `python -m tests.benchmarks.bench_miio_codec`.
+"""
+import hashlib
+import json
+import time
+import timeit
+
+from cryptography.hazmat.primitives import padding
+
+from custom_components.xiaomi_miot.core.mini_miio import BasemiIO
+
+TOKEN = "00112233445566778899aabbccddeeff"
+PARAMS = [{"did": f"prop.2.{i}", "siid": 2, "piid": i} for i in range(1, 16)]
+
+
+class LegacyMiIO(BasemiIO):
+    """The codec before packets were built in preallocated buffers."""
+
+    def _encrypt(self, plaintext: bytes):
+        padder = padding.PKCS7(128).padder()
+        padded_plaintext = padder.update(plaintext) + padder.finalize()
+
+        encryptor = self.cipher.encryptor()
+        return encryptor.update(padded_plaintext) + encryptor.finalize()
+
+    def _decrypt(self, ciphertext: bytes):
+        decryptor = self.cipher.decryptor()
+        padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+
+        unpadder = padding.PKCS7(128).unpadder()
+        return unpadder.update(padded_plaintext) + unpadder.finalize()
+
+    def _pack_raw(self, msg_id: int, method: str, params=None):
+        payload = (
+            json.dumps(
+                {"id": msg_id, "method": method, "params": params or []},
+                separators=(",", ":"),
+            ).encode()
+            + b"\x00"
+        )
+
+        data = self._encrypt(payload)
+
+        raw = b"\x21\x31"
+        raw += (32 + len(data)).to_bytes(2, "big")
+        raw += b"\x00\x00\x00\x00"
+        raw += self.device_id.to_bytes(4, "big")
+        raw += int(time.time() - self.delta_ts).to_bytes(4, "big")
+
+        raw += hashlib.md5(raw + self.token + data).digest()
+        raw += data
+        return raw
+
+    def _unpack_raw(self, raw: bytes):
+        assert raw[:2] == b"\x21\x31"
+        return self._decrypt(raw[32:])
+
+
+def bench(codec: BasemiIO, number: int) -> tuple[float, float]:
+    codec.device_id = 1234567
+    codec.delta_ts = 0
+    raw = codec._pack_raw(1, "get_properties", PARAMS)
+    pack = min(
+        timeit.repeat(
+            lambda: codec._pack_raw(1, "get_properties", PARAMS),
+            number=number,
+            repeat=5,
+        )
+    )
+    unpack = min(
+        timeit.repeat(lambda: codec._unpack_raw(raw), number=number, repeat=5)
+    )
+    return pack / number * 1e6, unpack / number * 1e6
+
+
+def main(number: int = 20000):
+    for name, cls in (("legacy", LegacyMiIO), ("current", BasemiIO)):
+        pack, unpack = bench(cls("127.0.0.1", TOKEN), number)
+        print(f"{name:>8}: pack {pack:.2f} us, unpack {unpack:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
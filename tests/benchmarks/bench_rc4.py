@@ -0,0 +1,44 @@
+"""Compare the RC4 backends on cloud payloads of different sizes.
+
+Run with `python -m tests.benchmarks.bench_rc4`.
+
+Every payload is encrypted like `MiotCloud.encrypt_data` does it: a new
+cipher, 1024 dropped keystream bytes, then the payload.
+"""
+import os
+import timeit
+
+from custom_components.xiaomi_miot.core import utils
+from custom_components.xiaomi_miot.core.utils import RC4
+
+KEY = bytes(range(32))
+SIZES = [64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024]
+
+
+def bench(size: int) -> float:
+    data = os.urandom(size)
+    number = max(1, 2 ** 20 // (size + 1024) // 4)
+    best = min(
+        timeit.repeat(
+            lambda: RC4(KEY).init1024().crypt(data),
+            number=number,
+            repeat=3,
+        )
+    )
+    return best / number * 1e3
+
+
+def main():
+    backend = utils.ARC4
+    for name, arc4 in (("python", None), ("openssl", backend)):
+        if name == "openssl" and arc4 is None:
+            print(f"{name:>8}: not available")
+            continue
+        utils.ARC4 = arc4
+        for size in SIZES:
+            print(f"{name:>8}: {size:>8} bytes {bench(size):10.3f} ms")
+    utils.ARC4 = backend
+
+
+if __name__ == "__main__":
+    main()
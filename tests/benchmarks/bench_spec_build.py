@@ -0,0 +1,43 @@
+"""Time the construction of a miot spec tree, translations included.
+
+Run with `python -m tests.benchmarks.bench_spec_build`.
+
+The spec is built from the thermostat fixture with the globals only, then
+again with the zh translations merged in like
+`async_reload_integration_config` does it.
+"""
+import json
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+from custom_components.xiaomi_miot.core import utils
+from custom_components.xiaomi_miot.core.miot_spec import MiotSpec
+from custom_components.xiaomi_miot.core.translation_languages import TRANSLATION_LANGUAGES
+
+FIXTURE = Path(__file__).parent.parent / "fixtures" / "cnhdm.airrtc.wkq01.json"
+NUMBER = 200
+
+
+def bench(hass, dat) -> float:
+    best = min(timeit.repeat(lambda: MiotSpec(hass, dat), number=NUMBER, repeat=5))
+    return best / NUMBER * 1e3
+
+
+def main():
+    dat = json.loads(FIXTURE.read_text(encoding="utf-8"))
+    hass = SimpleNamespace(config=SimpleNamespace(language="en"))
+    print(f"{'globals':>8}: {bench(hass, dat):8.3f} ms")
+
+    original = dict(TRANSLATION_LANGUAGES)
+    TRANSLATION_LANGUAGES.update(TRANSLATION_LANGUAGES["zh"])
+    utils.clear_translations()
+    hass.config.language = "zh"
+    print(f"{'zh':>8}: {bench(hass, dat):8.3f} ms")
+    TRANSLATION_LANGUAGES.clear()
+    TRANSLATION_LANGUAGES.update(original)
+    utils.clear_translations()
+
+
+if __name__ == "__main__":
+    main()
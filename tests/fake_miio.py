@@ -0,0 +1,242 @@
+"""Simulated miIO devices on localhost, driven by miot spec fixtures."""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+FIXTURES = Path(__file__).parent / "fixtures"
+HELLO = bytes.fromhex("21310020" + "ff" * 28)
+
+# miot error codes
+PROPERTY_NOT_EXIST = -4003
+PROPERTY_NOT_READABLE = -4001
+PROPERTY_NOT_WRITABLE = -4002
+ACTION_NOT_EXIST = -4004
+
+
+def load_spec(name: str = "cnhdm.airrtc.wkq01.json") -> dict:
+    with (FIXTURES / name).open(encoding="utf-8") as file:
+        return json.load(file)
+
+
+def default_value(prop: dict):
+    if values := prop.get("value-list"):
+        return values[0]["value"]
+    fmt = prop.get("format", "")
+    if fmt == "bool":
+        return False
+    if fmt == "string":
+        return ""
+    if rng := prop.get("value-range"):
+        return rng[0]
+    return 0
+
+
+class FakeMiioDevice(asyncio.DatagramProtocol):
+    """Answers like a miIO device with the properties and actions of a spec.
+
+    - `latency` seconds before each answer, plus up to `jitter` seconds
+    - `loss` probability of ignoring a request
+    - answers longer than `reply_limit` bytes are dropped, like devices do
+    """
+
+    transport = None
+
+    def __init__(
+        self,
+        spec: dict,
+        did: int = 1000000,
+        token: str = None,
+        model: str = "fake.miio.v1",
+        latency: float = 0,
+        jitter: float = 0,
+        loss: float = 0,
+        reply_limit: int = 1056,
+        seed: int = None,
+    ):
+        self.did = did
+        self.token = token or hashlib.md5(str(did).encode()).hexdigest()
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reply_limit = reply_limit
+        self.random = random.Random(seed if seed is not None else did)
+        self.started = time.time()
+        self.stats = {"requests": 0, "lost": 0, "oversize": 0, "answers": 0}
+        # answers waiting for their latency
+        self.delayed: set[asyncio.TimerHandle] = set()
+
+        key = hashlib.md5(bytes.fromhex(self.token)).digest()
+        iv = hashlib.md5(key + bytes.fromhex(self.token)).digest()
+        self.cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
+
+        self.props = {}
+        self.actions = {}
+        for srv in spec.get("services", []):
+            for prop in srv.get("properties", []):
+                self.props[(srv["iid"], prop["iid"])] = {
+                    "access": prop.get("access", []),
+                    "value": default_value(prop),
+                }
+            for act in srv.get("actions", []):
+                self.actions[(srv["iid"], act["iid"])] = act
+
+    @property
+    def port(self) -> int:
+        return self.transport.get_extra_info("sockname")[1]
+
+    def value(self, siid: int, piid: int):
+        return self.props[(siid, piid)]["value"]
+
+    def close(self):
+        for handle in self.delayed:
+            handle.cancel()
+        self.delayed.clear()
+        if self.transport:
+            self.transport.close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, raw: bytes, addr):
+        if raw == HELLO:
+            self.answer(self.header(32) + b"\xff" * 16, addr)
+            return
+        self.stats["requests"] += 1
+        if self.loss and self.random.random() < self.loss:
+            self.stats["lost"] += 1
+            return
+        try:
+            req = self.unpack(raw)
+        except Exception:
+            return
+        result = self.handle(req.get("method"), req.get("params"))
+        data = json.dumps({"id": req.get("id"), **result}).encode()
+        packet = self.pack(data)
+        if len(packet) > self.reply_limit:
+            self.stats["oversize"] += 1
+            return
+        self.answer(packet, addr)
+
+    def answer(self, packet: bytes, addr):
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.random() * self.jitter
+        if delay:
+            def send():
+                self.delayed.discard(handle)
+                self.sendto(packet, addr)
+
+            handle = asyncio.get_running_loop().call_later(delay, send)
+            self.delayed.add(handle)
+        else:
+            self.sendto(packet, addr)
+
+    def sendto(self, packet: bytes, addr):
+        if self.transport and not self.transport.is_closing():
+            self.stats["answers"] += 1
+            self.transport.sendto(packet, addr)
+
+    def header(self, length: int) -> bytes:
+        ts = int(time.time() - self.started) + 1000
+        return (
+            b"\x21\x31"
+            + length.to_bytes(2, "big")
+            + bytes(4)
+            + self.did.to_bytes(4, "big")
+            + ts.to_bytes(4, "big")
+        )
+
+    def pack(self, data: bytes) -> bytes:
+        padder = padding.PKCS7(128).padder()
+        encryptor = self.cipher.encryptor()
+        data = encryptor.update(padder.update(data) + padder.finalize())
+        data += encryptor.finalize()
+        header = self.header(32 + len(data))
+        checksum = hashlib.md5(header + bytes.fromhex(self.token) + data).digest()
+        return header + checksum + data
+
+    def unpack(self, raw: bytes) -> dict:
+        data = raw[32:]
+        checksum = hashlib.md5(raw[:16] + bytes.fromhex(self.token) + data).digest()
+        if raw[:2] != b"\x21\x31" or raw[16:32] != checksum:
+            raise ValueError("Bad packet")
+        decryptor = self.cipher.decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        data = decryptor.update(data) + decryptor.finalize()
+        data = unpadder.update(data) + unpadder.finalize()
+        return json.loads(data.rstrip(b"\x00"))
+
+    def handle(self, method: str, params) -> dict:
+        if method == "miIO.info":
+            return {
+                "result": {
+                    "model": self.model,
+                    "fw_ver": "1.0.0",
+                    "hw_ver": "Linux",
+                    "token": self.token,
+                    "netif": {"localIp": "127.0.0.1"},
+                }
+            }
+        if method == "get_properties":
+            return {"result": [self.get_property(p) for p in params]}
+        if method == "set_properties":
+            return {"result": [self.set_property(p) for p in params]}
+        if method == "action":
+            return {"result": self.action(params)}
+        return {"error": {"code": -9999, "message": "user ack timeout"}}
+
+    def get_property(self, param: dict) -> dict:
+        res = {k: param.get(k) for k in ("did", "siid", "piid")}
+        prop = self.props.get((param.get("siid"), param.get("piid")))
+        if prop is None:
+            res["code"] = PROPERTY_NOT_EXIST
+        elif "read" not in prop["access"]:
+            res["code"] = PROPERTY_NOT_READABLE
+        else:
+            res.update(code=0, value=prop["value"])
+        return res
+
+    def set_property(self, param: dict) -> dict:
+        res = {k: param.get(k) for k in ("did", "siid", "piid")}
+        prop = self.props.get((param.get("siid"), param.get("piid")))
+        if prop is None:
+            res["code"] = PROPERTY_NOT_EXIST
+        elif "write" not in prop["access"]:
+            res["code"] = PROPERTY_NOT_WRITABLE
+        else:
+            prop["value"] = param.get("value")
+            res["code"] = 0
+        return res
+
+    def action(self, param: dict) -> dict:
+        key = (param.get("siid"), param.get("aiid"))
+        if key not in self.actions:
+            return {**param, "code": ACTION_NOT_EXIST}
+        return {"did": param.get("did"), "siid": key[0], "aiid": key[1], "code": 0, "out": []}
+
+
+async def start_fake_devices(
+    spec: dict, count: int = 1, host: str = "127.0.0.1", **kwargs
+) -> list[FakeMiioDevice]:
+    """Start simulated devices, each on its own port of the host."""
+    loop = asyncio.get_running_loop()
+    devices = []
+    try:
+        for idx in range(count):
+            _, device = await loop.create_datagram_endpoint(
+                lambda: FakeMiioDevice(spec, did=1000000 + idx, **kwargs),
+                local_addr=(host, 0),
+            )
+            devices.append(device)
+    except Exception:
+        for device in devices:
+            device.close()
+        raise
+    return devices
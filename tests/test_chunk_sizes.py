@@ -0,0 +1,110 @@
+"""Tests for the learned chunk sizes of LAN get_properties."""
+import asyncio
+
+import pytest
+
+from custom_components.xiaomi_miot.core.chunk_sizes import ChunkSizes
+from custom_components.xiaomi_miot.core.device import MiotDevice
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO, MiIOMultiplexer
+from custom_components.xiaomi_miot.core.utils import DeviceException
+
+from .test_mini_miio import TOKEN, _FakeDevice
+
+KEY = "xiaomi.test.v1@1.0.0"
+
+
+def _resp(count: int, value="x"):
+    return {
+        "id": 1,
+        "result": [{"siid": 2, "piid": i, "code": 0, "value": value} for i in range(count)],
+    }
+
+
+def test_grows_after_full_chunks(hass):
+    sizes = ChunkSizes(hass)
+    for _ in range(ChunkSizes.grow_after):
+        sizes.observe(KEY, 5, 5, _resp(5))
+
+    assert sizes.get(KEY) == 6
+
+
+def test_partial_chunks_do_not_grow(hass):
+    sizes = ChunkSizes(hass)
+    for _ in range(10):
+        sizes.observe(KEY, 5, 2, _resp(2))
+
+    assert sizes.get(KEY) == 5
+
+
+def test_shrinks_on_timeout_and_stays_below_limit(hass):
+    sizes = ChunkSizes(hass)
+    sizes.observe(KEY, 8, 8, {})
+    assert sizes.get(KEY) == 4
+
+    for _ in range(ChunkSizes.grow_after * 10):
+        sizes.observe(KEY, sizes.get(KEY), sizes.get(KEY), _resp(sizes.get(KEY)))
+    assert sizes.get(KEY) == 7
+
+
+def test_shrinks_on_truncated_reply(hass):
+    sizes = ChunkSizes(hass)
+    sizes.observe(KEY, 10, 10, _resp(6))
+
+    assert sizes.get(KEY) == 5
+
+
+def test_timeout_of_remainder_chunk_keeps_size(hass):
+    sizes = ChunkSizes(hass)
+    sizes.observe(KEY, 8, 8, _resp(8))
+    sizes.observe(KEY, 8, 3, {})
+    sizes.observe(KEY, 8, 3, _resp(1))
+
+    assert sizes.get(KEY) == 8
+    assert sizes.data[KEY]["limit"] == 0
+
+
+def test_ignores_offline_device(hass):
+    sizes = ChunkSizes(hass)
+    sizes.observe(KEY, 10, 10, None)
+
+    assert sizes.get(KEY) is None
+
+
+def test_does_not_grow_over_reply_limit(hass):
+    sizes = ChunkSizes(hass)
+    value = "x" * 150
+    for _ in range(ChunkSizes.grow_after * 5):
+        sizes.observe(KEY, sizes.get(KEY) or 5, 5, _resp(5, value))
+
+    assert sizes.get(KEY) == 5
+
+
+async def test_pipelined_timeout_is_not_learned(hass, socket_enabled):
+    loop = asyncio.get_running_loop()
+    transport, device = await loop.create_datagram_endpoint(
+        lambda: _FakeDevice(1234567, silent=3), local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    miot = MiotDevice(hass, AsyncMiIO("127.0.0.1", TOKEN, timeout=0.2, port=port))
+    miot.chunk_sizes = ChunkSizes(hass)
+    miot.chunk_key = KEY
+    miot.chunk_window = 3
+    params = [{"siid": 2, "piid": i} for i in range(10)]
+    try:
+        mux = await miot.miio.connect()
+        # no retries
+        mux.budget.balance = 0
+        with pytest.raises(DeviceException):
+            await miot._async_send_chunk("get_properties", params, 3, learn=True)
+        assert miot.chunk_sizes.get(KEY) is None
+        assert miot.chunk_window == 1
+
+        device.silent = 1
+        with pytest.raises(DeviceException):
+            await miot._async_send_chunk("get_properties", params, 3, learn=True)
+        assert miot.chunk_sizes.get(KEY) == 1
+    finally:
+        transport.close()
+        mux = MiIOMultiplexer.instances.get(loop)
+        if mux and mux.transport:
+            mux.transport.close()
@@ -0,0 +1,124 @@
+"""Tests for the pooled aiohttp requests of MiotCloud."""
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from custom_components.xiaomi_miot.core.xiaomi_cloud import MiotCloud
+
+
+async def _server(handler):
+    """A local api server, tests using it need `socket_enabled`."""
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def _cloud(hass, sid="micoapi"):
+    cloud = MiotCloud(hass, "u", "p", "cn", sid)
+    cloud.user_id = "1"
+    cloud.service_token = "TKN"
+    cloud.ssecurity = "c2VjdXJpdHk="
+    return cloud
+
+
+async def test_raw_requests_share_one_connection(hass, socket_enabled):
+    seen = []
+
+    async def handler(request):
+        seen.append({
+            "peer": request.transport.get_extra_info("peername"),
+            "query": dict(request.query),
+            "cookies": dict(request.cookies),
+        })
+        return web.json_response({"code": 0, "data": len(seen)})
+
+    server = await _server(handler)
+    cloud = _cloud(hass)
+    try:
+        url = str(server.make_url("/api"))
+        for _ in range(3):
+            rdt = await cloud.async_request_api(url, {"a": 1, "b": True, "c": None}, method="GET", cookies={"deviceId": "x"})
+            assert rdt["code"] == 0
+    finally:
+        await cloud.async_close()
+        await server.close()
+
+    assert len(seen) == 3
+    assert len({s["peer"] for s in seen}) == 1
+    assert seen[0]["query"] == {"a": "1", "b": "True"}
+    assert seen[0]["cookies"]["serviceToken"] == "TKN"
+    assert seen[0]["cookies"]["deviceId"] == "x"
+
+
+async def test_session_survives_relogin(hass, socket_enabled):
+    tokens = []
+
+    async def handler(request):
+        tokens.append(request.cookies.get("serviceToken"))
+        return web.json_response({"code": 0})
+
+    server = await _server(handler)
+    cloud = _cloud(hass)
+    try:
+        url = str(server.make_url("/api"))
+        await cloud.async_request_api(url, {}, method="POST")
+        session = cloud.http_session()
+        cloud.service_token = "NEW"
+        await cloud.async_request_api(url, {}, method="POST")
+        assert cloud.http_session() is session
+    finally:
+        await cloud.async_close()
+        await server.close()
+
+    assert tokens == ["TKN", "NEW"]
+
+
+async def test_raw_unauthorized_logs_out(hass, socket_enabled):
+    async def handler(request):
+        return web.Response(status=401, text='{"code": 401}')
+
+    server = await _server(handler)
+    cloud = _cloud(hass)
+    try:
+        await cloud.async_request_api(str(server.make_url("/api")), {}, method="GET")
+    finally:
+        await cloud.async_close()
+        await server.close()
+
+    assert cloud.service_token is None
+
+
+async def test_signed_request_without_encryption(hass, socket_enabled):
+    posted = []
+
+    async def handler(request):
+        posted.append(dict(await request.post()))
+        return web.json_response({"code": 0, "result": "ok"})
+
+    server = await _server(handler)
+    cloud = _cloud(hass, sid="xiaomiio")
+    try:
+        rdt = await cloud.async_request_api(str(server.make_url("/app/home/x")), {"k": 1}, crypt=False)
+    finally:
+        await cloud.async_close()
+        await server.close()
+
+    assert rdt == {"code": 0, "result": "ok"}
+    assert set(posted[0]) == {"signature", "_nonce", "data"}
+    assert posted[0]["data"] == '{"k":1}'
+
+
+async def test_close_removes_listener(hass):
+    listeners = sum(hass.bus.async_listeners().values())
+    cloud = _cloud(hass)
+    session = cloud.http_session()
+    assert sum(hass.bus.async_listeners().values()) == listeners + 1
+
+    await cloud.async_close()
+    assert session.closed
+    assert sum(hass.bus.async_listeners().values()) == listeners
+
+    assert not cloud.http_session().closed
+    await cloud.async_close()
+    assert sum(hass.bus.async_listeners().values()) == listeners
@@ -0,0 +1,116 @@
+"""Tests for the per-path telemetry of cloud requests."""
+import asyncio
+
+import aiohttp
+import pytest
+
+from custom_components.xiaomi_miot.core import cloud_metrics
+from custom_components.xiaomi_miot.core.cloud_metrics import ApiMetrics, summary
+from custom_components.xiaomi_miot.core.rate_limiter import PRIORITY_WRITE
+from custom_components.xiaomi_miot.core.utils import aiohttp_retry
+from custom_components.xiaomi_miot.core.xiaomi_cloud import MiotCloud
+
+
+def test_path_of_api():
+    assert ApiMetrics.path_of("miotspec/prop/get") == "miotspec/prop/get"
+    assert ApiMetrics.path_of("/home/device_list") == "home/device_list"
+    assert ApiMetrics.path_of("https://api2.mina.mi.com/remote/ubus?x=1") == "api2.mina.mi.com/remote/ubus"
+
+
+def test_latencies_are_bounded_and_summarized():
+    metrics = ApiMetrics()
+    for n in range(1, 1001):
+        metrics.request("miotspec/prop/get", n / 1000, rsp="{}")
+    metrics.request("miotspec/prop/get", 10, timeout=True)
+    metrics.request("miotspec/prop/get", 0.1, error=True)
+
+    mtr = metrics.paths["miotspec/prop/get"]
+    assert len(mtr.latencies) == mtr.samples
+    info = mtr.as_dict()
+    assert info["requests"] == 1002
+    assert info["timeouts"] == 1
+    assert info["errors"] == 1
+    assert info["bytes"] == 2000
+    # the last 200 requests took 801..1000 ms
+    assert info["p50"] == 901
+    assert info["p99"] == 999
+
+    sts = summary(metrics.paths.values())
+    assert sts["requests"] == 1002
+    assert sts["p95"] == info["p95"]
+
+
+def test_paths_are_capped(monkeypatch):
+    monkeypatch.setattr(cloud_metrics, "MAX_PATHS", 2)
+    metrics = ApiMetrics()
+    for api in ("a", "b", "c", "d"):
+        metrics.request(api, 0.1, rsp="")
+    assert set(metrics.paths) == {"a", "b", cloud_metrics.OTHER_PATH}
+    assert metrics.paths[cloud_metrics.OTHER_PATH].requests == 2
+
+
+async def test_requests_of_the_cloud_are_recorded(hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.service_token = "TKN"
+    answers = iter(['{"code": 0, "result": []}', '{"code": 2, "message": "auth err"}'])
+
+    async def request(*args, **kwargs):
+        return next(answers)
+
+    async def timeout(*args, **kwargs):
+        raise asyncio.TimeoutError
+
+    cloud.async_request_rc4_api = request
+    await cloud.async_request_api("miotspec/prop/get", {})
+    await cloud.async_request_api("miotspec/prop/get", {})
+    cloud.async_request_rc4_api = timeout
+    await cloud.async_request_api("miotspec/prop/get", {})
+
+    info = cloud.metrics.as_dict()["miotspec/prop/get"]
+    assert info["requests"] == 3
+    assert info["timeouts"] == 1
+    assert info["token_expired"] == 1
+
+
+async def test_retries_are_reported():
+    retried = []
+
+    @aiohttp_retry(2, backoff_factor=0, on_retry=lambda exc, *args: retried.append(args))
+    async def flaky(name):
+        raise aiohttp.ClientResponseError(None, (), status=503)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        await flaky("x")
+    assert retried == [("x",), ("x",)]
+
+
+@pytest.mark.parametrize("call, api", [
+    ("async_set_props", "miotspec/prop/set"),
+    ("async_do_action", "miotspec/action"),
+])
+async def test_writes_are_retried_with_write_priority(hass, monkeypatch, call, api):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.service_token = "TKN"
+    answers = iter([
+        aiohttp.ClientResponseError(None, (), status=503),
+        '{"code": 0, "result": [{"code": 0}]}',
+    ])
+    priorities = []
+    sleep = asyncio.sleep
+
+    async def request(*args, **kwargs):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def acquire(priority):
+        priorities.append(priority)
+
+    monkeypatch.setattr(asyncio, "sleep", lambda delay, *args: sleep(0))
+    cloud.async_request_rc4_api = request
+    cloud.limiter.acquire = acquire
+
+    assert await getattr(cloud, call)([{"did": "1"}]) == [{"code": 0}]
+    assert priorities == [PRIORITY_WRITE] * 2
+    assert cloud.metrics.as_dict()[api]["retries"] == 1
@@ -0,0 +1,99 @@
+"""Tests for batching cloud property reads across devices of an account."""
+import asyncio
+
+from custom_components.xiaomi_miot.core.xiaomi_cloud import MiotCloud
+
+
+def _cloud(hass, requests, size=100):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.props_batch_window = 0.01
+    cloud.props_batch_size = size
+
+    async def get_props(params=None):
+        requests.append(params)
+        return [{**p, "code": 0, "value": p["piid"]} for p in params]
+
+    cloud.async_get_props = get_props
+    return cloud
+
+
+async def test_reads_of_devices_share_requests(hass):
+    requests = []
+    cloud = _cloud(hass, requests)
+    mapping = {"switch.on": {"siid": 2, "piid": 1}, "light.brightness": {"siid": 2, "piid": 2}}
+    res1, res2 = await asyncio.gather(
+        cloud.async_get_properties_for_mapping("1", mapping),
+        cloud.async_get_properties_for_mapping("2", mapping),
+    )
+
+    assert len(requests) == 1
+    assert [r["did"] for r in requests[0]] == ["1", "1", "2", "2"]
+    assert [(r["did"], r["prop"]) for r in res1] == [("1", "switch.on"), ("1", "light.brightness")]
+    assert [(r["did"], r["prop"]) for r in res2] == [("2", "switch.on"), ("2", "light.brightness")]
+
+
+async def test_batches_are_size_bounded(hass):
+    requests = []
+    cloud = _cloud(hass, requests, size=3)
+    mapping = {f"prop{i}": {"siid": 2, "piid": i} for i in range(1, 3)}
+    results = await asyncio.gather(*[
+        cloud.async_get_properties_for_mapping(str(did), mapping)
+        for did in range(4)
+    ])
+
+    assert [len(pms) for pms in requests] == [3, 3, 2]
+    assert all(len(res) == 2 for res in results)
+
+
+async def test_batching_can_be_disabled(hass):
+    requests = []
+    cloud = _cloud(hass, requests)
+    cloud.props_batch_window = 0
+    await cloud.async_get_properties_for_mapping("1", {"a": {"siid": 2, "piid": 1}})
+
+    assert cloud._props_batcher is None
+    assert len(requests) == 1
+
+
+def test_default_window_is_short(hass):
+    assert MiotCloud(hass, "u", "p", "cn", "xiaomiio").props_batch_window < 0.1
+
+
+async def test_failed_batch_reaches_its_callers(hass):
+    requests = []
+    cloud = _cloud(hass, requests, size=2)
+    get_props = cloud.async_get_props
+
+    async def fail_for_device_1(params=None):
+        if any(p["did"] == "1" for p in params):
+            requests.append(params)
+            raise asyncio.TimeoutError
+        return await get_props(params)
+
+    cloud.async_get_props = fail_for_device_1
+    mapping = {"prop1": {"siid": 2, "piid": 1}, "prop2": {"siid": 2, "piid": 2}}
+    res0, res1 = await asyncio.gather(
+        cloud.async_get_properties_for_mapping("0", mapping),
+        cloud.async_get_properties_for_mapping("1", mapping),
+        return_exceptions=True,
+    )
+
+    assert len(requests) == 2
+    assert [r["did"] for r in res0] == ["0", "0"]
+    assert isinstance(res1, asyncio.TimeoutError)
+
+
+async def test_all_batches_failing_reach_every_caller(hass):
+    cloud = _cloud(hass, [])
+
+    async def fail(params=None):
+        raise asyncio.TimeoutError
+
+    cloud.async_get_props = fail
+    results = await asyncio.gather(
+        cloud.async_get_properties_for_mapping("0", {"a": {"siid": 2, "piid": 1}}),
+        cloud.async_get_properties_for_mapping("1", {"a": {"siid": 2, "piid": 1}}),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(res, asyncio.TimeoutError) for res in results)
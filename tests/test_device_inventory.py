@@ -0,0 +1,167 @@
+"""Tests for diffing the cloud device list of an account."""
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.xiaomi_miot.core.device_inventory import SIGNAL_DEVICES_CHANGED, DevicesDiff
+from custom_components.xiaomi_miot.core.xiaomi_cloud import MiotCloud
+
+
+def _dev(did, **kwargs):
+    return {"did": did, "name": f"Device {did}", "localip": "192.168.1.2", "token": "00" * 16, **kwargs}
+
+
+def test_diff_by_did():
+    old = [_dev("1"), _dev("2"), _dev("3", isOnline=True)]
+    new = [_dev("1", localip="192.168.1.9"), _dev("3", isOnline=False), _dev("4")]
+    diff = DevicesDiff.compare(old, new)
+
+    assert list(diff.added) == ["4"]
+    assert list(diff.removed) == ["2"]
+    assert list(diff.changed) == ["1"]
+    assert diff.changed["1"][1] == {"localip"}
+    assert not DevicesDiff.compare(old, old)
+
+
+def _cloud(hass, devices):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.user_id = "100"
+    cloud.get_home_devices = AsyncMock(return_value={"homelist": [], "devices": {}})
+    cloud.get_device_list = AsyncMock(return_value=[])
+    cloud.get_all_devices = AsyncMock(side_effect=lambda homes, listing: [dict(d) for d in devices])
+    return cloud
+
+
+async def test_renew_without_changes_delays_store(hass, hass_storage):
+    devices = [_dev("1"), _dev("2")]
+    cloud = _cloud(hass, devices)
+    key = "xiaomi_miot/devices-100-cn.json"
+
+    assert len(await cloud.async_get_devices()) == 2
+    await hass.async_block_till_done()
+    saved = hass_storage[key]["data"]["update_time"]
+
+    assert len(await cloud.async_get_devices(renew=True)) == 2
+    await hass.async_block_till_done()
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=cloud.devices_save_delay + 1))
+    await hass.async_block_till_done()
+    assert hass_storage[key]["data"]["update_time"] > saved
+    assert cloud.get_all_devices.await_count == 2
+
+    # not renewed again after a restart
+    cloud = _cloud(hass, devices)
+    assert len(await cloud.async_get_devices()) == 2
+    assert cloud.get_all_devices.await_count == 0
+
+    devices[0]["name"] = "Renamed"
+    await cloud.async_get_devices(renew=True)
+    await hass.async_block_till_done()
+    assert hass_storage[key]["data"]["devices"][0]["name"] == "Renamed"
+
+
+async def test_cached_list_is_loaded_once(hass):
+    cloud = _cloud(hass, [_dev("1")])
+    await cloud.async_get_devices()
+    await cloud.async_get_devices()
+    await cloud.async_get_devices_by_key("did")
+    assert cloud.get_all_devices.await_count == 1
+
+
+async def test_changes_are_dispatched(hass):
+    devices = [_dev("1"), _dev("2")]
+    cloud = _cloud(hass, devices)
+    diffs = []
+    async_dispatcher_connect(hass, SIGNAL_DEVICES_CHANGED.format("100"), diffs.append)
+
+    await cloud.async_get_devices()
+    devices[1]["token"] = "ff" * 16
+    devices.append(_dev("3"))
+    await cloud.async_get_devices(renew=True)
+    await hass.async_block_till_done()
+
+    assert len(diffs) == 1
+    assert list(diffs[0].added) == ["3"]
+    assert diffs[0].changed["2"][1] == {"token"}
+
+
+async def test_device_list_is_fetched_once_without_homes(hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.get_device_list = AsyncMock(return_value=[_dev("1")])
+    assert await cloud.get_all_devices(None) == [_dev("1")]
+    assert cloud.get_device_list.await_count == 1
+
+
+async def test_homes_are_merged_in_order(hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.get_device_list = AsyncMock(return_value=[_dev("1")])
+
+    async def pages(home, semaphore=None):
+        return [{"did": "1", "home": home["id"]}, {"did": str(home["id"] + 10)}]
+
+    cloud.get_home_device_pages = pages
+    devices = await cloud.get_all_devices([{"id": 1}, {"id": 2}])
+    assert [d["did"] for d in devices] == ["1", "11", "12"]
+    assert devices[0]["home"] == 2
+
+
+async def test_homes_are_paged_concurrently_in_order(hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    cloud.homes_concurrency = 2
+    cloud.get_device_list = AsyncMock(return_value=[])
+    active = []
+    peak = []
+    calls = []
+
+    async def page(uid, hid, start_did=""):
+        calls.append((hid, start_did))
+        active.append(hid)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(hid)
+        more = start_did == ""
+        return {"result": {
+            "device_info": [{"did": f"{hid}{start_did or 'a'}"}],
+            "max_did": "b" if more else "",
+            "has_more": more,
+        }}
+
+    cloud.get_home_device_page = page
+    devices = await cloud.get_all_devices([{"id": 1}, {"id": 2}, {"id": 3}])
+
+    assert max(peak) == 2
+    assert [c for c in calls if c[0] == 3] == [(3, ""), (3, "b")]
+    assert [d["did"] for d in devices] == ["1a", "1b", "2a", "2b", "3a", "3b"]
+
+
+async def test_device_list_is_fetched_alongside_homes(hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    events = []
+
+    async def device_list():
+        events.append("list start")
+        await asyncio.sleep(0.05)
+        events.append("list done")
+        return [_dev("1")]
+
+    async def home_devices():
+        events.append("homes start")
+        await asyncio.sleep(0.01)
+        events.append("homes done")
+        return {"homelist": [{"id": 1}]}
+
+    async def pages(home, semaphore=None):
+        events.append("pages")
+        return [_dev("2")]
+
+    cloud.get_device_list = device_list
+    cloud.get_home_devices = home_devices
+    cloud.get_home_device_pages = pages
+    hls, devices = await cloud.async_fetch_devices()
+
+    assert events.index("list start") < events.index("homes done")
+    assert events.index("pages") < events.index("list done")
+    assert [d["did"] for d in devices] == ["1", "2"]
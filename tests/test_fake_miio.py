@@ -0,0 +1,77 @@
+"""Tests for the simulated miIO devices used by the LAN benchmarks."""
+import asyncio
+
+import pytest
+
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO, MiIOMultiplexer
+
+from .fake_miio import PROPERTY_NOT_WRITABLE, load_spec, start_fake_devices
+
+
+@pytest.fixture
+async def fake_devices(socket_enabled):
+    devices = []
+
+    async def _start(count: int = 1, **kwargs):
+        devices.extend(await start_fake_devices(load_spec(), count, **kwargs))
+        return devices[-count:]
+
+    yield _start
+    for device in devices:
+        device.close()
+    mux = MiIOMultiplexer.instances.get(asyncio.get_running_loop())
+    if mux and mux.transport:
+        mux.transport.close()
+
+
+def _client(device, timeout: float = 0.5) -> AsyncMiIO:
+    return AsyncMiIO("127.0.0.1", device.token, timeout=timeout, port=device.port)
+
+
+async def test_get_and_set_properties(fake_devices):
+    (device,) = await fake_devices()
+    miio = _client(device)
+
+    resp = await miio.send("set_properties", [{"did": "1", "siid": 2, "piid": 1, "value": True}])
+    assert resp["result"] == [{"did": "1", "siid": 2, "piid": 1, "code": 0}]
+    resp = await miio.send("get_properties", [{"did": "1", "siid": 2, "piid": 1}])
+    assert resp["result"][0]["value"] is True
+    resp = await miio.send("set_properties", [{"did": "1", "siid": 3, "piid": 1, "value": 20}])
+    assert resp["result"][0]["code"] == PROPERTY_NOT_WRITABLE
+
+
+async def test_info_and_unknown_action(fake_devices):
+    (device,) = await fake_devices()
+    miio = _client(device)
+
+    assert (await miio.info())["model"] == "fake.miio.v1"
+    resp = await miio.send("action", {"did": "1", "siid": 99, "aiid": 1, "in": []})
+    assert resp["result"]["code"] != 0
+
+
+async def test_devices_have_own_tokens(fake_devices):
+    devices = await fake_devices(3)
+    results = await asyncio.gather(*[_client(d).info() for d in devices])
+
+    assert len({d.token for d in devices}) == 3
+    assert all(res["model"] == "fake.miio.v1" for res in results)
+
+
+async def test_loss_and_reply_limit(fake_devices):
+    (lossy,) = await fake_devices(loss=1)
+    (small,) = await fake_devices(reply_limit=64)
+
+    assert await _client(lossy, 0.2).send("miIO.info", tries=1) == {}
+    assert lossy.stats["lost"] == 1
+    assert await _client(small, 0.2).send("miIO.info", tries=1) == {}
+    assert small.stats["oversize"] == 1
+
+
+async def test_latency(fake_devices):
+    (device,) = await fake_devices(latency=0.1)
+    miio = _client(device, timeout=1)
+    await miio.info()
+    started = asyncio.get_running_loop().time()
+    await miio.info()
+
+    assert asyncio.get_running_loop().time() - started >= 0.1
@@ -172,6 +172,20 @@ async def test_async_unload_clears_clouds_map(entry, hass):
     assert entry.clouds == {}
 
 
+async def test_async_unload_closes_cloud_sessions(entry, hass):
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    session = cloud.http_session()
+    entry.clouds[CloudSid.XIAOMIIO] = cloud
+    entry.clouds[CloudSid.MICOAPI] = None
+
+    with patch.object(
+        hass.config_entries, "async_forward_entry_unload", AsyncMock(return_value=True),
+    ):
+        assert await entry.async_unload()
+    assert entry.clouds == {}
+    assert session.closed
+
+
 async def test_auth_failed_xiaomiio_loaded_starts_reauth(entry, hass):
     captured = {}
 
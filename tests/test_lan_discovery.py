@@ -0,0 +1,59 @@
+"""Tests for the LAN discovery of miIO devices."""
+import asyncio
+
+import pytest
+
+from custom_components.xiaomi_miot.core.device import MiotDevice
+from custom_components.xiaomi_miot.core.lan_discovery import LanDiscovery
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO, MiIOMultiplexer
+
+from .fake_miio import load_spec, start_fake_devices
+
+
+@pytest.fixture
+async def fake_devices(socket_enabled):
+    devices = []
+
+    async def _start(count: int = 1, **kwargs):
+        devices.extend(await start_fake_devices(load_spec(), count, **kwargs))
+        return devices[-count:]
+
+    yield _start
+    for device in devices:
+        device.close()
+    mux = MiIOMultiplexer.instances.get(asyncio.get_running_loop())
+    if mux and mux.transport:
+        mux.transport.close()
+
+
+async def test_discover_collects_answers(fake_devices):
+    (device,) = await fake_devices()
+    mux = await MiIOMultiplexer.async_get()
+    found = await mux.discover(["127.0.0.1"], timeout=0.2, port=device.port)
+
+    assert list(found) == [device.did]
+    assert found[device.did][0] == ("127.0.0.1", device.port)
+    assert not mux.sweeps
+    assert mux.stats["dropped"] == 0
+
+
+async def test_sweep_moves_device_and_seeds_handshake(hass, fake_devices, monkeypatch):
+    (device,) = await fake_devices()
+    miio = AsyncMiIO("127.0.0.2", device.token, timeout=0.5, port=device.port)
+    discovery = LanDiscovery.get(hass)
+    discovery.timeout = 0.2
+    discovery.port = device.port
+
+    async def broadcast_addresses():
+        return ["127.0.0.1"]
+
+    monkeypatch.setattr(discovery, "async_broadcast_addresses", broadcast_addresses)
+    await discovery.async_add(str(device.did), MiotDevice(hass, miio))
+
+    assert miio.addr == ("127.0.0.1", device.port)
+    assert miio.device_id == device.did
+    assert miio.has_session()
+    assert (await miio.info())["model"] == "fake.miio.v1"
+    assert device.stats["requests"] == 1  # no ping before miIO.info
+    discovery.remove(str(device.did), discovery.devices[device.did])
+    assert not discovery.devices
@@ -0,0 +1,39 @@
+"""Tests for the LAN circuit breaker of devices."""
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from custom_components.xiaomi_miot.core.device import Device
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO, MiIOMultiplexer
+from custom_components.xiaomi_miot.core.utils import CircuitBreaker
+
+from .test_mini_miio import TOKEN, _FakeDevice
+
+
+async def test_breaker_closes_after_device_moved(socket_enabled):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _FakeDevice(1234567), local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    miio = AsyncMiIO("192.0.2.1", TOKEN, timeout=0.2, port=port)
+    device = SimpleNamespace(
+        local=SimpleNamespace(miio=miio),
+        local_breaker=CircuitBreaker(threshold=1, backoff=0),
+        log=logging.getLogger(__name__),
+    )
+    try:
+        await miio.connect()
+        device.local_breaker.failure()
+        assert device.local_breaker.state == CircuitBreaker.HALF_OPEN
+
+        # the new address of the device, from discovery or the cloud
+        miio.move("127.0.0.1")
+        assert await Device.async_check_local(device)
+        # not opened again for longer
+        assert device.local_breaker.open_for == 0
+    finally:
+        transport.close()
+        mux = MiIOMultiplexer.instances.get(loop)
+        if mux and mux.transport:
+            mux.transport.close()
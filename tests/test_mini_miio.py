@@ -0,0 +1,335 @@
+"""Tests for the asyncio miIO client."""
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+from custom_components.xiaomi_miot.core.mini_miio import (
+    HELLO,
+    AsyncMiIO,
+    MiIOMultiplexer,
+)
+
+TOKEN = "00112233445566778899aabbccddeeff"
+
+
+def _packet(codec: AsyncMiIO, payload: dict, device_id: int) -> bytes:
+    data = codec._encrypt(json.dumps(payload).encode())
+    return (
+        b"\x21\x31"
+        + (32 + len(data)).to_bytes(2, "big")
+        + bytes(4)
+        + device_id.to_bytes(4, "big")
+        + bytes(20)
+        + data
+    )
+
+
+class _FakeDevice(asyncio.DatagramProtocol):
+    """Answers like a device, optionally with some answers of other requests,
+    or holding requests until some of them arrived and answering in reverse,
+    or answering after a delay.
+    """
+
+    transport = None
+
+    def __init__(self, device_id: int, before=None, silent=0, hold=0, delay=0):
+        self.device_id = device_id
+        self.codec = AsyncMiIO("127.0.0.1", TOKEN)
+        self.before = before or []
+        self.silent = silent
+        self.hold = hold
+        self.delay = delay
+        self.delayed = []
+        self.held = []
+        self.received = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, raw: bytes, addr):
+        self.received.append(raw)
+        if raw == HELLO:
+            hello = bytearray(HELLO)
+            hello[8:12] = self.device_id.to_bytes(4, "big")
+            hello[12:16] = (1234).to_bytes(4, "big")
+            self.transport.sendto(bytes(hello), addr)
+            return
+        if self.silent > 0:
+            self.silent -= 1
+            return
+        req = json.loads(self.codec._unpack_raw(raw).rstrip(b"\x00"))
+        for payload in self.before:
+            self.transport.sendto(_packet(self.codec, payload, self.device_id), addr)
+        if req["method"] == "get_properties":
+            result = {"id": req["id"], "result": req["params"]}
+        else:
+            result = {"id": req["id"], "result": [self.device_id, req["method"]]}
+        if self.hold:
+            self.held.append(result)
+            if len(self.held) < self.hold:
+                return
+            self.hold = 0
+        for result in reversed(self.held or [result]):
+            packet = _packet(self.codec, result, self.device_id)
+            if self.delay:
+                self.delayed.append(asyncio.get_running_loop().call_later(
+                    self.delay, self.transport.sendto, packet, addr
+                ))
+            else:
+                self.transport.sendto(packet, addr)
+        self.held = []
+
+
+@pytest.fixture
+async def fake_device(socket_enabled):
+    transports = []
+
+    async def _start(device_id: int = 1234567, timeout: float = 0.5, **kwargs):
+        loop = asyncio.get_running_loop()
+        transport, device = await loop.create_datagram_endpoint(
+            lambda: _FakeDevice(device_id, **kwargs), local_addr=("127.0.0.1", 0)
+        )
+        transports.append((transport, device))
+        port = transport.get_extra_info("sockname")[1]
+        return device, AsyncMiIO("127.0.0.1", TOKEN, timeout=timeout, port=port)
+
+    yield _start
+    for transport, device in transports:
+        for handle in device.delayed:
+            handle.cancel()
+        transport.close()
+    mux = MiIOMultiplexer.instances.get(asyncio.get_running_loop())
+    if mux and mux.transport:
+        mux.transport.close()
+
+
+async def test_send_shares_endpoint(fake_device):
+    device, miio = await fake_device()
+    first = await miio.send("get_properties", [{"siid": 2, "piid": 1}])
+    second = await miio.send("miIO.info")
+
+    assert first["result"] == [{"siid": 2, "piid": 1}]
+    assert second["result"] == [1234567, "miIO.info"]
+    assert device.received.count(HELLO) == 1
+    assert miio.device_id == 1234567
+    assert not miio.pending
+    assert miio.mux.stats["requests"] == 2
+    miio.close()
+    assert not miio.mux and not miio.remote
+
+
+async def test_send_drops_answers_with_unknown_id(fake_device):
+    device, miio = await fake_device(before=[{"id": 1, "result": "late"}])
+    resp = await miio.send("miIO.info", tries=1)
+
+    assert resp["result"] == [1234567, "miIO.info"]
+    assert len(device.received) == 2  # HELLO and the request, no retries
+    assert miio.mux.stats["dropped"] == 1
+
+
+async def test_send_dispatches_by_address(fake_device):
+    _, miio1 = await fake_device(1001)
+    _, miio2 = await fake_device(1002)
+    resp1, resp2 = await asyncio.gather(
+        miio1.send("miIO.info"),
+        miio2.send("miIO.info"),
+    )
+
+    assert resp1["result"] == [1001, "miIO.info"]
+    assert resp2["result"] == [1002, "miIO.info"]
+    assert miio1.mux is miio2.mux
+    assert len(miio1.mux.clients) == 2
+
+
+async def test_send_registers_again_after_socket_lost(fake_device):
+    _, miio = await fake_device()
+    mux = await miio.connect()
+    fut = asyncio.get_running_loop().create_future()
+    miio.pending[1] = fut
+
+    mux.transport.close()
+    await asyncio.sleep(0)
+
+    assert isinstance(fut.exception(), OSError)
+    assert miio.mux is None
+    resp = await miio.send("miIO.info")
+    assert resp["result"] == [1234567, "miIO.info"]
+    assert miio.mux is not mux
+
+
+async def test_ping_registers_again_after_move(fake_device):
+    _, miio = await fake_device()
+    assert await miio.ping()
+
+    miio.move("localhost")
+    assert miio.mux is None
+    assert await miio.ping()
+    miio.close()
+    assert await miio.ping()
+
+
+async def test_timeout_keeps_handshake(fake_device):
+    device, miio = await fake_device(silent=1, timeout=0.2)
+    resp = await miio.send("miIO.info", tries=2)
+
+    assert resp["result"] == [1234567, "miIO.info"]
+    assert device.received.count(HELLO) == 1
+    assert miio.stats["handshake_misses"] == 1
+    assert miio.stats["handshake_hits"] == 1
+    assert miio.stats["handshake_resets"] == 0
+
+
+async def test_no_answer_keeps_handshake(fake_device):
+    device, miio = await fake_device(timeout=0.2)
+    await miio.send("miIO.info")
+    device.silent = 2
+    assert await miio.send("miIO.info", tries=2) == {}
+    resp = await miio.send("miIO.info")
+
+    assert resp["result"] == [1234567, "miIO.info"]
+    assert device.received.count(HELLO) == 1
+    assert miio.stats["handshake_resets"] == 0
+
+
+async def test_device_id_mismatch_resets_handshake(fake_device):
+    device, miio = await fake_device(timeout=0.2)
+    await miio.send("miIO.info")
+    device.device_id = 7654321
+    resp = await miio.send("miIO.info", tries=2)
+
+    assert resp["result"] == [7654321, "miIO.info"]
+    assert miio.device_id == 7654321
+    assert miio.stats["handshake_resets"] == 1
+    assert device.received.count(HELLO) == 2
+
+
+async def test_handshake_refreshed_in_background(fake_device):
+    device, miio = await fake_device()
+    await miio.send("miIO.info")
+    miio.session_time -= miio.session_ttl * 0.9
+    await miio.send("miIO.info")
+    assert miio.refresh_task
+    assert await miio.refresh_task
+
+    assert device.received.count(HELLO) == 2
+    assert miio.session_age < 1
+    assert miio.stats["handshake_hits"] == 1
+
+
+async def test_send_chunks_in_window(fake_device):
+    device, miio = await fake_device(hold=3)
+    params = [{"siid": 2, "piid": i} for i in range(10)]
+    result = await miio.send_bulk("get_properties", params, chunk=3, window=3)
+
+    assert result == params
+    assert device.received.count(HELLO) == 1
+    assert len(device.received) == 5
+
+
+async def test_send_chunks_stops_after_failed_chunk(fake_device):
+    device, miio = await fake_device(timeout=0.2)
+    await miio.send("miIO.info")
+    device.silent = 3
+    params = [{"siid": 2, "piid": i} for i in range(10)]
+    answers = await miio.send_chunks("get_properties", params, 3)
+
+    assert answers == [{}]
+    assert len(device.received) == 5  # HELLO, miIO.info and 3 tries
+
+
+def test_rto_follows_rtt():
+    miio = AsyncMiIO("127.0.0.1", TOKEN)
+    assert miio.rto == 3
+
+    for _ in range(20):
+        miio.add_rtt(0.05)
+    assert miio.rto == miio.min_rto
+
+    miio.add_timeout()
+    assert miio.rto == miio.min_rto * 2
+    for _ in range(5):
+        miio.add_timeout()
+    assert miio.rto == 3
+
+    miio.add_rtt(0.05)
+    assert miio.rto == miio.min_rto
+
+
+def test_writes_wait_for_full_timeout():
+    miio = AsyncMiIO("127.0.0.1", TOKEN, timeout=5)
+    for _ in range(20):
+        miio.add_rtt(0.05)
+
+    assert miio.attempt_timeout("get_properties") == miio.min_rto
+    assert miio.attempt_timeout("miIO.info") == miio.min_rto
+    assert miio.attempt_timeout("set_properties") == 5
+    assert miio.attempt_timeout("action") == 5
+
+
+async def test_late_answer_to_earlier_attempt(fake_device):
+    device, miio = await fake_device(timeout=0.2, delay=0.3)
+    resp = await miio.send("miIO.info", tries=2)
+
+    assert resp["result"] == [1234567, "miIO.info"]
+    assert len(device.received) == 3  # HELLO and 2 tries
+    assert not miio.pending
+    # the answer can't be matched with the retry, not measured
+    assert miio.srtt is None
+
+
+async def test_send_adapts_timeout(fake_device):
+    _, miio = await fake_device(timeout=2)
+    await miio.send("miIO.info")
+    await miio.send("miIO.info")
+
+    assert miio.srtt < 0.5
+    assert miio.rto < 2
+    assert miio.loss_rate == 0
+
+
+async def test_retries_limited_by_budget(fake_device):
+    device, miio = await fake_device(silent=3, timeout=0.2)
+    await miio.connect()
+    miio.mux.budget.balance = 1
+    resp = await miio.send("miIO.info", tries=3)
+
+    assert resp == {}
+    assert len(device.received) == 3  # HELLO and 2 tries
+    assert miio.mux.stats["retries"] == 1
+    assert miio.mux.stats["retries_denied"] == 1
+    assert miio.loss_rate == 1
+
+@pytest.mark.parametrize("size", [0, 1, 15, 16, 17, 300])
+def test_codec_roundtrip(size):
+    codec = AsyncMiIO("127.0.0.1", TOKEN)
+    plaintext = bytes(range(256)) * 2
+    plaintext = plaintext[:size]
+
+    assert len(codec._encrypt(plaintext)) == (size // 16 + 1) * 16
+    assert codec._decrypt(codec._encrypt(plaintext)) == plaintext
+
+
+def test_codec_packet_layout():
+    codec = AsyncMiIO("127.0.0.1", TOKEN)
+    codec.device_id = 1234567
+    codec.delta_ts = 0
+    raw = codec._pack_raw(5, "miIO.info")
+    payload = b'{"id":5,"method":"miIO.info","params":[]}\x00'
+    data = codec._encrypt(payload)
+
+    assert len(raw) == 32 + len(data)
+    assert codec._parse_header(raw)[:2] == (len(raw), 1234567)
+    assert raw[32:] == data
+    assert raw[16:32] == hashlib.md5(raw[:16] + codec.token + data).digest()
+    assert codec._unpack_raw(raw) == payload
+
+
+def test_codec_rejects_bad_padding():
+    codec = AsyncMiIO("127.0.0.1", TOKEN)
+    encryptor = codec.cipher.encryptor()
+    data = encryptor.update(bytes(16)) + encryptor.finalize()
+
+    with pytest.raises(ValueError):
+        codec._decrypt(data)
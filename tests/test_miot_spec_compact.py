@@ -0,0 +1,49 @@
+"""Tests for the compact representation of miot spec instances."""
+SPEC = "cnhdm.airrtc.wkq01.json"
+
+
+def test_instances_have_no_dict(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    srv = spec.get_service("thermostat")
+    prop = srv.get_property("on")
+
+    for ins in (srv, prop):
+        assert not hasattr(ins, "__dict__")
+    assert prop.readable and prop.writeable
+    assert prop.access == ("read", "write", "notify")
+    assert srv.get_property("target_temperature").range_max() is not None
+
+
+def test_equal_values_are_shared(load_miot_spec):
+    one = load_miot_spec(SPEC).get_property("on")
+    two = load_miot_spec(SPEC).get_property("on")
+
+    assert one is not two
+    assert one.access is two.access
+    assert one.full_name is two.full_name
+    for a, b in zip(load_miot_spec(SPEC).get_properties(), load_miot_spec(SPEC).get_properties()):
+        assert a.value_list is b.value_list
+        assert a.value_range is b.value_range
+
+
+def test_extend_keeps_parsed_fields(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    prop = spec.get_property("prop.2.3")
+    spec.extend_specs(services=[{"iid": 2, "properties": [{"iid": 3, "description": "Power"}]}])
+
+    extended = spec.get_property("prop.2.3")
+    assert extended is not prop
+    assert extended.description == "Power"
+    assert (extended.type, extended.format, extended.access) == (prop.type, prop.format, prop.access)
+    assert extended.raw["value-range"] == list(prop.value_range)
+
+
+def test_extend_keeps_unparsed_keys(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    assert spec.get_property("prop.2.3")._extra is None
+    spec.extend_specs(services=[{"iid": 2, "properties": [{"iid": 3, "gatt-access": ["read"]}]}])
+    spec.extend_specs(services=[{"iid": 2, "properties": [{"iid": 3, "description": "Power"}]}])
+
+    raw = spec.get_property("prop.2.3").raw
+    assert raw["gatt-access"] == ["read"]
+    assert raw["description"] == "Power"
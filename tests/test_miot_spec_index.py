@@ -0,0 +1,49 @@
+"""Tests for the name index of miot specs."""
+from custom_components.xiaomi_miot.core import utils
+
+SPEC = "cnhdm.airrtc.wkq01.json"
+
+
+def test_exact_names_are_indexed(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    srv = spec.get_service("thermostat")
+
+    assert srv.iid == 2
+    assert spec.get_service("physical_control_locked").iid == 5
+    assert [p.iid for p in srv.properties_index["on"]] == [3, 9, 10]
+    assert srv.get_property("on").iid == 3
+    assert srv.get_property("prop.2.9").iid == 9
+    assert srv.get_property("thermostat-2.fan_level").iid == 7
+    assert spec.get_property("environment.temperature").siid == 3
+    assert spec.get_property("missing") is None
+
+
+def test_globs_and_formats(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    srv = spec.get_service("thermostat")
+
+    assert srv.get_property("target_*", exclude_format=["uint32"]).iid == 8
+    assert srv.get_property("mode", "on", only_format=["bool"]).iid == 3
+    assert [p.iid for p in srv.get_properties("fan_level", "prop.2.1")] == [1, 2, 7]
+    assert [s.iid for s in spec.get_services("*", excludes=["function"])] == [2, 3, 5]
+
+
+def test_custom_mapping_names(load_miot_spec):
+    spec = load_miot_spec(SPEC)
+    srv = spec.get_service("thermostat")
+    assert srv.get_property("floor_heating") is None
+
+    spec.set_custom_mapping({"floor_heating": {"siid": 2, "piid": 9}})
+    assert srv.get_property("floor_heating").iid == 9
+    assert spec.get_property("floor_heating").in_list(["floor_*"])
+
+
+def test_glob_patterns_are_compiled_once():
+    utils.split_globs.cache_clear()
+    for _ in range(3):
+        assert utils.match_globs({"fan.on"}, ["fan.*", "light.on"])
+        assert not utils.match_globs({"fan.mode"}, ["light.*", "on"])
+    assert utils.split_globs.cache_info().misses == 2
+    assert utils.split_globs(("on", "fan.*"))[0] == {"on"}
+    assert utils.convert_globs_to_pattern(["on", "fan.*"]).match("fan.mode")
+    assert not utils.match_globs({"on"}, [])
@@ -0,0 +1,85 @@
+"""Tests for the catalog of spec types by model."""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.xiaomi_miot.core.miot_spec import MiotSpec
+from custom_components.xiaomi_miot.core.model_catalog import ModelCatalog, compact_instances
+
+INSTANCES = {"instances": [
+    {"model": "a.plug.v1", "type": "urn:a:1", "status": "released", "version": 1},
+    {"model": "a.plug.v1", "type": "urn:a:2", "status": "debug", "version": 2},
+    {"model": "b.light.v1", "type": "urn:b:1", "status": "released", "version": 1},
+    {"model": "b.light.v1", "type": "urn:b:2", "status": "released", "version": 2},
+    {"model": "b.light.v1", "type": "urn:b:0", "status": "released", "version": 0},
+]}
+
+
+def _patch_download(calls, result=INSTANCES):
+    async def download(hass, path, tries=1, timeout=30):
+        calls.append(path)
+        await asyncio.sleep(0.01)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return patch.object(MiotSpec, "async_download_miot_spec", side_effect=download)
+
+
+def test_compact_instances():
+    assert compact_instances(INSTANCES["instances"]) == {
+        "a.plug.v1": "urn:a:1",
+        "b.light.v1": "urn:b:2",
+    }
+
+
+async def test_downloaded_once_for_all_devices(hass, hass_storage):
+    calls = []
+    with _patch_download(calls):
+        types = await asyncio.gather(*[
+            MiotSpec.async_get_model_type(hass, model)
+            for model in ["a.plug.v1", "b.light.v1", "c.unknown"] * 10
+        ])
+        assert await MiotSpec.async_get_model_type(hass, "a.plug.v1") == "urn:a:1"
+
+    assert len(calls) == 1
+    assert types[:3] == ["urn:a:1", "urn:b:2", None]
+    await hass.async_block_till_done()
+    assert hass_storage["xiaomi_miot/model_types.json"]["data"]["types"]["b.light.v1"] == "urn:b:2"
+
+
+async def test_legacy_instances_are_compacted(hass, hass_storage):
+    hass_storage["xiaomi_miot/instances.json"] = {
+        "version": 1,
+        "key": "xiaomi_miot/instances.json",
+        "data": {
+            "_updated_time": 2000000000,
+            "a.plug.v1": {"type": "urn:a:1", "status": "released", "version": 1},
+        },
+    }
+    calls = []
+    with _patch_download(calls):
+        assert await MiotSpec.async_get_model_type(hass, "a.plug.v1") == "urn:a:1"
+
+    assert calls == []
+    await hass.async_block_till_done()
+    assert "xiaomi_miot/instances.json" not in hass_storage
+    assert hass_storage["xiaomi_miot/model_types.json"]["data"]["types"] == {"a.plug.v1": "urn:a:1"}
+
+
+async def test_stale_catalog_is_used_when_download_fails(hass):
+    catalog = ModelCatalog.get(hass)
+    with _patch_download([]):
+        await catalog.async_get_type("a.plug.v1")
+
+    calls = []
+    catalog.updated_time = catalog.tried_time = 0
+    with _patch_download(calls, UserWarning("offline")):
+        assert await catalog.async_get_type("a.plug.v1") == "urn:a:1"
+        assert await catalog.async_get_type("a.plug.v1") == "urn:a:1"
+    assert len(calls) == 1
+
+    catalog.types = {}
+    with _patch_download([], UserWarning("offline")), pytest.raises(UserWarning):
+        await catalog.async_get_type("a.plug.v1")
@@ -0,0 +1,61 @@
+"""Tests for the rate limiter of cloud requests."""
+import asyncio
+
+from custom_components.xiaomi_miot.core.rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_POLL,
+    PRIORITY_WRITE,
+    RateLimiter,
+)
+
+
+async def test_burst_passes_without_waiting():
+    limiter = RateLimiter(rate=10, burst=3)
+    for _ in range(3):
+        await asyncio.wait_for(limiter.acquire(), 0.01)
+    assert limiter.stats["waited"] == 0
+
+
+async def test_waiters_are_released_by_priority():
+    limiter = RateLimiter(rate=100, burst=1)
+    await limiter.acquire()
+    order = []
+
+    async def request(name, priority):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    await asyncio.gather(
+        request("history", PRIORITY_BACKGROUND),
+        request("poll", PRIORITY_POLL),
+        request("write", PRIORITY_WRITE),
+    )
+    assert order == ["write", "poll", "history"]
+
+
+async def test_cancelled_waiter_does_not_take_a_token():
+    limiter = RateLimiter(rate=50, burst=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire(PRIORITY_WRITE))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.wait_for(limiter.acquire(PRIORITY_BACKGROUND), 0.5)
+    assert limiter.waiting == 0
+
+
+def test_rate_backs_off_and_recovers():
+    limiter = RateLimiter(rate=8, burst=8)
+    limiter.record(False)
+    assert limiter.rate == 4
+    # within the cooldown
+    limiter.record(False)
+    assert limiter.rate == 4
+
+    limiter.decreased -= limiter.cooldown
+    limiter.record(True, latency=limiter.slow + 1)
+    assert limiter.rate == 2
+    assert limiter.stats["backoffs"] == 2
+
+    for _ in range(40):
+        limiter.record(True, latency=0.1)
+    assert limiter.rate == 8
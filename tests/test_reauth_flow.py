@@ -1,8 +1,10 @@
 """Tests for XiaomiMiotFlowHandler reauth scaffolding."""
+import asyncio
 import inspect
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import aiohttp
 import pytest
 
 from custom_components.xiaomi_miot.config_flow import XiaomiMiotFlowHandler
@@ -84,6 +86,32 @@ async def test_async_remove_clears_candidate(flow_cls):
     assert flow._candidate is None
 
 
+@pytest.mark.parametrize("exc", [aiohttp.ClientConnectionError("down"), asyncio.TimeoutError()])
+async def test_check_account_unreachable(flow_cls, hass, exc):
+    flow = flow_cls()
+    flow.hass = hass
+    flow.context = {}
+    cloud = SimpleNamespace(username="u", attrs={}, async_get_devices=AsyncMock(side_effect=exc))
+    errors = {}
+    with patch.object(flow_cls, "get_cloud", AsyncMock(return_value=cloud)):
+        await flow.check_xiaomi_account({"username": "u"}, errors)
+    assert errors == {"base": "cannot_reach"}
+
+
+async def test_async_remove_closes_flow_clouds(flow_cls, hass):
+    flow = flow_cls()
+    flow.hass = hass
+    flow.context = {}
+    candidate = flow._make_candidate("u", "p", "cn", CloudSid.XIAOMIIO)
+    session = candidate.http_session()
+    flow._candidate = None
+
+    with patch.object(flow_cls.__mro__[1], "async_remove", lambda self: None):
+        flow.async_remove()
+    await hass.async_block_till_done()
+    assert session.closed
+
+
 async def test_reauth_password_invalid_auth_returns_invalid_auth(flow_cls):
     flow = flow_cls()
     flow.hass = SimpleNamespace(data={"xiaomi_miot": {}})
@@ -0,0 +1,169 @@
+"""Tests for the scheduler of requests to a shared LAN endpoint."""
+import asyncio
+
+from custom_components.xiaomi_miot.core.device import MiotDevice
+from custom_components.xiaomi_miot.core.mini_miio import AsyncMiIO
+from custom_components.xiaomi_miot.core.scheduler import RequestScheduler, RequestSlots
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def blocker(self):
+        await self.release.wait()
+        return "blocker"
+
+    async def call(self, name):
+        self.calls.append(name)
+        return name
+
+    async def read_properties(self, params, max_properties=None, learn=False):
+        self.calls.append([p["did"] for p in params])
+        return [{**p, "code": 0, "value": p["piid"]} for p in params]
+
+
+async def test_writes_run_before_reads():
+    rec = _Recorder()
+    scheduler = RequestScheduler(rec.read_properties, limit=1)
+    blocker = asyncio.ensure_future(scheduler.run(rec.blocker))
+    await asyncio.sleep(0)
+    read = asyncio.ensure_future(scheduler.run(rec.call, "read", owner="1"))
+    write = asyncio.ensure_future(scheduler.run(rec.call, "write", write=True))
+    await asyncio.sleep(0)
+    rec.release.set()
+
+    assert await asyncio.gather(blocker, read, write) == ["blocker", "read", "write"]
+    assert rec.calls == ["write", "read"]
+    assert scheduler.stats["queued_max"] == 2
+
+
+async def test_reads_take_turns():
+    rec = _Recorder()
+    scheduler = RequestScheduler(rec.read_properties, limit=1)
+    blocker = asyncio.ensure_future(scheduler.run(rec.blocker))
+    await asyncio.sleep(0)
+    jobs = [
+        asyncio.ensure_future(scheduler.run(rec.call, name, owner=name[0]))
+        for name in ["a1", "a2", "a3", "b1"]
+    ]
+    await asyncio.sleep(0)
+    rec.release.set()
+    await asyncio.gather(blocker, *jobs)
+
+    assert rec.calls == ["a1", "b1", "a2", "a3"]
+
+
+async def test_reads_of_sub_devices_are_merged():
+    rec = _Recorder()
+    scheduler = RequestScheduler(rec.read_properties, limit=1)
+    blocker = asyncio.ensure_future(scheduler.run(rec.blocker))
+    await asyncio.sleep(0)
+    first = asyncio.ensure_future(scheduler.get_properties(
+        "1", [{"did": "1", "siid": 2, "piid": 1}, {"did": "1", "siid": 2, "piid": 2}],
+    ))
+    second = asyncio.ensure_future(scheduler.get_properties(
+        "2", [{"did": "2", "siid": 2, "piid": 1}],
+    ))
+    await asyncio.sleep(0)
+    rec.release.set()
+    _, res1, res2 = await asyncio.gather(blocker, first, second)
+
+    assert rec.calls == [["1", "1", "2"]]
+    assert [r["piid"] for r in res1] == [1, 2]
+    assert res2 == [{"did": "2", "siid": 2, "piid": 1, "code": 0, "value": 1}]
+    assert scheduler.stats["merged"] == 1
+
+
+async def test_limit_caps_jobs_in_flight():
+    running = []
+    peak = []
+
+    async def job():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+
+    scheduler = RequestScheduler(None, limit=2)
+    await asyncio.gather(*[scheduler.run(job, owner=i % 3) for i in range(9)])
+
+    assert max(peak) == 2
+    assert scheduler.active == 0
+
+
+async def test_limit_counts_pipelined_chunks(hass):
+    running = []
+    peak = []
+
+    async def send(method, params=None, tries=3):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return {"id": 1, "result": params}
+
+    miot = MiotDevice(hass, AsyncMiIO("127.0.0.1", "00" * 16))
+    miot.miio.send = send
+    miot.chunk_window = 3
+    params = [{"siid": 2, "piid": i} for i in range(10)]
+    results = await asyncio.gather(
+        miot.async_send_chunk("get_properties", params, 3),
+        miot.async_get_properties(params, max_properties=2),
+        miot.async_send("set_properties", [{"siid": 2, "piid": 1, "value": True}]),
+    )
+
+    assert results[0] == results[1] == params
+    # the window is reached
+    assert max(peak) == miot.scheduler.limit == 3
+
+
+async def test_writes_take_slots_before_chunks(hass):
+    sent = []
+    release = asyncio.Event()
+
+    async def send(method, params=None, tries=3):
+        sent.append(method)
+        await release.wait()
+        return {"id": 1, "result": params}
+
+    miot = MiotDevice(hass, AsyncMiIO("127.0.0.1", "00" * 16))
+    miot.miio.send = send
+    miot.chunk_window = 2
+    params = [{"siid": 2, "piid": i} for i in range(4)]
+    reads = [
+        asyncio.ensure_future(miot.async_send_chunk("get_properties", params, 1))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0.01)
+    write = asyncio.ensure_future(miot.async_send("set_properties", [{"siid": 2, "piid": 1, "value": 1}]))
+    await asyncio.sleep(0.01)
+    assert sent == ["get_properties"] * 2
+    release.set()
+    await asyncio.gather(write, *reads)
+
+    assert sent[2] == "set_properties"
+
+
+async def test_cancelled_waiter_gives_slot_back():
+    slots = RequestSlots(1)
+    await slots.acquire()
+    waiter = asyncio.ensure_future(slots.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    slots.release()
+    await asyncio.sleep(0)
+
+    assert waiter.cancelled()
+    assert slots.used == 0
+    await slots.acquire(write=True)
+    assert slots.used == 1
+
+
+def test_default_window_sets_limit(hass):
+    miot = MiotDevice(hass, AsyncMiIO("127.0.0.1", "00" * 16))
+    assert miot.chunk_window == 3
+    assert miot.scheduler.limit == 3
+    miot.chunk_window = 1
+    assert miot.scheduler.limit == 1
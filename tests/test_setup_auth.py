@@ -10,6 +10,7 @@ from homeassistant.config_entries import ConfigEntryAuthFailed, ConfigEntryState
 from custom_components.xiaomi_miot import (
     CONF_XIAOMI_CLOUD,
     DOMAIN,
+    _setup_attempt_cleanup,
     async_setup_entry,
     init_integration_data,
 )
@@ -166,11 +167,22 @@ async def test_cleanup_only_runs_when_alias_matches(hass):
     hass.data[DOMAIN]["eid"] = {CONF_XIAOMI_CLOUD: fake_cloud_a}
     HassEntry.ALL["eid"] = hass_entry
 
-    from custom_components.xiaomi_miot import _setup_attempt_cleanup
     await _setup_attempt_cleanup(hass, "eid", hass_entry)
     # The aliased config stays since alias !== clouds[XIAOMIIO]
     assert CONF_XIAOMI_CLOUD in hass.data[DOMAIN]["eid"]
     # clouds was cleared anyway
     assert hass_entry.clouds == {}
     # HassEntry.ALL entry removed since the instance still matches
-    assert "eid" not in HassEntry.ALL
\ No newline at end of file
+    assert "eid" not in HassEntry.ALL
+
+
+async def test_cleanup_closes_cloud_sessions(hass):
+    init_integration_data(hass)
+    cloud = MiotCloud(hass, "u", "p", "cn", "xiaomiio")
+    session = cloud.http_session()
+    hass_entry = SimpleNamespace(id="eid", clouds={CloudSid.XIAOMIIO: cloud})
+    hass.data[DOMAIN]["eid"] = {CONF_XIAOMI_CLOUD: cloud}
+
+    await _setup_attempt_cleanup(hass, "eid", hass_entry)
+    assert "eid" not in hass.data[DOMAIN]
+    assert session.closed
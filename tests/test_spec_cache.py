@@ -0,0 +1,90 @@
+"""Tests for sharing miot specs between devices of the same type."""
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from custom_components.xiaomi_miot.core.device import Device, DeviceInfo
+from custom_components.xiaomi_miot.core.miot_spec import MiotSpec
+from custom_components.xiaomi_miot.core.spec_cache import SpecCache, spec_key
+
+FIXTURE = Path(__file__).parent / "fixtures" / "cnhdm.airrtc.wkq01.json"
+URN = "urn:miot-spec-v2:device:thermostat:0000A031:cnhdm-wkq01:1"
+EXTEND = [{"iid": 9, "type": "urn:miot-spec-v2:service:custom:00007801:cnhdm-wkq01:1", "properties": [
+    {"iid": 1, "type": "urn:miot-spec-v2:property:level:00000001:cnhdm-wkq01:1", "format": "uint8", "access": ["read"]},
+]}]
+
+
+def _patch_from_type(hass, calls):
+    async def from_type(_hass, urn, trans_options=False):
+        calls.append(urn)
+        await asyncio.sleep(0.01)
+        with FIXTURE.open(encoding="utf-8") as file:
+            return MiotSpec(hass, json.load(file), trans_options=trans_options)
+
+    return patch.object(MiotSpec, "async_from_type", side_effect=from_type)
+
+
+async def test_same_type_is_built_once(hass):
+    cache = SpecCache.get(hass)
+    calls = []
+    with _patch_from_type(hass, calls):
+        results = await asyncio.gather(*[
+            cache.async_acquire(f"device-{i}", URN)
+            for i in range(5)
+        ])
+        _, extended = await cache.async_acquire("device-x", URN, extend=EXTEND)
+
+    key, spec = results[0]
+    assert calls == [URN, URN]
+    assert all(s is spec for _, s in results)
+    assert cache.refs(key) == 5
+    assert extended is not spec
+    assert extended.get_service("custom") and not spec.get_service("custom")
+
+
+async def test_released_with_the_last_device(hass):
+    cache = SpecCache.get(hass)
+    with _patch_from_type(hass, []):
+        key, spec = await cache.async_acquire("a", URN)
+        await cache.async_acquire("b", URN)
+
+    assert cache.release(key, "a") is None
+    assert cache.release(key, "a") is None
+    assert cache.release(key, "b") is spec
+    assert key not in cache.specs
+    assert cache.release(key, "b") is None
+
+
+def test_key_of_customizations():
+    assert spec_key(URN) == spec_key(URN, trans_options=None, extend=[], mapping={})
+    assert spec_key(URN, mapping={"a": {"siid": 2, "piid": 1}}) != spec_key(URN)
+    assert spec_key(URN, trans_options=True) != spec_key(URN)
+
+
+async def test_devices_share_spec(hass):
+    entry = SimpleNamespace(
+        hass=hass,
+        cloud=None,
+        id="test-entry",
+        adders={},
+        get_config=lambda key=None, default=None: default,
+    )
+    devices = [
+        Device(DeviceInfo({"did": f"{i}", "mac": f"aa:bb:cc:dd:ee:0{i}", "model": "test.device.model", "urn": URN}), entry)
+        for i in range(2)
+    ]
+    calls = []
+    with _patch_from_type(hass, calls):
+        specs = [await d.get_spec() for d in devices]
+
+    assert calls == [URN]
+    assert specs[0] is specs[1]
+    assert devices[0].converters is not devices[1].converters
+
+    await devices[0].async_unload()
+    assert SpecCache.get(hass).refs(devices[1]._spec_key) == 1
+    key = devices[1]._spec_key
+    await devices[1].async_unload()
+    assert key not in SpecCache.get(hass).specs
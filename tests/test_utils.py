@@ -0,0 +1,245 @@
+"""Tests for the helpers in core.utils."""
+import asyncio
+
+import pytest
+
+from custom_components.xiaomi_miot.core import utils
+from custom_components.xiaomi_miot.core.utils import RC4, Batcher, CircuitBreaker, SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, backoff=60)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in == 60
+
+    clock[0] += 60
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_circuit_breaker_backs_off_on_failed_probe(clock):
+    breaker = CircuitBreaker(threshold=1, backoff=60, max_backoff=200)
+    breaker.failure()
+    for expected in (120, 200, 200):
+        clock[0] += breaker.open_for
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.open_for == expected
+
+
+def test_circuit_breaker_closes_on_success(clock):
+    breaker = CircuitBreaker(threshold=1)
+    breaker.failure()
+    clock[0] += breaker.open_for
+    breaker.success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.as_dict() == {"state": "closed", "failures": 0, "retry_in": 0}
+
+
+async def test_single_flight_shares_call():
+    calls = []
+    release = asyncio.Event()
+
+    async def fetch(value):
+        calls.append(value)
+        await release.wait()
+        return value
+
+    flights = SingleFlight()
+    first = asyncio.ensure_future(flights.run("key", fetch, 1))
+    second = asyncio.ensure_future(flights.run("key", fetch, 2))
+    other = asyncio.ensure_future(flights.run("other", fetch, 3))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(first, second, other) == [1, 1, 3]
+    assert calls == [1, 3]
+    assert flights.coalesced == 1
+    assert not flights.calls
+    assert await flights.run("key", fetch, 4) == 4
+
+
+async def test_single_flight_survives_cancelled_caller():
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "ok"
+
+    flights = SingleFlight()
+    first = asyncio.ensure_future(flights.run("key", fetch))
+    second = asyncio.ensure_future(flights.run("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "ok"
+
+
+async def test_batcher_merges_writes():
+    calls = []
+
+    async def set_properties(params):
+        calls.append(params)
+        return [{"siid": p["siid"], "piid": p["piid"], "code": 0} for p in params]
+
+    batcher = Batcher(set_properties, 0.01, key=lambda p: (p["siid"], p["piid"]))
+    results = await asyncio.gather(
+        batcher.submit([{"siid": 2, "piid": 1, "value": True}]),
+        batcher.submit([{"siid": 2, "piid": 2, "value": 50}]),
+        batcher.submit([{"siid": 2, "piid": 2, "value": 80}]),
+    )
+
+    assert calls == [[{"siid": 2, "piid": 1, "value": True}, {"siid": 2, "piid": 2, "value": 80}]]
+    assert results[0] == [{"siid": 2, "piid": 1, "code": 0}]
+    assert results[1] == results[2] == [{"siid": 2, "piid": 2, "code": 0}]
+    assert batcher.batches == 1
+    assert batcher.merged == 1
+
+
+async def test_batcher_raises_for_all_callers():
+    async def set_properties(params):
+        raise utils.DeviceException("offline")
+
+    batcher = Batcher(set_properties, 0, key=lambda p: p["piid"])
+    results = await asyncio.gather(
+        batcher.submit([{"piid": 1}]),
+        batcher.submit([{"piid": 2}]),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(res, utils.DeviceException) for res in results)
+
+
+async def test_batcher_keeps_task_in_flight():
+    release = asyncio.Event()
+
+    async def set_properties(params):
+        await release.wait()
+        return params
+
+    batcher = Batcher(set_properties, 0, key=lambda p: p["piid"])
+    waiter = asyncio.ensure_future(batcher.submit([{"piid": 1}]))
+    await asyncio.sleep(0.01)
+    assert len(batcher.tasks) == 1
+
+    release.set()
+    assert await waiter == [{"piid": 1}]
+    assert not batcher.tasks
+
+
+async def test_batcher_surfaces_bad_results():
+    async def set_properties(params):
+        return [{"code": 0}]
+
+    batcher = Batcher(set_properties, 0, key=lambda p: p["piid"])
+    with pytest.raises(KeyError):
+        await asyncio.wait_for(batcher.submit([{"piid": 1}]), 1)
+
+
+async def test_batcher_cancelled_batch_cancels_callers():
+    async def set_properties(params):
+        await asyncio.sleep(10)
+
+    batcher = Batcher(set_properties, 0, key=lambda p: p["piid"])
+    waiter = asyncio.ensure_future(batcher.submit([{"piid": 1}]))
+    await asyncio.sleep(0.01)
+    for task in batcher.tasks:
+        task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(waiter, 1)
+
+
+def legacy_rc4(key: bytes, data: bytes, drop: int = 1024) -> bytes:
+    ksa = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + ksa[i] + key[i % len(key)]) & 255
+        ksa[i], ksa[j] = ksa[j], ksa[i]
+    i = j = 0
+    out = []
+    for n, byt in enumerate(bytes(drop) + data):
+        i = (i + 1) & 255
+        j = (j + ksa[i]) & 255
+        ksa[i], ksa[j] = ksa[j], ksa[i]
+        out.append(byt ^ ksa[(ksa[i] + ksa[j]) & 255])
+    return bytes(out[drop:])
+
+
+@pytest.fixture(params=["backend", "python"])
+def rc4_backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(utils, "ARC4", None)
+    return request.param
+
+
+def test_rc4_known_vector(rc4_backend):
+    assert RC4(b"Key").crypt(b"Plaintext") == bytes.fromhex("bbf316e8d940af0ad3")
+
+
+@pytest.mark.parametrize("size", [0, 1, 255, 4096, 65537])
+def test_rc4_matches_legacy_output(rc4_backend, size):
+    key = bytes(range(7, 39))
+    data = bytes((n * 31) & 255 for n in range(size))
+    assert RC4(key).init1024().crypt(data) == legacy_rc4(key, data)
+
+
+def test_rc4_stream_continues_across_calls(rc4_backend):
+    key = b"0123456789abcdef"
+    data = b"x" * 1000
+    rc4 = RC4(key).init1024()
+    out = rc4.crypt(data[:333]) + rc4.crypt(data[333:])
+    assert out == legacy_rc4(key, data)
+    assert isinstance(rc4.crypt("str"), bytearray)
+
+
+def test_rc4_unsupported_key_size_falls_back():
+    # ARC4 of OpenSSL takes no 24 bit keys
+    key = b"abc"
+    assert RC4(key).init1024().crypt(b"hello") == legacy_rc4(key, b"hello")
+
+
+@pytest.fixture
+def translations(monkeypatch):
+    dic = {
+        "_globals": {"mode": "Mode"},
+        "fan": {"mode": "Fan mode", "level": {"low": "Low"}},
+        "level": {"low": "low"},
+    }
+    monkeypatch.setattr(utils, "TRANSLATION_LANGUAGES", dic)
+    utils.clear_translations()
+    yield dic
+    utils.clear_translations()
+
+
+def test_translation_tables_are_shared(translations):
+    fan = utils.get_translations("fan")
+    assert fan["mode"] == "Fan mode"
+    assert utils.get_translations("fan", "missing") is fan
+    assert utils.get_translations("missing")["mode"] == "Mode"
+    assert utils.get_translation("mode", ["fan"]) == "Fan mode"
+    # the tables of a spec instance are looked up in the merged tables
+    assert utils.layered_translations(["_globals", "fan", "level"], nested=True)["low"] == "Low"
+    assert utils.layered_translations(["_globals", "level"], nested=True)["low"] == "low"
+
+
+def test_translation_tables_are_rebuilt_on_reload(translations):
+    assert utils.get_translation("mode", ["fan"]) == "Fan mode"
+    translations["fan"] = {"mode": "Speed mode"}
+    assert utils.get_translation("mode", ["fan"]) == "Fan mode"
+    utils.clear_translations()
+    assert utils.get_translation("mode", ["fan"]) == "Speed mode"